@@ -31,12 +31,16 @@ The main classes defined in this module are:
 '''
 
 
-import sys, os, copy, inspect, math, cmath, operator, StringIO, glob
+import sys, os, copy, inspect, math, cmath, operator, StringIO, glob, hashlib
+import struct, multiprocessing, logging
+import cPickle as pickle
 from pyrocko import util
-from scipy.optimize import bisect, brentq
+from scipy.optimize import bisect
 from scipy.interpolate import fitpack
 import numpy as num
 
+logger = logging.getLogger('pyrocko.cake')
+
 ZEPS = 0.01
 P = 1
 S = 2
@@ -52,6 +56,8 @@ d2m = d2r*earthradius
 m2d = 1./d2m
 
 
+persistent_pathcache_version = 1
+
 class InvalidArguments(Exception):
     pass
 
@@ -1197,7 +1203,7 @@ class Layer:
             x = (cpe(eta2)-cpe(eta1))/(1-b)
             t = (sep(eta2)-sep(eta1))/(1-b)
         else:
-            lr = math.log(r2/r1)
+            lr = num.log(r2/r1)
             sap = num.sqrt(1/a**2 - p**2)
             x = p/sap * lr
             t = 1./(a**2 * sap)
@@ -1240,6 +1246,24 @@ class Layer:
         else:
             return direction
 
+    def propagate_array(self, p, mode, direction):
+        '''Propagate rays with an array of ray parameters through layer.
+
+        Like :py:meth:`propagate` but returns an array of outgoing directions,
+        containing zeros, where the ray cannot enter the layer.
+        '''
+
+        if direction == DOWN:
+            zin, zout = self.ztop, self.zbot
+        else:
+            zin, zout = self.zbot, self.ztop
+
+        if self.v(mode, zin) == 0.0:
+            return num.zeros(p.size, dtype=num.int)
+
+        return num.where(self.test(p, mode, zin),
+                num.where(self.test(p, mode, zout), direction, -direction), 0)
+
 class DoesNotTurn(Exception):
     pass
 
@@ -1507,7 +1531,21 @@ class Interface(Discontinuity):
                 return direction
             else:
                 return -direction
-            
+
+    def propagate_array(self, p, mode, direction):
+        '''Like :py:meth:`propagate` but for an array of ray parameters.'''
+
+        uabove, ubelow = self.u_top_bottom(mode)
+        if direction == DOWN:
+            u = ubelow
+        else:
+            u = uabove
+
+        if u is None:
+            return filled(-direction, p.size, dtype=num.int)
+
+        return num.where(u*radius(self.z) - p >= 0, direction, -direction)
+
     def pflat(self, p):
         return p / (earthradius-self.z)
 
@@ -1529,6 +1567,9 @@ class Surface(Discontinuity):
     def propagate(self, p, mode, direction):
         return direction  # no implicit reflection at surface
 
+    def propagate_array(self, p, mode, direction):
+        return filled(direction, p.size, dtype=num.int)
+
     def u_top_bottom(self, mode):
         if mode == P:
             return None, reci_or_none(self.mbelow.vp)
@@ -2069,7 +2110,29 @@ class RayPath:
     
     def zxt_path_subdivided(self, p, endgaps, points_per_straight=20, x_for_headwave=None):
         '''Get geometrical representation of ray path.'''
-        
+
+        offsets, z, x, t = self.zxt_path_packed(p, endgaps,
+                points_per_straight=points_per_straight,
+                x_for_headwave=x_for_headwave)
+
+        return [ num.split(a, offsets[1:-1]) for a in (z, x, t) ]
+
+    def zxt_path_packed(self, p, endgaps, points_per_straight=20, x_for_headwave=None):
+        '''Get geometrical representation of ray path as packed arrays.
+
+        :param p: array of ray parameters
+        :param endgaps: end point adjustments, as returned by :py:meth:`endgaps`
+        :param points_per_straight: number of points used per ray segment
+        :param x_for_headwave: array of distances, needed for head waves
+        :returns: ``(offsets, z, x, t)``, where `z`, `x`, `t` contain the
+            (depth, distance, time) points of all rays, one after the other,
+            and the points of the i-th ray are in ``offsets[i]:offsets[i+1]``
+
+        For head waves, `p` must have a single element and one ray is
+        returned for each element of `x_for_headwave`. The points on all
+        rays are computed together for each ray segment.
+        '''
+
         if self._is_headwave:
             assert p.size == 1
             x,t = self.xt(p, endgaps)
@@ -2080,40 +2143,45 @@ class RayPath:
 
         dxl, dtl = self.xt_endgaps(p, endgaps, which='left')
         dxr, dtr  = self.xt_endgaps(p, endgaps, which='right')
-        
-        # first create full path including the endgaps
+
+        n = points_per_straight
+        fn = num.arange(n, dtype=num.float)/(n-1)
+        pcol = p[:,num.newaxis]
+        zeros = num.zeros((nout, n))
+
+        # first create full path including the endgaps, as arrays with shape
+        # (nout, npoints)
         sx = num.zeros(nout) - dxl
         st = num.zeros(nout) - dtl
-        zxt = []
+        zs, xs, ts = [], [], []
+        def add(z, x, t):
+            zs.append(z + zeros)
+            xs.append(sx[:,num.newaxis] + x + zeros)
+            ts.append(st[:,num.newaxis] + t + zeros)
+
         for s in self.straights():
-            n = points_per_straight
-            
             back = None
             zin, zout = s.z_in(), s.z_out()
             if type(s) is HeadwaveStraight:
-                z = zin
-                for i in xrange(n):
-                    xs = float(i)/(n-1) * xstretch
-                    ts = s.x2t_headwave(xs)
-                    zxt.append( (filled(z, xstretch.size), sx+xs, st+ts ) )
+                xh = xstretch[:,num.newaxis] * fn
+                add(zin, xh, s.x2t_headwave(xh))
+
             else:
                 if zin != zout:  # normal traversal
-                    zs = num.linspace(zin, zout, n).tolist()
-                    for z in zs:
-                        x,t = s.xt(p, zpart=sorted([zin, z]))
-                        zxt.append( (filled(z, nout), sx + x, st + t) )
+                    z = num.linspace(zin, zout, n)
+                    x,t = s.xt(pcol, zpart=(num.minimum(zin, z), num.maximum(zin, z)))
+                    add(z, x, t)
 
                 else: # ray turns in layer
                     zturn = s.zturn(p)
-                    back = []
-                    for i in xrange(n):
-                        z = zin + (zturn - zin)*num.sin(float(i)/(n-1)*math.pi/2.0)*0.999
-                        if zturn[0] >= zin:
-                            x,t = s.xt(p, zpart=[zin, z])
-                        else:
-                            x,t = s.xt(p, zpart=[z, zin])
-                        zxt.append((z, sx + x, st + t))
-                        back.append((z, x, t))
+                    z = zin + (zturn[:,num.newaxis] - zin)*num.sin(fn*math.pi/2.0)*0.999
+                    if zturn[0] >= zin:
+                        x,t = s.xt(pcol, zpart=[zin, z])
+                    else:
+                        x,t = s.xt(pcol, zpart=[z, zin])
+
+                    add(z, x, t)
+                    back = z, x, t
 
             if type(s) is HeadwaveStraight:
                 x = xstretch
@@ -2124,41 +2192,36 @@ class RayPath:
             sx += x
             st += t
             if back:
-                for z,x,t in reversed(back):
-                    zxt.append((z, sx - x, st - t))
-
-        # gather results as arrays with such that x[ip, ipoint]
-        fanz, fanx, fant = [], [], [] 
-        for z,x,t in zxt:
-            fanz.append(z)
-            fanx.append(x)
-            fant.append(t)
-       
-        z = num.array(fanz).T
-        x = num.array(fanx).T
-        t = num.array(fant).T
-        
+                z, x, t = back
+                add(z[:,::-1], -x[:,::-1], -t[:,::-1])
+
+        z = num.hstack(zs)
+        x = num.hstack(xs)
+        t = num.hstack(ts)
+
         # cut off the endgaps, add exact endpoints
         xmax = x[:,-1] - dxr
         tmax = t[:,-1] - dtr
         zstart, zstop = endgaps[:2]
-        zs, xs, ts = [], [], []
-        for i in xrange(nout):
-            t_ = t[i]
-            indices = num.where(num.logical_and(0. <= t_, t_ <= tmax[i]))[0]
-            n = indices.size + 2
-            zs_, xs_, ts_ = [ num.empty(n, dtype=num.float) for j in range(3) ]
-            zs_[1:-1] = z[i,indices]
-            xs_[1:-1] = x[i,indices]
-            ts_[1:-1] = t[i,indices]
-            zs_[0], zs_[-1] = zstart, zstop
-            xs_[0], xs_[-1] = 0., xmax[i]
-            ts_[0], ts_[-1] = 0., tmax[i]
-            zs.append(zs_)
-            xs.append(xs_)
-            ts.append(ts_)
-        
-        return zs, xs, ts 
+
+        mask = num.logical_and(0. <= t, t <= tmax[:,num.newaxis])
+        nmask = mask.sum(axis=1)
+        offsets = num.zeros(nout+1, dtype=num.int)
+        num.cumsum(nmask + 2, out=offsets[1:])
+
+        irows, icols = num.nonzero(mask)
+        mstarts = num.cumsum(nmask) - nmask
+        idest = offsets[irows] + 1 + num.arange(irows.size) - mstarts[irows]
+
+        zp, xp, tp = [ num.empty(offsets[-1], dtype=num.float) for j in range(3) ]
+        zp[idest] = z[irows, icols]
+        xp[idest] = x[irows, icols]
+        tp[idest] = t[irows, icols]
+        zp[offsets[:-1]], zp[offsets[1:]-1] = zstart, zstop
+        xp[offsets[:-1]], xp[offsets[1:]-1] = 0., xmax
+        tp[offsets[:-1]], tp[offsets[1:]-1] = 0., tmax
+
+        return offsets, zp, xp, tp
     
     def _analyse(self):
         if self._p is not None:
@@ -2231,6 +2294,79 @@ class RayPath:
             xt = interp( x, rx, rt, 0)
 
             return [ (x,p,t, (rp,rx,rt)) for ((x,p), (_,t)) in zip(xp, xt)  ] 
+
+    def refine_x2pt(self, x, pl, ph, endgaps, xtol=2e-12, rtol=8.9e-16,
+            maxiter=100):
+        '''Find ray parameters and traveltimes for given distances.
+
+        :param x: array of distances [deg]
+        :param pl,ph: arrays with ray parameters bracketing the solutions
+        :param endgaps: end point adjustments, as returned by
+            :py:meth:`endgaps`
+        :returns: ``(p, t, ok)``, arrays with ray parameters, traveltimes and
+            a flag, whether a solution could be found
+
+        The equations ``xt(p)[0] == x`` are solved for all elements together,
+        using the Illinois variant of the regula falsi method. Like with
+        :py:func:`scipy.optimize.brentq`, a solution is only found, if the
+        distance mismatch changes sign between `pl` and `ph`.
+        '''
+
+        x = num.asarray(x, dtype=num.float)
+        pl = num.array(pl, dtype=num.float)
+        ph = num.array(ph, dtype=num.float)
+
+        xl, tl = self.xt(pl, endgaps)
+        xh, th = self.xt(ph, endgaps)
+        fl = x - xl
+        fh = x - xh
+
+        ok = fl*fh <= 0.
+        active = num.logical_and(ok, num.logical_and(fl != 0., fh != 0.))
+
+        usel = num.abs(fl) <= num.abs(fh)
+        pbest = num.where(usel, pl, ph)
+        tbest = num.where(usel, tl, th)
+        fbest = num.where(usel, fl, fh)
+        side = num.zeros(x.size, dtype=num.int)
+        for i in xrange(maxiter):
+            ia = num.where(active)[0]
+            if ia.size == 0:
+                break
+
+            pl_, ph_, fl_, fh_ = pl[ia], ph[ia], fl[ia], fh[ia]
+            p = ph_ - fh_ * (ph_ - pl_) / (fh_ - fl_)
+            bad = num.logical_not(num.logical_and(
+                    num.minimum(pl_, ph_) < p, p < num.maximum(pl_, ph_)))
+            p[bad] = 0.5*(pl_[bad] + ph_[bad])
+
+            xp, tp = self.xt(p, endgaps)
+            f = x[ia] - xp
+
+            better = num.abs(f) < num.abs(fbest[ia])
+            ib = ia[better]
+            pbest[ib], tbest[ib], fbest[ib] = p[better], tp[better], f[better]
+
+            left = num.sign(f) == num.sign(fl_)
+            il, ih = ia[left], ia[~left]
+
+            # Illinois modification: if the same end is retained twice, its
+            # function value is halved
+            fh[il[side[il] == -1]] *= 0.5
+            fl[ih[side[ih] == 1]] *= 0.5
+            side[il] = -1
+            side[ih] = 1
+
+            pl[il], fl[il] = p[left], f[left]
+            ph[ih], fh[ih] = p[~left], f[~left]
+
+            converged = num.logical_or(f == 0.,
+                num.abs(ph[ia] - pl[ia]) <= xtol + rtol*num.abs(p))
+
+            active[ia[converged]] = False
+
+        ok[active] = False
+        return pbest, tbest, ok
     
     def __eq__(self, other):
         if len(self.elements) != len(other.elements):
@@ -2375,23 +2511,8 @@ class Ray:
         if self.path._is_headwave:
             return
 
-        cp,cx,ct = self.draft_pxt
-        ip = num.searchsorted(cp, self.p)
-        if not (0 < ip < cp.size):
-            raise RefineFailed()
-
-        pl, ph = cp[ip-1], cp[ip]
-        p_to_t = {}
-        def f(p):
-            x, t = self.path.xt(p, self.endgaps)
-            p_to_t[p] = t
-            return self.x - x
-
-        try:
-            self.p = brentq(f, pl, ph)
-            self.t = p_to_t[self.p]
-
-        except ValueError:
+        ok = refine_rays([ self ])
+        if not ok[0]:
             raise RefineFailed()
 
     def takeoff_angle(self):
@@ -2450,6 +2571,126 @@ class Ray:
                 self.p/r2d, sd, self.t, self.takeoff_angle(), self.incidence_angle(), 
                 100*self.efficiency(), 100*self.spreading()*self.surface_sphere(), self.path.__str__(p=self.p))
 
+def zxt_rays_packed(rays, points_per_straight=20):
+    '''Get geometrical representation of many rays as packed arrays.
+
+    :param rays: list of :py:class:`Ray` objects
+    :param points_per_straight: number of points used per ray segment
+    :returns: ``(offsets, z, x, t)``, where the (depth, distance, time) points
+        on the i-th ray are ``z[offsets[i]:offsets[i+1]]``, etc.
+
+    The points of all rays belonging to the same :py:class:`RayPath` and
+    source/receiver depths are computed together, using
+    :py:meth:`RayPath.zxt_path_packed`.
+    '''
+
+    groups = {}
+    for iray, ray in enumerate(rays):
+        groups.setdefault((id(ray.path), ray.endgaps), []).append(iray)
+
+    counts = num.zeros(len(rays), dtype=num.int)
+    pieces = [ None ] * len(rays)
+    for irays in groups.itervalues():
+        path = rays[irays[0]].path
+        endgaps = rays[irays[0]].endgaps
+        if path._is_headwave:
+            p = num.atleast_1d(rays[irays[0]].p)
+            x = num.array([ rays[iray].x for iray in irays ], dtype=num.float)
+        else:
+            p = num.array([ rays[iray].p for iray in irays ], dtype=num.float)
+            x = None
+
+        offsets, z, x, t = path.zxt_path_packed(p, endgaps,
+                points_per_straight=points_per_straight, x_for_headwave=x)
+
+        for j, iray in enumerate(irays):
+            sl = slice(offsets[j], offsets[j+1])
+            pieces[iray] = z[sl], x[sl], t[sl]
+            counts[iray] = offsets[j+1] - offsets[j]
+
+    offsets = num.zeros(len(rays)+1, dtype=num.int)
+    num.cumsum(counts, out=offsets[1:])
+    if not rays:
+        empty = num.zeros(0, dtype=num.float)
+        return offsets, empty, empty.copy(), empty.copy()
+
+    z, x, t = [ num.concatenate([ piece[j] for piece in pieces ])
+                for j in range(3) ]
+
+    return offsets, z, x, t
+
+_arrivals_many_model = None
+
+def _arrivals_many_work(args):
+    zstart, distances, phases, zstop, refine = args
+    mod = _arrivals_many_model
+    rays = mod.arrivals(distances, phases, zstart, zstop, refine)
+
+    # rays are returned in compact form, with their paths referring to the
+    # model's elements by index, so that the model is not pickled
+    paths = []
+    ipaths = {}
+    compact_rays = []
+    for ray in rays:
+        if id(ray.path) not in ipaths:
+            ipaths[id(ray.path)] = len(paths)
+            paths.append(ray.path)
+
+        compact_rays.append((ipaths[id(ray.path)], ray.p, ray.x, ray.t,
+            ray.endgaps, ray.draft_pxt))
+
+    compact_paths = zip([ path.phase for path in paths ],
+                        mod._persistent_paths_entries(paths))
+
+    return compact_paths, compact_rays
+
+def refine_rays(rays):
+    '''Improve ray parameters and traveltimes of many rays at once.
+
+    The ray parameter and traveltime of each :py:class:`Ray` object in `rays`
+    are adjusted in place to exactly match the ray's distance. All rays
+    belonging to the same :py:class:`RayPath` and source/receiver depths are
+    handled together using :py:meth:`RayPath.refine_x2pt`. Rays of head waves
+    are left unchanged.
+
+    :returns: array of flags, whether refinement has been successful
+    '''
+
+    ok = num.ones(len(rays), dtype=num.bool)
+    groups = {}
+    for iray, ray in enumerate(rays):
+        if ray.path._is_headwave:
+            continue
+
+        groups.setdefault((id(ray.path), ray.endgaps), []).append(iray)
+
+    for irays in groups.itervalues():
+        path = rays[irays[0]].path
+        endgaps = rays[irays[0]].endgaps
+        pl, ph, x = [], [], []
+        for iray in irays:
+            ray = rays[iray]
+            cp = ray.draft_pxt[0]
+            ip = num.searchsorted(cp, ray.p)
+            if 0 < ip < cp.size:
+                pl.append(cp[ip-1])
+                ph.append(cp[ip])
+            else:
+                pl.append(num.nan)
+                ph.append(num.nan)
+
+            x.append(ray.x)
+
+        p, t, ok_ = path.refine_x2pt(x, pl, ph, endgaps)
+        for iray, p_, t_, ok__ in zip(irays, p, t, ok_):
+            if ok__:
+                rays[iray].p = p_
+                rays[iray].t = t_
+            else:
+                ok[iray] = False
+
+    return ok
+
 class DiscontinuityNotFound(Exception):
     def __init__(self, depth_or_name):
         Exception.__init__(self)
@@ -2487,6 +2728,8 @@ class LayeredModel:
         self._np = 10000
         self._pdepth = 18
         self._pathcache = {}
+        self._persistent_pathcache_dir = None
+        self._persistent_pathcache = None
 
     def copy_with_elevation(self, elevation):
         '''Get a copy of the model with surface layer stretched to given elevation.
@@ -2498,6 +2741,7 @@ class LayeredModel:
 
         c = copy.deepcopy(self)
         c._pathcache = {}
+        c._persistent_pathcache = None
         surface = c._elements[0]
         toplayer = c._elements[1]
 
@@ -2735,9 +2979,181 @@ class LayeredModel:
 
             walker.go(direction)
             current = walker.current()
-       
+
         return path
 
+    def group_paths(self, ps, phase, layer_start, layer_stop):
+        '''Get ray paths for many ray parameters at once.
+
+        :param ps: array of ray parameters (spherical) [s/rad]
+        :param phase: phase definition (:py:class:`PhaseDef` object)
+        :param layer_start: layer with source
+        :param layer_stop: layer with receiver
+        :returns: list of ``(path, indices)`` tuples, where `path` is a
+            :py:class:`RayPath` object and `indices` is an array with the
+            indices of the ray parameters in `ps` leading to that path
+
+        This gives the same paths as calling :py:meth:`path` for each element
+        of `ps`, but all ray parameters are propagated through the model
+        together. They are split into groups whenever their propagation
+        histories diverge. Ray parameters, for which :py:meth:`path` would
+        fail, are not contained in any of the returned groups.
+        '''
+
+        ps = num.asarray(ps, dtype=num.float)
+        phase = self.adapt_phase(phase)
+        knees = list(phase.knees())
+        legs = list(phase.legs())
+        assert legs
+
+        direction_stop = phase.direction_stop()
+        mode_stop = phase.last_leg().mode
+        nelements = len(self._elements)
+
+        ielement = self._elements.index(layer_start)
+        current = self._elements[ielement]
+        direction = legs[0].departure
+        mode = legs[0].mode
+
+        ttop, tbot = current.tests(ps, mode)
+        ok = num.logical_or(ttop, tbot)
+        if direction == DOWN:
+            flip = num.logical_not(ttop)
+        else:
+            flip = num.logical_not(tbot)
+
+        # state: (indices, ielement, direction, mode, iknee, ileg, elements,
+        #   trapdetect)
+        todo = []
+        for d, sel in ((direction, num.logical_and(ok, ~flip)),
+                       (-direction, num.logical_and(ok, flip))):
+            indices = num.where(sel)[0]
+            if indices.size:
+                todo.append((indices, ielement, d, mode, 0, 0, [], set()))
+
+        groups = []
+        while todo:
+            indices, ielement, direction, mode, iknee, ileg, elements, \
+                trapdetect = todo.pop()
+
+            p = ps[indices]
+            while True:
+                current = self._elements[ielement]
+                if iknee < len(knees):
+                    next_knee = knees[iknee]
+                else:
+                    next_knee = None
+
+                # detect trapped wave
+                k = (iknee, ielement, direction, mode)
+                if k in trapdetect:
+                    break
+
+                trapdetect.add(k)
+
+                # groups diverging from the current one, as (selection,
+                # direction, element) tuples
+                branches = []
+                sel = None
+                if isinstance(current, Discontinuity):
+                    oldmode, olddirection = mode, direction
+                    if next_knee is not None and next_knee.matches(
+                            current, mode, direction):
+
+                        direction = next_knee.out_direction()
+                        mode = next_knee.out_mode
+                        iknee += 1
+                        ileg += 1
+                        if next_knee.headwave:
+                            elements.append(Kink(olddirection, olddirection,
+                                oldmode, oldmode, current))
+                            elements.append(HeadwaveStraight(olddirection,
+                                direction, oldmode, current))
+
+                    else:  # implicit reflection/transmission
+                        directions = current.propagate_array(p, mode,
+                                direction)
+
+                        branches.append((directions == -direction,
+                            -direction, Kink(olddirection, -direction,
+                                oldmode, mode, current)))
+
+                        sel = directions == direction
+
+                    element = Kink(olddirection, direction, oldmode, mode,
+                        current)
+
+                else:
+                    leg = legs[ileg]
+                    zmin, zmax = leg.depthmin, leg.depthmax
+                    directions = current.propagate_array(p, mode, direction)
+
+                    turn = directions == -direction
+                    if num.any(turn):
+                        zturn = current.zturn(p[turn], mode)
+                        zok = num.ones(zturn.size, dtype=num.bool)
+                        if zmin is not None:
+                            zok &= zturn > zmin
+                        if zmax is not None:
+                            zok &= zturn < zmax
+
+                        turn[turn] = zok
+                        straight = Straight(direction, -direction, mode,
+                            current)
+
+                        if (iknee == len(knees) and mode == mode_stop
+                                and current is layer_stop):
+                            if num.any(turn):
+                                groups.append((indices[turn],
+                                    elements + [straight], phase))
+                        else:
+                            branches.append((turn, -direction, straight))
+
+                    sel = directions == direction
+                    if (zmin is not None and current.ztop <= zmin) or (
+                            zmax is not None and current.zbot >= zmax):
+                        sel[:] = False
+
+                    element = Straight(direction, direction, mode, current)
+
+                for bsel, bdirection, belement in branches:
+                    inext = ielement + bdirection/DOWN
+                    if num.any(bsel) and 0 <= inext < nelements:
+                        todo.append((indices[bsel], inext, bdirection, mode,
+                            iknee, ileg, elements + [belement],
+                            set(trapdetect)))
+
+                if sel is not None:
+                    indices, p = indices[sel], p[sel]
+                    if indices.size == 0:
+                        break
+
+                elements.append(element)
+
+                if (isinstance(current, Layer) and iknee == len(knees)
+                        and mode == mode_stop and current is layer_stop
+                        and direction == direction_stop):
+
+                    groups.append((indices, elements, phase))
+                    break
+
+                ielement += direction/DOWN
+                if not (0 <= ielement < nelements):
+                    break
+
+        results = []
+        for indices, elements, phase in groups:
+            path = RayPath(phase)
+            for element in elements:
+                path.append(element)
+
+            if any(type(element) is HeadwaveStraight for element in elements):
+                path.set_is_headwave(True)
+
+            results.append((path, num.sort(indices)))
+
+        return results
+
     def gather_paths(self, phases=PhaseDef('P'), zstart=0.0, zstop=0.0):
         '''Get all possible ray paths for given source and receiver depths for one or more phase definitions.
         
@@ -2755,6 +3171,7 @@ class LayeredModel:
             phases = [ phases ]
         
         paths = [] 
+        new_entries = {}
         for phase in phases:
             
             layer_start = self.layer(zstart, -phase.direction_start())
@@ -2765,75 +3182,278 @@ class LayeredModel:
             if pathcachekey in self._pathcache:
                 phase_paths = self._pathcache[pathcachekey]
             else:
-                hwknee = phase.headwave_knee()
-                if hwknee:
-                    name_or_z = hwknee.depth
-                    interface = self.discontinuity(name_or_z)
-                    mode = hwknee.in_mode
-                    in_direction = hwknee.direction
-                    
-                    pabove, pbelow = interface.critical_ps(mode)
-                    
-                    p = min_not_none(pabove, pbelow)
+                phase_paths = self._load_persistent_paths(
+                    phase, layer_start, layer_stop)
 
-                    if in_direction == DOWN and (pbelow is None or pbelow > pabove): # diffracted wave
-                        p *= 0.999
+                if phase_paths is None:
+                    phase_paths = self._find_paths(
+                        phase, layer_start, layer_stop)
 
-                    path = self.path(p, phase, layer_start, layer_stop)
-                    path.set_prange(p,p,1.)
-
-                    phase_paths = [ path ] 
-                    
-                else:
-                    pmax_start = max( [ radius(z)/layer_start.v(phase.first_leg().mode, z) for z in (layer_start.ztop, layer_start.zbot) ] )
-                    pmax_stop = max( [ radius(z)/layer_stop.v(phase.last_leg().mode, z) for z in (layer_stop.ztop, layer_stop.zbot) ] )
-                    pmax = min(pmax_start, pmax_stop)
-
-                    phase_paths = {}
-                    cached = {}
-                    counter = [ 0 ]
-                    def p_to_path(p):
-                        if p in cached:
-                            return cached[p]
-
-                        try:
-                            counter[0] += 1
-                            path = self.path(p, phase, layer_start, layer_stop)
-                            if path not in phase_paths:
-                                phase_paths[path] = []
-                            phase_paths[path].append(p)
-
-                        except PathFailed:
-                            path = None
-                        
-                        cached[p] = path
-                        return path
-                    
-                    def recurse(pmin, pmax, i=0):
-                        if i > self._pdepth:
-                            return
-                        path1 = p_to_path(pmin)
-                        path2 = p_to_path(pmax)
-                        if path1 is None and path2 is None and i > 8:
-                            return
-                        if path1 is None or path2 is None or hash(path1) != hash(path2):
-                            recurse(pmin, (pmin+pmax)/2., i+1)
-                            recurse((pmin+pmax)/2., pmax, i+1)
-
-                    recurse(0., pmax)
-
-                    for path, ps in phase_paths.iteritems():
-                        path.set_prange(min(ps), max(ps), pmax/(self._np-1))
-               
-                    phase_paths = phase_paths.keys()
+                    if self._persistent_pathcache_dir is not None:
+                        key = self._persistent_pathcache_key(
+                            phase, layer_start, layer_stop)
+                        new_entries[key] = self._persistent_paths_entries(
+                            phase_paths)
 
                 self._pathcache[pathcachekey] = phase_paths
 
             paths.extend(phase_paths)
         
-        paths.sort(key=lambda x: x.pmin)
+        if new_entries:
+            self._save_persistent_paths(new_entries)
+
+        paths.sort(key=lambda x: x.pmin())
         return paths
     
+    def _find_paths(self, phase, layer_start, layer_stop):
+        hwknee = phase.headwave_knee()
+        if hwknee:
+            name_or_z = hwknee.depth
+            interface = self.discontinuity(name_or_z)
+            mode = hwknee.in_mode
+            in_direction = hwknee.direction
+
+            pabove, pbelow = interface.critical_ps(mode)
+
+            p = min_not_none(pabove, pbelow)
+
+            if in_direction == DOWN and (pbelow is None or pbelow > pabove): # diffracted wave
+                p *= 0.999
+
+            path = self.path(p, phase, layer_start, layer_stop)
+            path.set_prange(p,p,1.)
+
+            phase_paths = [ path ] 
+
+        else:
+            pmax_start = max( [ radius(z)/layer_start.v(phase.first_leg().mode, z) for z in (layer_start.ztop, layer_start.zbot) ] )
+            pmax_stop = max( [ radius(z)/layer_stop.v(phase.last_leg().mode, z) for z in (layer_stop.ztop, layer_stop.zbot) ] )
+            pmax = min(pmax_start, pmax_stop)
+
+            canonical = {}
+            cached = {}
+            def prefetch(pmins, pmaxs, nlevels):
+                # evaluate the points, the bisection would visit in
+                # the next levels, all at once
+                ps = [ pmins, pmaxs ]
+                for i in xrange(nlevels):
+                    pmids = (pmins+pmaxs)/2.
+                    ps.append(pmids)
+                    pmins, pmaxs = (num.concatenate((pmins, pmids)),
+                                    num.concatenate((pmids, pmaxs)))
+
+                pnew = num.array([ p for p in set(
+                                   num.concatenate(ps).tolist())
+                                   if p not in cached ],
+                                 dtype=num.float)
+
+                for p in pnew.tolist():
+                    cached[p] = None
+
+                for path, indices in self.group_paths(
+                        pnew, phase, layer_start, layer_stop):
+
+                    path = canonical.setdefault(path, path)
+                    for p in pnew[indices].tolist():
+                        cached[p] = path
+
+            phase_paths = {}
+            visited = set()
+            def p_to_path(p):
+                path = cached[p]
+                if p not in visited:
+                    visited.add(p)
+                    if path is not None:
+                        phase_paths.setdefault(path, []).append(p)
+
+                return path
+
+            # breadth-first version of a recursive bisection over
+            # p, all intervals of one recursion level are handled
+            # at once
+            pmins = num.array([0.])
+            pmaxs = num.array([pmax])
+            nprefetch = 5
+            for i in xrange(self._pdepth+1):
+                if pmins.size == 0:
+                    break
+
+                if i % (nprefetch+1) == 0:
+                    prefetch(pmins, pmaxs,
+                             min(nprefetch, self._pdepth-i))
+
+                split = num.zeros(pmins.size, dtype=num.bool)
+                for j, (pmin_, pmax_) in enumerate(
+                        zip(pmins.tolist(), pmaxs.tolist())):
+
+                    path1 = p_to_path(pmin_)
+                    path2 = p_to_path(pmax_)
+                    if path1 is None and path2 is None and i > 8:
+                        continue
+
+                    split[j] = path1 is None or path1 is not path2
+
+                pmins, pmaxs = pmins[split], pmaxs[split]
+                pmids = (pmins+pmaxs)/2.
+                pmins, pmaxs = (num.concatenate((pmins, pmids)),
+                                num.concatenate((pmids, pmaxs)))
+
+            for path, ps in phase_paths.iteritems():
+                path.set_prange(min(ps), max(ps), pmax/(self._np-1))
+
+            phase_paths = phase_paths.keys()
+
+        return phase_paths
+
+    def use_persistent_pathcache(self, cachedir=None):
+        '''Enable persistent on-disk cache for ray paths.
+
+        :param cachedir: directory to hold the cache files, by default, the
+            subdirectory ``cake-paths`` of pyrocko's cache directory is used
+
+        When enabled, ray paths found by :py:meth:`gather_paths` are also
+        stored on disk, keyed by the model's :py:meth:`content_hash`, the
+        phase definition and the source and receiver layers. Later
+        invocations, also in other processes, reuse these instead of
+        searching the paths again.
+        '''
+
+        if cachedir is None:
+            from pyrocko import config
+            cachedir = os.path.join(config.cache_dir, 'cake-paths')
+
+        util.ensuredir(cachedir)
+        self._persistent_pathcache_dir = cachedir
+        self._persistent_pathcache = None
+
+    def content_hash(self):
+        '''Get hash identifying the model's layers and discontinuities.'''
+
+        def mat(m):
+            return m.astuple()
+
+        items = [ persistent_pathcache_version, self._np, self._pdepth ]
+        for element in self._elements:
+            if isinstance(element, Layer):
+                item = (element.ztop, element.zbot,
+                        mat(element.mtop), mat(element.mbot))
+            elif isinstance(element, Interface):
+                item = (element.z, mat(element.mabove), mat(element.mbelow))
+            else:
+                item = (element.z, mat(element.mbelow))
+
+            items.append((element.__class__.__name__, element.name) + item)
+
+        return hashlib.sha1(repr(items)).hexdigest()
+
+    def _persistent_pathcache_filename(self):
+        return os.path.join(self._persistent_pathcache_dir,
+                            self.content_hash())
+
+    def _read_persistent_pathcache(self):
+        fn = self._persistent_pathcache_filename()
+        if os.path.isfile(fn):
+            try:
+                f = open(fn, 'rb')
+                try:
+                    return pickle.load(f)
+                finally:
+                    f.close()
+
+            except (IOError, OSError, EOFError, pickle.UnpicklingError), e:
+                logger.warn('cannot read ray path cache file %s: %s' % (fn, e))
+
+        return {}
+
+    def _persistent_pathcache_key(self, phase, layer_start, layer_stop):
+        return (phase.definition(),
+                self._elements.index(layer_start),
+                self._elements.index(layer_stop))
+
+    def _load_persistent_paths(self, phase, layer_start, layer_stop):
+        if self._persistent_pathcache_dir is None:
+            return None
+
+        if self._persistent_pathcache is None:
+            self._persistent_pathcache = self._read_persistent_pathcache()
+
+        key = self._persistent_pathcache_key(phase, layer_start, layer_stop)
+        if key not in self._persistent_pathcache:
+            return None
+
+        phase = self.adapt_phase(phase)
+        return [ self._path_from_persistent_entry(phase, entry)
+                 for entry in self._persistent_pathcache[key] ]
+
+    def _path_from_persistent_entry(self, phase, entry):
+        classes = { 'S': Straight, 'H': HeadwaveStraight, 'K': Kink }
+
+        elements, is_headwave, prange = entry
+        path = RayPath(phase)
+        for item in elements:
+            cls, args, ielement = classes[item[0]], item[1:-1], item[-1]
+            path.append(cls(*(args + (self._elements[ielement],))))
+
+        path.set_is_headwave(is_headwave)
+        path.set_prange(*prange)
+        return path
+
+    def _persistent_paths_entries(self, paths):
+        def ielement(x):
+            return self._elements.index(x)
+
+        entries = []
+        for path in paths:
+            elements = []
+            for element in path.elements:
+                if type(element) is HeadwaveStraight:
+                    elements.append(('H', element._direction_in,
+                        element._direction_out, element.mode,
+                        ielement(element.interface)))
+
+                elif isinstance(element, Straight):
+                    elements.append(('S', element._direction_in,
+                        element._direction_out, element.mode,
+                        ielement(element.layer)))
+
+                else:
+                    elements.append(('K', element.in_direction,
+                        element.out_direction, element.in_mode,
+                        element.out_mode, ielement(element.discontinuity)))
+
+            entries.append((elements, path._is_headwave,
+                (path._pmin, path._pmax, path._prange_dp)))
+
+        return entries
+
+    def _save_persistent_paths(self, new_entries):
+        # merge with what other processes may have stored in the meantime
+        cache = self._read_persistent_pathcache()
+        cache.update(new_entries)
+        self._persistent_pathcache = cache
+
+        fn = self._persistent_pathcache_filename()
+        tmpfn = fn + '.%i.tmp' % os.getpid()
+        try:
+            f = open(tmpfn, 'wb')
+            try:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+
+            os.rename(tmpfn, fn)
+
+        except (IOError, OSError), e:
+            logger.warn('cannot write ray path cache file %s, using in-memory '
+                        'cache only: %s' % (fn, e))
+
+            self._persistent_pathcache_dir = None
+            if os.path.exists(tmpfn):
+                try:
+                    os.remove(tmpfn)
+                except OSError:
+                    pass
+
     def arrivals(self, distances=[], phases=PhaseDef('P'), 
             zstart=0.0, zstop=0.0, refine=True):
 
@@ -2857,21 +3477,64 @@ class LayeredModel:
                 arrivals.append(Ray(path, p, x, t, endgaps, draft_pxt))
 
         if refine:
-            refined = []
-            for ray in arrivals:
-                if ray.path._is_headwave:
-                    refined.append(ray)
+            ok = refine_rays(arrivals)
+            arrivals = [ ray for (ray, ok_) in zip(arrivals, ok) if ok_ ]
 
-                try:
-                    ray.refine()
-                    refined.append(ray) 
+        arrivals.sort(key=lambda x: (x.x, x.t))
+        return arrivals
 
-                except RefineFailed:
-                    pass
+    def arrivals_many(self, depths, distances=[], phases=PhaseDef('P'),
+            zstop=0.0, refine=True, nworkers=1):
 
-            arrivals = refined
+        '''Compute rays and traveltimes for many source depths.
+
+        :param depths: list or array of source depths [m]
+        :param distances: list or array of distances [deg]
+        :param phases: a :py:class:`PhaseDef` object or a list of such objects
+        :param zstop: receiver depth [m]
+        :param refine: bool flag, whether to refine the arrivals, see
+            :py:meth:`arrivals`
+        :param nworkers: number of worker processes to use
+        :returns: a list with one list of :py:class:`Ray` objects for each
+            source depth, as returned by :py:meth:`arrivals`
+
+        The source depths are distributed among `nworkers` worker processes,
+        which share a read-only copy of the model. Each worker process keeps
+        its own cache of ray paths. To share the ray paths between processes
+        and across invocations, use :py:meth:`use_persistent_pathcache`.
+        '''
+
+        global _arrivals_many_model
+
+        if nworkers is None:
+            nworkers = 1
+
+        nworkers = max(1, nworkers)
+
+        args = [ (z, distances, phases, zstop, refine) for z in depths ]
+
+        if nworkers == 1 or len(args) <= 1:
+            return [ self.arrivals(distances, phases, z, zstop, refine)
+                     for z in depths ]
+
+        _arrivals_many_model = self
+        pool = multiprocessing.Pool(min(nworkers, len(args)))
+        try:
+            results = pool.map(_arrivals_many_work, args, chunksize=1)
+
+        finally:
+            pool.terminate()
+            pool.join()
+            _arrivals_many_model = None
+
+        arrivals = []
+        for compact_paths, compact_rays in results:
+            paths = [ self._path_from_persistent_entry(phase, entry)
+                      for (phase, entry) in compact_paths ]
+
+            arrivals.append([ Ray(paths[ipath], p, x, t, endgaps, draft_pxt)
+                for (ipath, p, x, t, endgaps, draft_pxt) in compact_rays ])
 
-        arrivals.sort(key=lambda x: (x.x, x.t))
         return arrivals
 
     @classmethod
@@ -3086,6 +3749,290 @@ class LayeredModel:
     def __str__(self):
         return '\n'.join( str(element) for element in self._elements )
                 
+class TravelTimeTableError(Exception):
+    pass
+
+ttt_magic = 'CAKETTT1'
+ttt_header_fmt = '<8sdddQddQddQ'
+
+class TravelTimeTable:
+    '''Tabulated arrival times on a regular (source depth, distance) grid.
+
+    :param definitions: list of phase definition strings
+    :param zstop: receiver depth [m]
+    :param zmin,zmax,nz: source depth range [m] and number of samples
+    :param xmin,xmax,nx: distance range [deg] and number of samples
+    :param times: array of shape ``(nz, nx)`` with traveltimes [s], NaN where
+        there is no arrival
+
+    Each table holds the first arrival among the rays of one or more phase
+    definitions. To get tables for individual named phases, build one table
+    per phase. Tables are created with :py:meth:`build`, and can be saved to
+    and loaded from compact binary files with :py:meth:`save` and
+    :py:meth:`load`. Traveltimes at arbitrary depths and distances are
+    obtained with :py:meth:`interpolate`.
+
+    **Attributes:**
+
+        .. py:attribute:: errors
+
+           Dict with maximum absolute errors [s] of the ``'bilinear'`` and
+           ``'bicubic'`` interpolations, as determined with :py:meth:`check`
+           (values are NaN if unknown).
+    '''
+
+    def __init__(self, definitions, zstop, zmin, zmax, nz, xmin, xmax, nx,
+            times, errors=None):
+
+        if nz < 2 or nx < 2:
+            raise TravelTimeTableError(
+                'at least two samples are needed in depth and distance')
+
+        self.definitions = list(definitions)
+        self.zstop = zstop
+        self.zmin, self.zmax, self.nz = zmin, zmax, nz
+        self.xmin, self.xmax, self.nx = xmin, xmax, nx
+        self.times = num.asarray(times, dtype=num.float).reshape((nz, nx))
+
+        # for cubic interpolation, nodes outside of the table are linearly
+        # extrapolated
+        padded = num.empty((nz+2, nx+2))
+        padded[1:-1,1:-1] = self.times
+        padded[0,1:-1] = 2.*self.times[0] - self.times[1]
+        padded[-1,1:-1] = 2.*self.times[-1] - self.times[-2]
+        padded[:,0] = 2.*padded[:,1] - padded[:,2]
+        padded[:,-1] = 2.*padded[:,-2] - padded[:,-3]
+        self._times_padded = padded
+
+        if errors is None:
+            errors = dict(bilinear=num.nan, bicubic=num.nan)
+
+        self.errors = errors
+
+    @property
+    def depths(self):
+        return num.linspace(self.zmin, self.zmax, self.nz)
+
+    @property
+    def distances(self):
+        return num.linspace(self.xmin, self.xmax, self.nx)
+
+    @classmethod
+    def build(cls, model, phases, depths, distances, zstop=0.0, refine=True,
+            check=True, nworkers=1):
+        '''Tabulate traveltimes using :py:meth:`LayeredModel.arrivals`.
+
+        :param model: :py:class:`LayeredModel` object
+        :param phases: a :py:class:`PhaseDef` object or a list of such objects
+        :param depths: ``(zmin, zmax, nz)`` source depths [m]
+        :param distances: ``(xmin, xmax, nx)`` distances [deg]
+        :param zstop: receiver depth [m]
+        :param refine: passed to :py:meth:`LayeredModel.arrivals`
+        :param check: whether to determine interpolation errors at the grid
+            cell centers with :py:meth:`check`
+        :param nworkers: number of worker processes to use, see
+            :py:meth:`LayeredModel.arrivals_many`
+        '''
+
+        if isinstance(phases, PhaseDef):
+            phases = [ phases ]
+
+        zmin, zmax, nz = depths
+        xmin, xmax, nx = distances
+
+        times = first_arrival_times(model, phases,
+                num.linspace(zmin, zmax, nz), num.linspace(xmin, xmax, nx),
+                zstop=zstop, refine=refine, nworkers=nworkers)
+
+        self = cls([ phase.definition() for phase in phases ], zstop,
+                zmin, zmax, nz, xmin, xmax, nx, times)
+
+        if check:
+            self.check(model, refine=refine, nworkers=nworkers)
+
+        return self
+
+    def check(self, model, refine=True, nworkers=1):
+        '''Determine interpolation errors at grid cell centers.
+
+        Traveltimes are computed with :py:meth:`LayeredModel.arrivals` at the
+        centers of the grid cells, where interpolation errors are largest, and
+        compared to the interpolated values. Points, where either value is
+        undefined, are ignored. The maximum absolute errors are stored in
+        :py:attr:`errors` and are returned.
+        '''
+
+        phases = [ PhaseDef(definition) for definition in self.definitions ]
+        depths = self.depths
+        distances = self.distances
+        zc = 0.5*(depths[1:] + depths[:-1])
+        xc = 0.5*(distances[1:] + distances[:-1])
+        tref = first_arrival_times(model, phases, zc, xc, zstop=self.zstop,
+                refine=refine, nworkers=nworkers)
+
+        zz, xx = num.meshgrid(zc, xc, indexing='ij')
+        errors = {}
+        for method in ('bilinear', 'bicubic'):
+            t = self.interpolate(zz, xx, method=method)
+            ok = num.logical_and(num.isfinite(t), num.isfinite(tref))
+            if num.any(ok):
+                errors[method] = float(num.max(num.abs(t[ok] - tref[ok])))
+            else:
+                errors[method] = num.nan
+
+        self.errors = errors
+        return errors
+
+    def interpolate(self, depths, distances, method='bilinear'):
+        '''Get interpolated traveltimes.
+
+        :param depths: source depths [m]
+        :param distances: distances [deg]
+        :param method: ``'bilinear'`` or ``'bicubic'``
+        :returns: array of traveltimes [s], NaN where there is no arrival or
+            the point is outside of the table
+
+        `depths` and `distances` may be scalars or arrays and are broadcast
+        against each other. With ``'bicubic'``, cubic convolution is used on
+        the 4x4 neighbouring grid nodes, extrapolating linearly at the borders
+        of the table. Where this involves undefined nodes, bilinear
+        interpolation is used instead.
+        '''
+
+        z, x = num.broadcast_arrays(
+                num.asarray(depths, dtype=num.float),
+                num.asarray(distances, dtype=num.float))
+
+        shape = z.shape
+        z = z.ravel()
+        x = x.ravel()
+
+        fz = (z - self.zmin) / (self.zmax - self.zmin) * (self.nz - 1)
+        fx = (x - self.xmin) / (self.xmax - self.xmin) * (self.nx - 1)
+        inside = num.logical_and(
+                num.logical_and(0. <= fz, fz <= self.nz - 1),
+                num.logical_and(0. <= fx, fx <= self.nx - 1))
+
+        iz = num.clip(num.floor(fz).astype(num.int), 0, self.nz - 2)
+        ix = num.clip(num.floor(fx).astype(num.int), 0, self.nx - 2)
+        tz = fz - iz
+        tx = fx - ix
+
+        times = self.times
+        t = (times[iz, ix] * (1.-tz) * (1.-tx) +
+             times[iz+1, ix] * tz * (1.-tx) +
+             times[iz, ix+1] * (1.-tz) * tx +
+             times[iz+1, ix+1] * tz * tx)
+
+        if method == 'bicubic':
+            izs = iz[:,num.newaxis] + num.arange(4)
+            ixs = ix[:,num.newaxis] + num.arange(4)
+            wz = cubic_convolution_weights(tz)
+            wx = cubic_convolution_weights(tx)
+            tc = num.einsum('ni,nij,nj->n', wz, self._times_padded[
+                izs[:,:,num.newaxis], ixs[:,num.newaxis,:]], wx)
+
+            t = num.where(num.isfinite(tc), tc, t)
+
+        elif method != 'bilinear':
+            raise TravelTimeTableError(
+                'unknown interpolation method: %s' % method)
+
+        t[num.logical_not(inside)] = num.nan
+        return t.reshape(shape)
+
+    def save(self, filename):
+        '''Save table to file.'''
+
+        sdefs = '\n'.join(self.definitions)
+        header = struct.pack(ttt_header_fmt, ttt_magic, self.zstop,
+                self.zmin, self.zmax, self.nz, self.xmin, self.xmax, self.nx,
+                self.errors['bilinear'], self.errors['bicubic'], len(sdefs))
+
+        f = open(filename, 'wb')
+        try:
+            f.write(header)
+            f.write(sdefs)
+            self.times.astype('<f4').tofile(f)
+        finally:
+            f.close()
+
+    @classmethod
+    def load(cls, filename):
+        '''Load table from file.'''
+
+        f = open(filename, 'rb')
+        try:
+            s = f.read(struct.calcsize(ttt_header_fmt))
+            try:
+                (magic, zstop, zmin, zmax, nz, xmin, xmax, nx, err_bilinear,
+                    err_bicubic, ndefs) = struct.unpack(ttt_header_fmt, s)
+            except struct.error:
+                raise TravelTimeTableError(
+                    'invalid travel time table file: %s' % filename)
+
+            if magic != ttt_magic:
+                raise TravelTimeTableError(
+                    'invalid travel time table file: %s' % filename)
+
+            definitions = f.read(ndefs).split('\n')
+            times = num.fromfile(f, dtype='<f4', count=nz*nx)
+            if times.size != nz*nx:
+                raise TravelTimeTableError(
+                    'truncated travel time table file: %s' % filename)
+
+        finally:
+            f.close()
+
+        return cls(definitions, zstop, zmin, zmax, int(nz), xmin, xmax,
+                int(nx), times,
+                errors=dict(bilinear=err_bilinear, bicubic=err_bicubic))
+
+def first_arrival_times(model, phases, depths, distances, zstop=0.0,
+        refine=True, nworkers=1):
+    '''Compute first arrival times on a (source depth, distance) grid.
+
+    :param model: :py:class:`LayeredModel` object
+    :param phases: a :py:class:`PhaseDef` object or a list of such objects
+    :param depths: array of source depths [m]
+    :param distances: array of distances [deg]
+    :param zstop: receiver depth [m]
+    :param refine: passed to :py:meth:`LayeredModel.arrivals`
+    :param nworkers: number of worker processes to use, see
+        :py:meth:`LayeredModel.arrivals_many`
+    :returns: array of shape ``(depths.size, distances.size)`` with the
+        traveltimes, NaN where no ray is found
+    '''
+
+    distances = num.asarray(distances, dtype=num.float)
+    times = num.empty((len(depths), distances.size))
+    times.fill(num.nan)
+    for iz, rays in enumerate(model.arrivals_many(depths, distances,
+            phases=phases, zstop=zstop, refine=refine, nworkers=nworkers)):
+
+        for ray in rays:
+            ix = num.argmin(num.abs(distances - ray.x))
+            if not ray.t >= times[iz, ix]:
+                times[iz, ix] = ray.t
+
+    return times
+
+def cubic_convolution_weights(t):
+    '''Get weights of cubic convolution interpolation kernel.
+
+    For fractional positions `t` between the two central nodes, an array of
+    shape ``(t.size, 4)`` with the weights of the four neighbouring nodes is
+    returned.
+    '''
+
+    t = num.asarray(t, dtype=num.float)[:,num.newaxis]
+    w = num.empty((t.shape[0], 4))
+    w[:,0:1] = ((-0.5*t + 1.0)*t - 0.5)*t
+    w[:,1:2] = (1.5*t - 2.5)*t*t + 1.0
+    w[:,2:3] = ((-1.5*t + 2.0)*t + 0.5)*t
+    w[:,3:4] = (0.5*t - 0.5)*t*t
+    return w
+
 def read_hyposat_model(fn):
     '''Reader for HYPOSAT earth model files.
 
@@ -3171,6 +4118,42 @@ def from_crust2x2_profile(profile, depthmantle=50000):
 
             z += dz
 
+_crust2x2_models = {}
+
+def crust2x2_model(profile, depthmantle=50000):
+    '''Get shared layered model for a CRUST2.0 profile.
+
+    :param profile: :py:class:`pyrocko.crust2x2.Crust2Profile` object
+    :param depthmantle: thickness of mantle layer [m], see
+        :py:func:`from_crust2x2_profile`
+    :returns: :py:class:`LayeredModel` object
+
+    Models are memoized, keyed by the layer parameters of the profile. All
+    locations with the same CRUST2.0 profile get the same model instance, so
+    that ray paths cached in the model are reused. The returned model should
+    therefore not be modified.
+    '''
+
+    key = (depthmantle,) + tuple( tuple(profile.get_layer(i)) for i in range(8) )
+    if key not in _crust2x2_models:
+        _crust2x2_models[key] = LayeredModel.from_scanlines(
+                from_crust2x2_profile(profile, depthmantle=depthmantle))
+
+    return _crust2x2_models[key]
+
+def crust2x2_models(lats, lons, depthmantle=50000):
+    '''Get shared layered models for the CRUST2.0 profiles at many locations.
+
+    :param lats: latitudes (array-like)
+    :param lons: longitudes (array-like)
+    :returns: list of :py:class:`LayeredModel` objects, see
+        :py:func:`crust2x2_model`
+    '''
+
+    import crust2x2
+    return [ crust2x2_model(profile, depthmantle=depthmantle)
+             for profile in crust2x2.get_profiles(lats, lons) ]
+
 def write_nd_model_fh(mod, fh):
     def fmt(z, mat):
         return ' '.join( util.gform(x, 4) for x in [z/1000., mat.vp/1000., mat.vs/1000., mat.rho/1000., mat.qp, mat.qs] ).rstrip()+'\n'
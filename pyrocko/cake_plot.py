@@ -217,11 +217,7 @@ def plot_rays(paths, rays, zstart, zstop, plot=None):
         path_to_color[path] = colors[ipath%len(colors)]
 
     if rays is None:
-        rays = paths
-
-    for iray, ray in enumerate(rays):
-        if isinstance(ray, cake.RayPath):
-            path = ray
+        for path in paths:
             pmin, pmax, xmin, xmax, tmin, tmax = path.ranges(path.endgaps(zstart, zstop))
             if not path._is_headwave:
                 p = num.linspace(pmin, pmax, 6)
@@ -230,15 +226,17 @@ def plot_rays(paths, rays, zstart, zstop, plot=None):
                 x = num.linspace(xmin, xmin*10, 6)
                 p = num.atleast_1d(pmin)
 
-            fanz, fanx, _ = path.zxt_path_subdivided(p, path.endgaps(zstart, zstop), x_for_headwave=x)
-        else:
-            fanz, fanx, _ = ray.zxt_path_subdivided()
-            path = ray.path
-        
-        
-        color = path_to_color[path]
-        for zs, xs in zip(fanz, fanx):
-            l = plot.plot( xs, zs, color=color)
+            offsets, z, x, _ = path.zxt_path_packed(p, path.endgaps(zstart, zstop), x_for_headwave=x)
+            plot_packed(offsets, x, z, path_to_color[path], plot)
+
+    else:
+        offsets, z, x, _ = cake.zxt_rays_packed(rays)
+        for iray, ray in enumerate(rays):
+            plot_packed(offsets[iray:iray+2], x, z, path_to_color[ray.path], plot)
+
+def plot_packed(offsets, x, z, color, plot):
+    for i in xrange(offsets.size-1):
+        plot.plot(x[offsets[i]:offsets[i+1]], z[offsets[i]:offsets[i+1]], color=color)
 
 
 def sketch_model(mod, plot=None):
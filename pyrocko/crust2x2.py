@@ -63,7 +63,7 @@ Contents
 '''
 
 import numpy as num
-import os, sys
+import os, sys, math
 import copy
 from StringIO import StringIO
 
@@ -220,7 +220,41 @@ class Crust2:
         '''
         
         return self._typemap[self._indices(float(lat),float(lon))]
-        
+
+    def get_profiles(self, lats, lons):
+        '''Get crustal profiles at many locations.
+
+        :param lats: latitudes (array-like)
+        :param lons: longitudes (array-like)
+        :returns: list of :py:class:`Crust2Profile` objects
+
+        `lats` and `lons` are broadcast against each other. The cell indices
+        of all locations are computed at once. Locations in the same CRUST2.0
+        cell share the same profile object.
+        '''
+
+        ilats, ilons = self._indices_array(lats, lons)
+        return [ self._typemap[ilat, ilon] for (ilat, ilon) in
+                 zip(ilats.tolist(), ilons.tolist()) ]
+
+    def _indices_array(self, lats, lons):
+        lats, lons = num.broadcast_arrays(
+                num.asarray(lats, dtype=num.float),
+                num.asarray(lons, dtype=num.float))
+
+        lats = num.clip(lats.ravel(), -90., 90.)
+        lons = lons.ravel()
+        outside = num.logical_or(lons < -180., lons > 180.)
+        lons = num.where(outside,
+                lons - num.floor((lons+180.)/360.) * 360., lons)
+
+        dlo = 360./Crust2.nlo
+        dla = 180./Crust2.nla
+        cola = 90.-lats
+        ilats = num.clip((cola/dla).astype(num.int), 0, Crust2.nla-1)
+        ilons = ((lons+180.)/dlo).astype(num.int) % Crust2.nlo
+        return ilats, ilons
+
     def _indices(self, lat,lon):
         lat = _clip(lat, -90., 90.)
         lon = _wrap(lon, -180., 180.)
@@ -314,6 +348,15 @@ def get_profile(lat, lon):
     crust2 = Crust2.instance()
     return crust2.get_profile(lat,lon)
 
+def get_profiles(lats, lons):
+    '''Get Crust2x2 profiles for many locations.
+
+    See :py:meth:`Crust2.get_profiles`.
+    '''
+
+    crust2 = Crust2.instance()
+    return crust2.get_profiles(lats, lons)
+
         
 def plot_crustal_thickness(crust2=None, filename='crustal_thickness.pdf'):
     '''Create a quick and dirty plot of the crustal thicknesses defined in CRUST2.0.'''
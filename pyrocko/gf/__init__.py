@@ -2,4 +2,4 @@
 from pyrocko.gf.meta import *
 from pyrocko.gf.store import *
 from pyrocko.gf.builder import *
-
+from pyrocko.gf.server import *
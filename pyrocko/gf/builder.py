@@ -1,9 +1,22 @@
+import os, time, logging, multiprocessing
 import numpy as num
 
+from pyrocko.gf.store import Store, DuplicateInsert
+
+logger = logging.getLogger('pyrocko.gf.builder')
+
 def int_arr(*args):
     return num.array(args, dtype=num.int)
 
 class GFBuilder:
+    '''Base class for GF builders.
+
+    The GF set is partitioned into blocks, which can be computed
+    independently. Modelling code wrappers should subclass this class and
+    implement :py:meth:`work_block`, then :py:meth:`build` can be used to
+    schedule the computation.
+    '''
+
     def __init__(self, gf_set, block_size=None):
         if block_size is None:
             if len(gf_set.ns) == 3:
@@ -40,4 +53,99 @@ class GFBuilder:
         ends = self.gf_set.mins + (iends-1) * self.gf_set.deltas
         return begins, ends, iends - ibegins
 
+    def work_block(self, index):
+        '''Compute GF traces for a block.
+
+        To be implemented by the modelling code wrapper. Must return a list of
+        `(args, trace)` tuples, where `args` is the (high-level) index and
+        `trace` is the :py:class:`pyrocko.gf.store.GFTrace` to be stored.
+        '''
+
+        raise NotImplementedError()
+
+    def build(self, store_dir, nworkers=1):
+        '''Compute all blocks and fill results into GF store.
+
+        The blocks are distributed to a pool of `nworkers` worker processes,
+        each running :py:meth:`work_block`. The results are inserted into the
+        GF store at `store_dir` by the calling process, which holds the
+        store's lock while writing. Completed blocks are recorded in a
+        checkpoint file in the store directory, so that an interrupted build
+        can be resumed by calling this method again. The checkpoint file is
+        removed when all blocks are done.
+        '''
+
+        global _builder
+
+        if nworkers is None:
+            nworkers = 1
+
+        nworkers = max(1, nworkers)
+
+        checkpoint_fn = Store.build_checkpoint_fn_(store_dir)
+        done = set()
+        if os.path.exists(checkpoint_fn):
+            with open(checkpoint_fn, 'r') as f:
+                done.update( int(line) for line in f if line.strip() )
+
+        indices = [ index for index in self.all_block_indices()
+                if index not in done ]
+
+        ndone_before = len(done)
+        if ndone_before:
+            logger.info('resuming build, %i of %i blocks already done' %
+                    (ndone_before, self.nblocks))
+
+        store = Store(store_dir, 'w')
+        pool = None
+        try:
+            if nworkers == 1:
+                results = ( (index, self.work_block(index))
+                        for index in indices )
+            else:
+                _builder = self
+                pool = multiprocessing.Pool(nworkers)
+                results = pool.imap_unordered(_work_block, indices)
+
+            tstart = time.time()
+            ntraces = 0
+            for iblock, (index, traces) in enumerate(results):
+                store.lock()
+                try:
+                    for args, trace in traces:
+                        try:
+                            store.put(args, trace)
+                        except DuplicateInsert, e:
+                            logger.warn('%s (block %i)' % (e, index))
+
+                finally:
+                    store.unlock()
+
+                with open(checkpoint_fn, 'a') as f:
+                    f.write('%i\n' % index)
+
+                ntraces += len(traces)
+                tdur = time.time() - tstart
+                if tdur > 0.0:
+                    logger.info('block %i done (%i/%i), %.3g blocks/s, '
+                        '%.3g traces/s' % (index, ndone_before + iblock + 1,
+                            self.nblocks, (iblock + 1) / tdur, ntraces / tdur))
+
+            # all blocks are done, a rebuild has to start from scratch
+            if os.path.exists(checkpoint_fn):
+                os.remove(checkpoint_fn)
+
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                _builder = None
+
+            store.close()
+
+_builder = None
+
+def _work_block(index):
+    return index, _builder.work_block(index)
+
 __all__ = [ 'GFBuilder' ]
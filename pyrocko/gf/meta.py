@@ -142,6 +142,7 @@ class GFSet(Object):
         self._index_function = None
         self._indices_function = None
         self._vicinity_function = None
+        self._vicinities_function = None
         self._do_auto_updates = True
         self.update()
 
@@ -168,6 +169,23 @@ class GFSet(Object):
     def vicinity(self, *args):
         return self._vicinity_function(*args)
 
+    def vicinities(self, *args):
+        '''Get interpolation indices and weights for arrays of coordinates.
+
+        Array version of :py:meth:`vicinity`. Returns a tuple of two arrays
+        `(irecords, weights)`, both of shape *(N, 2**ndims)*, where *N* is the
+        number of coordinate tuples given and *ndims* is the number of
+        interpolated dimensions. For coordinates on the grid, the surplus
+        entries have zero weight.
+        '''
+        return self._vicinities_function(*args)
+
+    def record_args(self, irecord):
+        '''Get (high-level) index tuple for given low-level record index.'''
+
+        iargs = num.unravel_index(irecord, tuple(self.ns) + (self.ncomponents,))
+        return tuple( coords[i] for (coords, i) in zip(self.coords, iargs) )
+
     def iter_nodes(self, depth=None):
         return nditer_outer(self.coords[:depth])
 
@@ -207,6 +225,11 @@ class GFSetTypeA(GFSet):
     def distance(args):
         return args[1]
 
+    def source_receiver_distance(self, *args):
+        '''Get (source_depth, receiver_depth, distance) for given index.'''
+
+        return args[0], self.receiver_depth, args[1]
+
     def _update(self):
         self.mins = num.array([self.source_depth_min, self.distance_min])
         self.maxs =  num.array([self.source_depth_max, self.distance_max])
@@ -258,9 +281,27 @@ class GFSetTypeA(GFSet):
             
             return indis
 
+        def vicinities_function(a,b, ig):
+            ias = indi12_array((num.asarray(a) - amin) / da, na)
+            ibs = indi12_array((num.asarray(b) - bmin) / db, nb)
+
+            ig = num.asarray(ig)
+            if not num.all((0 <= ig) & (ig < ng)):
+                raise OutOfBounds()
+
+            indis, weights = [], []
+            for ia, va in ias:
+                iia = ia*nb*ng
+                for ib, vb in ibs:
+                    indis.append( iia + ib*ng + ig )
+                    weights.append( va*vb )
+
+            return num.array(indis).T, num.array(weights).T
+
         self._index_function = index_function
         self._indices_function = indices_function
         self._vicinity_function = vicinity_function
+        self._vicinities_function = vicinities_function
 
 class GFSetTypeB(GFSet):
     '''Rotational symmetry
@@ -281,6 +322,11 @@ class GFSetTypeB(GFSet):
     def distance(args):
         return args[2]
 
+    def source_receiver_distance(self, *args):
+        '''Get (source_depth, receiver_depth, distance) for given index.'''
+
+        return args[1], args[0], args[2]
+
     def _update(self):
         self.mins = num.array([self.receiver_depth_min, self.source_depth_min, self.distance_min])
         self.maxs =  num.array([self.receiver_depth_max, self.source_depth_max, self.distance_max])
@@ -336,9 +382,30 @@ class GFSetTypeB(GFSet):
             
             return indis
 
+        def vicinities_function(a,b,c, ig):
+            ias = indi12_array((num.asarray(a) - amin) / da, na)
+            ibs = indi12_array((num.asarray(b) - bmin) / db, nb)
+            ics = indi12_array((num.asarray(c) - cmin) / dc, nc)
+
+            ig = num.asarray(ig)
+            if not num.all((0 <= ig) & (ig < ng)):
+                raise OutOfBounds()
+
+            indis, weights = [], []
+            for ia, va in ias:
+                iia = ia*nb*nc*ng
+                for ib, vb in ibs:
+                    iib = ib*nc*ng
+                    for ic, vc in ics:
+                        indis.append( iia + iib + ic*ng + ig )
+                        weights.append( va*vb*vc )
+
+            return num.array(indis).T, num.array(weights).T
+
         self._index_function = index_function
         self._indices_function = indices_function
         self._vicinity_function = vicinity_function
+        self._vicinities_function = vicinities_function
 
 
 class Inventory(Object):
@@ -366,6 +433,25 @@ def indi12(x, n):
         v = x-f
         return ( (i, 1.-v), (i + 1, v) )
 
+def indi12_array(x, n):
+    '''Array version of :py:func:`indi12`.
+
+    Always returns two (index, weight) pairs of arrays. Where `x` is on a
+    grid node, the second weight is zero and its index equals the first.
+    '''
+
+    x = num.asarray(x, dtype=num.float)
+    r = num.round(x)
+    exact = num.abs(r - x) < vicinity_eps
+    f = num.where(exact, r, num.floor(x))
+    i = f.astype(num.int)
+    imax = num.where(exact, n-1, n-2)
+    if not num.all((0 <= i) & (i <= imax)):
+        raise OutOfBounds()
+
+    v = num.where(exact, 0., x-f)
+    return ( (i, 1.-v), (num.where(exact, i, i+1), v) )
+
 def float_or_none(s):
     units = {
             'k' : 1e3,
@@ -0,0 +1,120 @@
+import os, socket, logging
+import SocketServer
+
+from pyrocko import ipc
+from pyrocko.gf.store import Store
+from pyrocko.gf import meta as meta_module
+
+logger = logging.getLogger('pyrocko.gf.server')
+
+class ThreadingUnixStreamServer(SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+
+    daemon_threads = True
+
+class ThreadingTCPServer(SocketServer.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+class StoreServer(ipc.RPCServer):
+    '''Serve a GF store to local client processes.
+
+    The store at `store_dir` is opened once, with a shared trace cache of
+    `cache_size` bytes. `address` is either the path of a Unix socket or a
+    `(host, port)` tuple for TCP. Each client connection is handled in its
+    own thread and requests of different clients are processed
+    concurrently. Clients send batches of `get` and `sum` requests (see
+    :py:class:`RemoteStore`).
+    '''
+
+    def __init__(self, store_dir, address, cache_size=500*1024*1024):
+        self.connector_filename = None
+        self.exposed = {}
+        self.socket_path = None
+
+        if isinstance(address, basestring):
+            if os.path.exists(address):
+                os.unlink(address)
+
+            server = ThreadingUnixStreamServer(address, ipc.PersistentRPCHandler)
+            self.socket_path = address
+        else:
+            server = ThreadingTCPServer(address, ipc.PersistentRPCHandler)
+
+        server.rpcserver = self
+        self.server = server
+
+        self.store = Store(store_dir, cache_size=cache_size)
+
+        self.expose('batch')
+        self.expose('get_meta')
+
+    def get_meta(self):
+        return meta_module.dump(self.store.meta)
+
+    def batch(self, requests):
+        '''Process list of `(methodname, args, kwargs)` requests.
+
+        Methodname must be ``'get'`` or ``'sum'``. The results are returned
+        in a list of the same order.
+        '''
+
+        results = []
+        for methodname, args, kwargs in requests:
+            if methodname not in ('get', 'sum'):
+                raise ValueError('invalid request: %s' % methodname)
+
+            results.append(getattr(self.store, methodname)(*args, **kwargs))
+
+        return results
+
+    def close(self):
+        self.server.server_close()
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+            self.socket_path = None
+
+        self.store.close()
+
+class RemoteStore(ipc.RPCClient):
+    '''Client to access a GF store through a :py:class:`StoreServer`.
+
+    `address` is either the path of a Unix socket or a `(host, port)` tuple.
+    The methods :py:meth:`get` and :py:meth:`sum` have the same signatures as
+    those of :py:class:`pyrocko.gf.store.Store`. To reduce communication
+    overhead, many requests can be sent at once with :py:meth:`batch`.
+    '''
+
+    def __init__(self, address):
+        self.process = None
+        if isinstance(address, basestring):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        sock.connect(address)
+        self.sock = sock
+        self._meta = None
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            self._meta = meta_module.load(string=self.call('get_meta', (), {}))
+
+        return self._meta
+
+    def batch(self, requests):
+        '''Send list of `(methodname, args, kwargs)` requests in one go.
+
+        Returns list with the results.'''
+
+        return self.call('batch', (requests,), {})
+
+    def get(self, *args, **kwargs):
+        return self.batch([ ('get', args, kwargs) ])[0]
+
+    def sum(self, *args, **kwargs):
+        return self.batch([ ('sum', args, kwargs) ])[0]
+
+__all__ = [ 'StoreServer', 'RemoteStore' ]
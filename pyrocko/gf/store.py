@@ -1,5 +1,7 @@
-import os, struct, math, shutil, fcntl, copy, logging, re
-from collections import Counter
+import os, struct, math, shutil, fcntl, copy, logging, re, tempfile, zlib
+import threading
+import multiprocessing
+from collections import Counter, OrderedDict
 
 import numpy as num
 from scipy import signal
@@ -20,6 +22,11 @@ gf_store_header_dtype = [
 gf_store_header_fmt = '<Qf'
 gf_store_header_fmt_size = struct.calcsize(gf_store_header_fmt)
 
+# optional trailer of the index file, naming the traces file it refers to
+gf_store_trailer_fmt = '<56s8s'
+gf_store_trailer_fmt_size = struct.calcsize(gf_store_trailer_fmt)
+gf_store_trailer_magic = 'GFTRACES'
+
 gf_record_dtype = num.dtype([
         ('data_offset', '<u8'),
         ('itmin', '<i4'),
@@ -28,6 +35,15 @@ gf_record_dtype = num.dtype([
         ('end_value', '<f4'),
     ])
 
+gf_record_encoded_dtype = num.dtype(gf_record_dtype.descr + [
+        ('encoding', '<u4'),
+        ('data_nbytes', '<u4'),
+    ])
+
+gf_checksum_dtype = num.dtype(gf_record_dtype.descr + [ ('checksum', '<u4') ])
+
+gf_encodings = [ 'raw', 'zlib' ]
+
 def check_string_id(s):
     if not re.match(meta_module.StringID.pattern, s):
         raise ValueError('invalid name %s' % s)
@@ -55,6 +71,20 @@ def check_string_id(s):
 #
 # Values of first and last sample. These values are included in data[] 
 # redunantly.
+#
+# Stores created with an encoding other than 'raw' use an extended index
+# format with two additional fields per record:
+#
+# - encoding
+#
+# Index into gf_encodings of the encoding used for the trace data:
+#
+#  0 - 'raw': plain float32 samples
+#  1 - 'zlib': byte-shuffled float32 samples, compressed with zlib
+#
+# - data_nbytes
+#
+# Number of bytes occupied by the encoded trace data.
 
 class GFTrace:
     def __init__(self, data=None, itmin=0, deltat=1.0, 
@@ -120,6 +150,13 @@ class NotAllowedToInterpolate(StoreError):
     def __str__(self):
         return 'not allowed to interpolate'
 
+def _fsync_dir(dirname):
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 def remove_if_exists(fn, force=False):
     if os.path.exists(fn):
         if force:
@@ -138,8 +175,20 @@ class Store_:
         return os.path.join(store_dir, 'traces')
 
     @staticmethod
-    def create(store_dir, deltat, nrecords, force=False):
+    def checksums_fn_(store_dir):
+        return os.path.join(store_dir, 'checksums')
 
+    @staticmethod
+    def versioned_data_fns_(store_dir):
+        '''Get paths of traces files written by :py:meth:`_compact`.'''
+
+        base = os.path.basename(Store_.data_fn_(store_dir))
+        return [ os.path.join(store_dir, fn) for fn in sorted(os.listdir(store_dir))
+                 if re.match(r'^%s-\d+$' % base, fn) ]
+
+    @staticmethod
+    def create(store_dir, deltat, nrecords, force=False, encoding='raw'):
+        dtype = record_dtype(encoding)
 
         try:
             util.ensuredir(store_dir)
@@ -149,56 +198,119 @@ class Store_:
         index_fn = Store_.index_fn_(store_dir)
         data_fn = Store_.data_fn_(store_dir)
 
-        for fn in (index_fn, data_fn):
+        for fn in [ index_fn, data_fn, Store_.checksums_fn_(store_dir) ] + \
+                Store_.versioned_data_fns_(store_dir):
+
             remove_if_exists(fn, force)
 
         with open(index_fn, 'wb') as f:
             f.write(struct.pack(gf_store_header_fmt, nrecords, deltat))
-            records = num.zeros(nrecords, dtype=gf_record_dtype)
+            records = num.zeros(nrecords, dtype=dtype)
             records.tofile(f)
 
         with open(data_fn, 'wb') as f:
             f.write('\0' * 32)
 
-    def __init__(self, store_dir, mode='r', use_memmap=True):
+    def __init__(self, store_dir, mode='r', use_memmap=True, cache_size=0):
         self.store_dir = store_dir
         self.mode = mode
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
 
-        index_fn = self.index_fn()
-        data_fn = self.data_fn()
+        # guards the shared data file position and the trace cache, so that
+        # a store opened for reading can be used from several threads
+        self._data_lock = threading.Lock()
+        self._use_memmap = use_memmap
 
         if mode == 'r':
-            fmode = 'rb'
+            self._fmode = 'rb'
         elif mode == 'w':
-            fmode = 'r+b'
+            self._fmode = 'r+b'
         else:
             assert False
 
+        self._open()
+
+    def _open(self):
         try:
-            self._f_index = open(index_fn, fmode)
-            self._f_data = open(data_fn, fmode)
+            self._f_index = open(self.index_fn(), self._fmode)
+            self._data_basename, nbytes_trailer = self._read_trailer()
+            self._f_data = open(self.data_fn(), self._fmode)
         except:
             self.mode = ''
             raise CannotOpen('cannot open gf store: %s' % self.store_dir)
 
+        self._f_index.seek(0)
         dataheader = self._f_index.read(gf_store_header_fmt_size)
         nrecords, deltat = struct.unpack(gf_store_header_fmt, dataheader)
         self.nrecords = nrecords
         self.deltat = deltat
-        self._use_memmap = use_memmap
+
+        nbytes_index = os.fstat(self._f_index.fileno()).st_size \
+                - gf_store_header_fmt_size - nbytes_trailer
+
+        if nrecords != 0 and \
+                nbytes_index == nrecords * gf_record_encoded_dtype.itemsize:
+            self.encoding = 'zlib'
+        else:
+            self.encoding = 'raw'
+
+        self._record_dtype = record_dtype(self.encoding)
 
         self._load_index()
-        
+
+    def _read_trailer(self):
+        '''Get name of traces file and size of trailer of the index file.'''
+
+        f = self._f_index
+        size = os.fstat(f.fileno()).st_size
+        if size >= gf_store_header_fmt_size + gf_store_trailer_fmt_size:
+            f.seek(size - gf_store_trailer_fmt_size)
+            name, magic = struct.unpack(gf_store_trailer_fmt,
+                    f.read(gf_store_trailer_fmt_size))
+
+            if magic == gf_store_trailer_magic:
+                return name.rstrip('\0'), gf_store_trailer_fmt_size
+
+        return os.path.basename(Store_.data_fn_(self.store_dir)), 0
+
+    def _reopen(self):
+        if self._use_memmap:
+            del self._records
+
+        self._f_data.close()
+        self._f_index.close()
+        self._cache.clear()
+        self._cache_nbytes = 0
+        self._open()
+
+    def _is_current(self):
+        '''Check if the opened index file is still the one in the store.'''
+
+        return os.path.samestat(os.fstat(self._f_index.fileno()),
+                                os.stat(self.index_fn()))
+
 
     def __del__(self):
         if self.mode != '':
             self.close()
 
     def lock(self):
-        fcntl.lockf(self._f_index, fcntl.LOCK_EX)
+        while True:
+            fcntl.lockf(self._f_index, fcntl.LOCK_EX)
+            if self._is_current():
+                return
+
+            # files have been replaced by a compaction while waiting
+            fcntl.lockf(self._f_index, fcntl.LOCK_UN)
+            self._reopen()
 
     def unlock(self):
         self._f_data.flush()
+        if self.mode == 'w' and self._use_memmap:
+            self._records.flush()
+
         fcntl.lockf(self._f_index, fcntl.LOCK_UN)
 
     def put(self, irecord, trace):
@@ -238,7 +350,8 @@ class Store_:
         assert self.mode == 'r'
         assert 0 <= irecord < self.nrecords, 'irecord = %i, nrecords = %i' % (irecord, self.nrecords)
 
-        (ipos, itmin_data, nsamples_data, begin_value, end_value) = self._records[irecord]
+        (ipos, itmin_data, nsamples_data, begin_value, end_value) = \
+                self._get_record_values(irecord)
 
         if None in (itmin, nsamples): 
             itmin = itmin_data
@@ -258,7 +371,7 @@ class Store_:
         if decimate == 1:
             ilo = max(itmin, itmin_data) - itmin_data
             ihi = min(itmin+nsamples, itmin_data+nsamples_data) - itmin_data
-            data = self._get_data(ipos, begin_value, end_value, ilo, ihi)
+            data = self._get_data(irecord, ilo, ihi)
 
             return GFTrace(data, itmin_data+ilo, self.deltat,
                 begin_value=begin_value, end_value=end_value)
@@ -286,8 +399,7 @@ class Store_:
             ihi_data = max( ilo_data, itmax_overlap - itmin_data + 1)
 
             data_ext_pad = num.empty(nsamples_ext_pad, dtype=gf_dtype)
-            data_ext_pad[ilo:ihi] = self._get_data(ipos, begin_value, end_value, 
-                    ilo_data, ihi_data)
+            data_ext_pad[ilo:ihi] = self._get_data(irecord, ilo_data, ihi_data)
             data_ext_pad[:ilo] = begin_value
             data_ext_pad[ihi:] = end_value
 
@@ -309,7 +421,7 @@ class Store_:
         '''Get temporal extent of GF trace at given index.'''
         assert 0 <= irecord < self.nrecords, 'irecord = %i, nrecords = %i' % (irecord, self.nrecords)
         
-        (_, itmin, nsamples, _, _) = self._records[irecord]
+        (_, itmin, nsamples, _, _) = self._get_record_values(irecord)
 
         itmax = itmin + nsamples - 1
 
@@ -329,19 +441,33 @@ class Store_:
             raise DuplicateInsert('record %i already in store' % irecord)
 
         if trace.is_zero or num.all(trace.data == 0.0):
-            self._records[irecord] = (1,0,0,0.,0.)
+            self._set_record_values(irecord, (1,0,0,0.,0.))
             return
         
         ndata = trace.data.size
 
+        encoding, nbytes = 0, 0
         if ndata > 2:
             self._f_data.seek(0, 2)
             ipos = self._f_data.tell()
-            trace.data.tofile( self._f_data )
+            if self.encoding == 'raw':
+                trace.data.tofile( self._f_data )
+            else:
+                data = trace.data.astype(gf_dtype)
+                encoded = encode_data(data, self.encoding)
+                if len(encoded) < data.nbytes:
+                    encoding = gf_encodings.index(self.encoding)
+                    self._f_data.write(encoded)
+                    nbytes = len(encoded)
+                else:
+                    data.tofile( self._f_data )
+                    nbytes = data.nbytes
         else:
             ipos = 2
 
-        self._records[irecord] = (ipos, trace.itmin, ndata, trace.data[0], trace.data[-1])
+        self._set_record_values(irecord, 
+                (ipos, trace.itmin, ndata, trace.data[0], trace.data[-1]),
+                encoding, nbytes)
 
         
     def _sum(self, irecords, delays, weights, itmin=None, nsamples=None, decimate=1):
@@ -482,13 +608,15 @@ class Store_:
 
     def _load_index(self):
         if self._use_memmap:
-            records = num.memmap(self._f_index, dtype=gf_record_dtype, 
+            records = num.memmap(self._f_index, dtype=self._record_dtype, 
                     offset=gf_store_header_fmt_size,
-                    mode= ('r','r+')[self.mode == 'w'])
+                    mode= ('r','r+')[self.mode == 'w'],
+                    shape=(self.nrecords,))
 
         else:
             self._f_index.seek(gf_store_header_fmt_size)
-            records = num.fromfile(self._f_index, dtype=gf_record_dtype)
+            records = num.fromfile(self._f_index, dtype=self._record_dtype,
+                    count=self.nrecords)
 
         assert len(records) == self.nrecords
 
@@ -506,25 +634,243 @@ class Store_:
             self._records.tofile(self._f_index)
             self._f_index.flush()
 
-    def _get_data(self, ipos, begin_value, end_value, ilo, ihi): 
+    def _get_record_values(self, irecord):
+        record = self._records[irecord]
+        return tuple( record[name] for name in gf_record_dtype.names )
+
+    def _set_record_values(self, irecord, values, encoding=0, nbytes=0):
+        if self.encoding == 'raw':
+            self._records[irecord] = values
+        else:
+            self._records[irecord] = tuple(values) + (encoding, nbytes)
+
+    def _get_data(self, irecord, ilo, ihi): 
         if ihi - ilo > 0:
+            ipos, _, nsamples, begin_value, end_value = \
+                    self._get_record_values(irecord)
+
             if ipos == 2:
                 data_orig = num.empty(2, dtype=gf_dtype)
                 data_orig[0] = begin_value
                 data_orig[1] = end_value
                 return data_orig[ilo:ihi]
+
+            elif self._cache_size:
+                return self._get_data_cached(irecord, nsamples)[ilo:ihi].copy()
+
             else:
-                self._f_data.seek(ipos + ilo*gf_dtype_nbytes_per_sample)
-                return num.fromfile(self._f_data, gf_dtype, ihi-ilo)
+                return self._read_data(irecord, ilo, ihi)
         else:
             x  = num.empty((0,), dtype=gf_dtype)
             return num.empty((0,), dtype=gf_dtype)
 
+    def _read_data(self, irecord, ilo, ihi):
+        ipos, _, nsamples, _, _ = self._get_record_values(irecord)
+        if self.encoding != 'raw' and self._records[irecord]['encoding'] != 0:
+            record = self._records[irecord]
+            with self._data_lock:
+                self._f_data.seek(ipos)
+                encoded = self._f_data.read(record['data_nbytes'])
+
+            data = decode_data(encoded, 
+                    gf_encodings[record['encoding']], nsamples)
+
+            return data[ilo:ihi]
+
+        else:
+            with self._data_lock:
+                self._f_data.seek(ipos + ilo*gf_dtype_nbytes_per_sample)
+                return num.fromfile(self._f_data, gf_dtype, ihi-ilo)
+
+    def _get_data_cached(self, irecord, nsamples):
+        '''Get complete trace data, keeping up to `cache_size` bytes of
+        recently used traces in memory.'''
+
+        cache = self._cache
+        with self._data_lock:
+            if irecord in cache:
+                data = cache.pop(irecord)
+                cache[irecord] = data
+                return data
+
+        data = self._read_data(irecord, 0, nsamples)
+
+        with self._data_lock:
+            if irecord not in cache:
+                self._cache_nbytes += data.nbytes
+                while cache and self._cache_nbytes > self._cache_size:
+                    _, data_old = cache.popitem(last=False)
+                    self._cache_nbytes -= data_old.nbytes
+
+                cache[irecord] = data
+
+        return data
+
+    def _check_records(self, irecords):
+        '''Check consistency of given records and compute their checksums.'''
+
+        problems = num.zeros(len(irecords), dtype=num.int)
+        checksums = num.zeros(len(irecords), dtype=num.uint32)
+        for i, irecord in enumerate(irecords):
+            tr = self._get(irecord)
+            if tr and not tr.is_zero:
+                if not tr.begin_value == tr.data[0]:
+                    logger.warn('wrong begin value for trace at %s (data corruption?)' % self._record_str(irecord))
+                    problems[i] += 1
+                if not tr.end_value == tr.data[-1]:
+                    logger.warn('wrong end value for trace at %s (data corruption?)' % self._record_str(irecord))
+                    problems[i] += 1
+                if not num.all(num.isfinite(tr.data)):
+                    logger.warn('nans or infs in trace at %s' % self._record_str(irecord))
+                    problems[i] += 1
+
+                checksums[i] = zlib.crc32(tr.data.tostring()) & 0xffffffff
+
+        return problems, checksums
+
+    def _record_str(self, irecord):
+        return 'record %i' % irecord
+
+    def _load_checksums(self):
+        fn = self.checksums_fn()
+        if not os.path.exists(fn):
+            return None
+
+        saved = num.fromfile(fn, dtype=gf_checksum_dtype)
+        if len(saved) != self.nrecords:
+            logger.warn('ignoring checksums file with wrong number of records: %s' % fn)
+            return None
+
+        return saved
+
+    def _save_checksums(self, saved):
+        fn = self.checksums_fn()
+        fn_temp = fn + '.temp'
+        try:
+            saved.tofile(fn_temp)
+            os.rename(fn_temp, fn)
+
+        except (IOError, OSError), e:
+            logger.warn('cannot save checksums file %s (%s)' % (fn, e))
+
     def index_fn(self):
         return Store_.index_fn_(self.store_dir)
+
+    def checksums_fn(self):
+        return Store_.checksums_fn_(self.store_dir)
     
     def data_fn(self):
-        return Store_.data_fn_(self.store_dir)
+        return os.path.join(self.store_dir, self._data_basename)
+
+    def _merge_segment(self, segment_dir):
+        '''Move traces of a partially filled store into this store.
+
+        The traces file of the store at `segment_dir` is appended to this
+        store's traces file and the data offsets of its inserted records are
+        shifted accordingly.
+        '''
+
+        assert self.mode == 'w'
+
+        segment = Store_(segment_dir, 'r', use_memmap=False)
+        assert segment.nrecords == self.nrecords
+
+        records = segment._records
+        inserted = records['data_offset'] != 0
+        if num.any(inserted & (self._records['data_offset'] != 0)):
+            segment.close()
+            raise DuplicateInsert('segment %s overlaps with records already '
+                    'in store' % segment_dir)
+
+        self._f_data.seek(0, 2)
+        shift = self._f_data.tell() - 32
+        segment._f_data.seek(32)
+        shutil.copyfileobj(segment._f_data, self._f_data)
+        segment.close()
+
+        records = records[inserted]
+        with_data = records['data_offset'] > 2
+        records['data_offset'][with_data] += shift
+        self._records[inserted] = records
+
+    def _compact(self, irecords):
+        '''Rewrite traces file with trace data in given record order.
+
+        Trace data is copied into a new traces file in the order given by
+        `irecords`. Data not referenced by any record is dropped. The new
+        traces file gets a new name, which is recorded in the new index
+        file. Renaming the new index file into place then switches the
+        store over in a single step, so that an interruption leaves either
+        the old or the new state. The old traces file is removed
+        afterwards.
+        '''
+
+        assert self.mode == 'w'
+
+        base = os.path.basename(Store_.data_fn_(self.store_dir))
+        m = re.match(r'^%s-(\d+)$' % base, self._data_basename)
+        data_basename_new = '%s-%i' % (base, int(m.group(1))+1 if m else 1)
+        data_fn_new = os.path.join(self.store_dir, data_basename_new)
+        index_fn_temp = self.index_fn() + '.compact-temp'
+
+        self.lock()
+        try:
+            records = num.array(self._records)
+            saved = self._load_checksums()
+            if saved is not None:
+                known = num.ones(self.nrecords, dtype=num.bool)
+                for name in gf_record_dtype.names:
+                    known &= saved[name] == records[name]
+
+            if self.encoding == 'raw':
+                nbytes = records['nsamples'] * gf_dtype_nbytes_per_sample
+            else:
+                nbytes = records['data_nbytes']
+
+            with open(data_fn_new, 'wb') as f:
+                f.write('\0' * 32)
+                for irecord in irecords:
+                    ipos = records['data_offset'][irecord]
+                    if ipos > 2:
+                        self._f_data.seek(ipos)
+                        data = self._f_data.read(nbytes[irecord])
+                        records['data_offset'][irecord] = f.tell()
+                        f.write(data)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(index_fn_temp, 'wb') as f:
+                f.write(struct.pack(gf_store_header_fmt, self.nrecords, 
+                    self.deltat))
+                records.tofile(f)
+                f.write(struct.pack(gf_store_trailer_fmt, data_basename_new,
+                    gf_store_trailer_magic))
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.rename(index_fn_temp, self.index_fn())
+            _fsync_dir(self.store_dir)
+
+            if saved is not None:
+                saved['data_offset'][known] = records['data_offset'][known]
+                self._save_checksums(saved)
+
+        finally:
+            self.unlock()
+
+        self._reopen()
+
+        # remove old traces files, including any left over by interrupted
+        # compactions
+        for fn in [ Store_.data_fn_(self.store_dir) ] + \
+                Store_.versioned_data_fns_(self.store_dir):
+
+            if fn != self.data_fn() and os.path.exists(fn):
+                try:
+                    os.remove(fn)
+                except OSError, e:
+                    logger.warn('cannot remove old traces file %s (%s)' % (fn, e))
 
     def count_special_records(self):
         return num.histogram( self._records['data_offset'], bins=[0,1,2,3, num.uint64(-1) ] )[0]
@@ -550,10 +896,13 @@ class Store(Store_):
     for a problem with cylindrical symmetry, one might define a mapping from
     (z1, z2, r) -> i. Index translation is done in the
     :py:class:`pyrocko.gf.meta.GFSet` subclass object associated with the Store.
+
+    If a `cache_size` (in bytes) is given to the constructor, data of recently
+    used GF traces is held in memory, up to the given amount.
     '''
 
     @staticmethod
-    def create(store_dir, meta, force=False, extra=None):
+    def create(store_dir, meta, force=False, extra=None, encoding='raw'):
         '''Create new GF store.
         
         Creates a new GF store at path `store_dir`. The layout of the GF is
@@ -564,17 +913,26 @@ class Store(Store_):
         code, earth models or other, should be saved along with the GF store,
         these may be provided though a dict given to `extra`. The keys of 
         this dict must be names and the values must be *guts* type objects.
+
+        With `encoding` set to ``'zlib'``, trace data is stored compressed:
+        the bytes of the float32 samples are shuffled, so that bytes of equal
+        significance are adjacent, and the result is compressed with zlib.
+        Traces for which compression does not pay off are stored raw. The
+        encoding is recorded per record in the index and decoding is done
+        transparently when traces are read.
         '''
 
         store = Store_.create(store_dir, meta.deltat, meta.nrecords, 
-                force=force)
+                force=force, encoding=encoding)
 
         meta_fn = os.path.join(store_dir, 'meta')
         remove_if_exists(meta_fn, force)
+        remove_if_exists(Store.build_checkpoint_fn_(store_dir), force)
 
         meta_module.dump(meta, filename=meta_fn)
 
-        for sub_dir in 'decimated', 'extra':
+        # phase tables of a previous store would not match the new layout
+        for sub_dir in 'decimated', 'extra', 'phases':
             dpath = os.path.join(store_dir, sub_dir)
             if os.path.exists(dpath):
                 if force:
@@ -591,12 +949,17 @@ class Store(Store_):
                 remove_if_exists(fn, force)
                 meta_module.dump(v, filename=fn)
 
-    def __init__(self, store_dir, mode='r'):
-        Store_.__init__(self, store_dir, mode=mode)
+    @staticmethod
+    def build_checkpoint_fn_(store_dir):
+        return os.path.join(store_dir, 'build_checkpoint')
+
+    def __init__(self, store_dir, mode='r', cache_size=0):
+        Store_.__init__(self, store_dir, mode=mode, cache_size=cache_size)
         meta_fn = os.path.join(store_dir, 'meta')
         self.meta = meta_module.load(filename=meta_fn)
         self._decimated = {}
         self._extra = {}
+        self._phase_tables = {}
         for decimate in range(2,9):
             if os.path.isdir(self._decimated_store_dir(decimate)):
                 self._decimated[decimate] = None
@@ -627,7 +990,8 @@ class Store(Store_):
         irecord = self.meta.irecord(*args)
         return self._get_record(irecord)
 
-    def get(self, args, itmin=None, nsamples=None, decimate=1, interpolate='nearest_neighbor'):
+    def get(self, args, itmin=None, nsamples=None, decimate=1, interpolate='nearest_neighbor', 
+            phase_window=None):
         '''Retrieve GF trace from store.
 
         Retrieve a single GF trace from the store at (high-level) index `args`.
@@ -635,9 +999,16 @@ class Store(Store_):
         only the selected portion of the trace is extracted. If `decimate` is
         an integer in the range [2,8], the trace is decimated on the fly or, if
         available, the trace is read from a decimated version of the GF store.
+        Instead of `itmin` and `nsamples`, a time window relative to a
+        tabulated phase arrival may be given as a tuple `(phase_id, tmin,
+        tmax)` in `phase_window` (see :py:meth:`make_phase_table`).
         '''
 
         store, decimate = self._decimated_store(decimate)
+        if phase_window is not None:
+            itmin, nsamples = self._phase_window_samples(phase_window, args, 
+                    0.0, store.deltat * decimate)
+
         if interpolate == 'nearest_neighbor':
             irecord = store.meta.irecord(*args)
             return store._get(irecord, itmin=itmin, nsamples=nsamples, decimate=decimate)
@@ -649,7 +1020,8 @@ class Store(Store_):
 
             return store._sum(irecords, num.zeros(len(irecords)), weights, itmin, nsamples, decimate)
 
-    def sum(self, args, delays, weights, itmin=None, nsamples=None, decimate=1):
+    def sum(self, args, delays, weights, itmin=None, nsamples=None, decimate=1,
+            interpolate='nearest_neighbor', phase_window=None):
         '''Sum delayed and weighted GF traces.
 
         Calculate sum of delayed and weighted GF traces. `args` is a tuple of
@@ -659,10 +1031,37 @@ class Store(Store_):
         computation is restricted to the output time range *(decimated) sampling
         interval x [ itmin, (itmin + nsamples - 1) ]*.  If `decimate` is an
         integer in the range [2,8], decimated traces are used in the summation.
+        If `interpolate` is ``'multilinear'``, each source is replaced by its
+        neighboring GF nodes with multilinear interpolation weights (see
+        :py:meth:`pyrocko.gf.meta.GFSet.vicinities`). With ``'off'``, an
+        exception is raised if any of the sources is not on a GF node. If a
+        tuple `(phase_id, tmin, tmax)` is given in `phase_window`, the output
+        time range is set to cover the window *[tmin, tmax]* relative to the
+        delayed phase arrivals of all sources, as tabulated with
+        :py:meth:`make_phase_table`. Only the needed portions of the GF
+        traces are then read from disk.
         '''
 
         store, decimate = self._decimated_store(decimate)
-        irecords = store.meta.irecords(*args)
+        if phase_window is not None:
+            itmin, nsamples = self._phase_window_samples(phase_window, args,
+                    delays, store.deltat * decimate)
+
+        if interpolate == 'nearest_neighbor':
+            irecords = store.meta.irecords(*args)
+
+        else:
+            irecords, ipweights = store.meta.vicinities(*args)
+            if interpolate == 'off' and num.any(ipweights[:,1:] != 0.0):
+                raise NotAllowedToInterpolate()
+
+            weights = (num.asarray(weights)[:,num.newaxis] * ipweights).ravel()
+            delays = num.repeat(delays, ipweights.shape[1])
+            irecords = irecords.ravel()
+            nonzero = weights != 0.0
+            irecords, delays, weights = \
+                    irecords[nonzero], delays[nonzero], weights[nonzero]
+
         return store._sum(irecords, delays, weights, itmin, nsamples, decimate)
     
     def sum_reference(self, args, delays, weights, itmin=None, nsamples=None, decimate=1):
@@ -672,7 +1071,7 @@ class Store(Store_):
         irecords = store.meta.irecords(*args)
         return store._sum_reference(irecords, delays, weights, itmin, nsamples, decimate)
 
-    def make_decimated(self, decimate, meta=None, force=False):
+    def make_decimated(self, decimate, meta=None, force=False, nworkers=1):
         '''Create decimated version of GF store.
 
         Create a downsampled version of the GF store. Downsampling is done for
@@ -685,7 +1084,9 @@ class Store(Store_):
         within the GF store directory. Holding available decimated versions of
         the GF store can save computation time, IO bandwidth, or decrease
         memory footprint at the cost of increased disk space usage, when
-        computation are done for lower frequency signals.
+        computation are done for lower frequency signals. With `nworkers` > 1,
+        the work is distributed to the given number of worker processes (see
+        :py:meth:`fill`).
         '''
 
         if not (2 <= decimate <= 8):
@@ -711,19 +1112,186 @@ class Store(Store_):
 
 
         store_dir_incomplete = store_dir + '-incomplete'
-        Store.create(store_dir_incomplete, meta, force=force)
+        Store.create(store_dir_incomplete, meta, force=force, 
+                encoding=self.encoding)
 
         decimated = Store(store_dir_incomplete, 'w')
-        for args in decimated.meta.iter_nodes():
-            tr = self.get(args, decimate=decimate)
-            decimated.put(args, tr)
-
+        decimated.fill(self, decimate=decimate, nworkers=nworkers)
         decimated.close()
 
         shutil.move(store_dir_incomplete, store_dir)
 
         self._decimated[decimate] = None
 
+    def fill(self, source, decimate=1, interpolate='nearest_neighbor', 
+            skip_errors=False, nworkers=1):
+        '''Insert traces from another GF store.
+
+        For every node of this store, the corresponding trace is retrieved from
+        the :py:class:`Store` `source` with :py:meth:`get`, using the given
+        `decimate` and `interpolate` settings, and inserted into this store.
+        If `skip_errors` is ``True``, traces which cannot be retrieved or
+        inserted are skipped with a log message, otherwise the exception is
+        propagated.
+
+        If `nworkers` is larger than one, the records are partitioned into
+        contiguous ranges, which are processed by a pool of worker processes.
+        Each worker writes into its own temporary data segment and the
+        segments are merged into this store's traces file and index at the
+        end.
+        '''
+
+        assert self.mode == 'w'
+
+        if nworkers is None:
+            nworkers = 1
+
+        nworkers = max(1, nworkers)
+
+        if nworkers == 1:
+            _fill_records(source, self, xrange(self.nrecords), decimate, 
+                    interpolate, skip_errors)
+            return
+
+        segments_dir = tempfile.mkdtemp(prefix='segments-', dir=self.store_dir)
+        try:
+            jobs = []
+            for iworker, (ilo, ihi) in enumerate(
+                    _record_ranges(self.nrecords, nworkers)):
+
+                segment_dir = os.path.join(segments_dir, str(iworker))
+                Store_.create(segment_dir, self.deltat, self.nrecords, 
+                        encoding=self.encoding)
+                jobs.append((source.store_dir, self.store_dir, segment_dir, 
+                    ilo, ihi, decimate, interpolate, skip_errors))
+
+            self._f_data.flush()
+            pool = multiprocessing.Pool(nworkers)
+            try:
+                segment_dirs = pool.map(_fill_segment, jobs)
+            finally:
+                pool.terminate()
+                pool.join()
+
+            for segment_dir in segment_dirs:
+                self._merge_segment(segment_dir)
+
+        finally:
+            shutil.rmtree(segments_dir)
+
+    def compact(self, order='index'):
+        '''Rewrite traces file for sequential access.
+
+        The trace data is rewritten into a new traces file, dropping orphaned
+        data, and the index is updated accordingly. With `order` set to
+        ``'index'``, data is laid out in index order. With ``'zorder'``, the
+        GF nodes are arranged along a Z-order (Morton) space-filling curve, so
+        that traces of nodes which are neighbors in all spatial dimensions are
+        close to each other on disk. The store must be opened in write mode.
+        '''
+
+        if order == 'index':
+            irecords = num.arange(self.nrecords)
+        elif order == 'zorder':
+            iargs = num.unravel_index(num.arange(self.nrecords), 
+                    tuple(self.meta.ns) + (self.meta.ncomponents,))
+
+            irecords = num.lexsort((iargs[-1], zorder_keys(iargs[:-1])))
+        else:
+            raise StoreError('invalid order: %s' % order)
+
+        self._compact(irecords)
+
+    def make_phase_table(self, phase_id, model, phases, force=False):
+        '''Tabulate phase arrival times for all GF nodes.
+
+        For every node of the GF store, the time of the first arrival of any
+        of the phases in `phases` (a list of :py:class:`pyrocko.cake.PhaseDef`
+        objects) is computed for the earth model `model` (a
+        :py:class:`pyrocko.cake.LayeredModel`) and saved under the name
+        `phase_id` in the `phases` subdirectory of the GF store. Nodes without
+        arrival are marked with NaN. The table can then be used to select
+        phase-relative time windows in :py:meth:`get` and :py:meth:`sum`.
+        '''
+
+        from pyrocko import cake
+
+        check_string_id(phase_id)
+        fn = self._phase_table_fn(phase_id)
+        remove_if_exists(fn, force)
+
+        meta = self.meta
+        distances = meta.coords[-2]
+        outer_shape = tuple(meta.ns[:-1])
+        times = num.empty((int(num.prod(outer_shape)), distances.size))
+        times.fill(num.nan)
+        for iouter in xrange(times.shape[0]):
+            outer_args = tuple( coords[i] for (coords, i) in zip(meta.coords, 
+                num.unravel_index(iouter, outer_shape)) )
+
+            source_depth, receiver_depth, _ = \
+                    meta.source_receiver_distance(*(outer_args + (0.0,)))
+
+            for ray in model.arrivals(distances * cake.m2d, phases=phases,
+                    zstart=source_depth, zstop=receiver_depth):
+
+                idistance = num.argmin(num.abs(distances * cake.m2d - ray.x))
+                if not ray.t >= times[iouter, idistance]:
+                    times[iouter, idistance] = ray.t
+
+        util.ensuredirs(fn)
+        times.astype('<f8').tofile(fn)
+        self._phase_tables[phase_id] = times.ravel()
+
+    def get_phase_times(self, phase_id, args):
+        '''Get tabulated phase arrival times at (high-level) indices `args`.
+
+        The arrival time of the nearest GF node is returned.
+        '''
+
+        table = self._get_phase_table(phase_id)
+        return table[self.meta.irecords(*args) // self.meta.ncomponents]
+
+    def phase_ids(self):
+        '''Get names of available phase arrival tables.'''
+
+        dpath = os.path.join(self.store_dir, 'phases')
+        if not os.path.isdir(dpath):
+            return []
+
+        return sorted(os.listdir(dpath))
+
+    def _phase_table_fn(self, phase_id):
+        return os.path.join(self.store_dir, 'phases', phase_id)
+
+    def _get_phase_table(self, phase_id):
+        if phase_id not in self._phase_tables:
+            check_string_id(phase_id)
+            fn = self._phase_table_fn(phase_id)
+            if not os.path.exists(fn):
+                raise StoreError('no phase table %s in store %s' % 
+                        (phase_id, self.store_dir))
+
+            table = num.fromfile(fn, dtype='<f8')
+            if table.size * self.meta.ncomponents != self.nrecords:
+                raise StoreError('phase table %s does not match layout of '
+                        'store %s' % (phase_id, self.store_dir))
+
+            self._phase_tables[phase_id] = table
+
+        return self._phase_tables[phase_id]
+
+    def _phase_window_samples(self, phase_window, args, delays, deltat):
+        phase_id, tmin, tmax = phase_window
+        times = num.atleast_1d(self.get_phase_times(phase_id, args) + delays)
+        times = times[num.isfinite(times)]
+        if times.size == 0:
+            return None, None
+
+        itmin = int(math.floor((times.min() + tmin) / deltat))
+        itmax = int(math.ceil((times.max() + tmax) / deltat))
+        return itmin, itmax - itmin + 1
+
     def stats(self):
         counter = self.count_special_records()
 
@@ -745,23 +1313,77 @@ class Store(Store_):
 
     stats_keys = 'total inserted empty short zero size_data size_index decimated'.split()
 
-    def check(self):
-        problems = 0
-        i =0
-        for args in self.meta.iter_nodes():
-            tr = self.get(args)
-            if tr and not tr.is_zero:
-                if not tr.begin_value == tr.data[0]:
-                    logger.warn('wrong begin value for trace at %s (data corruption?)' % str(args))
-                    problems += 1
-                if not tr.end_value == tr.data[-1]:
-                    logger.warn('wrong end value for trace at %s (data corruption?)' % str(args))
-                    problems += 1
-                if not num.all(num.isfinite(tr.data)):
-                    logger.warn('nans or infs in trace at %s' % str(args))
-                    problems += 1
+    def check(self, incremental=False, nworkers=1):
+        '''Check GF store for problems.
+
+        Each trace is checked for consistency of its begin and end values and
+        for non-finite samples. A CRC32 checksum of every checked trace is
+        recorded, together with a copy of its index entry, in the sidecar file
+        `checksums` within the store directory. When a record is checked
+        again and its index entry has not changed, the checksum is verified
+        against the recorded one. If `incremental` is ``True``, only the
+        records which have been changed or inserted since the last check are
+        checked. With `nworkers` > 1, the work is distributed to the given
+        number of worker processes. Returns the number of problems found.
+        '''
+
+        if nworkers is None:
+            nworkers = 1
+
+        nworkers = max(1, nworkers)
+
+        records = num.array(self._records)
+
+        saved = self._load_checksums()
+        if saved is None:
+            saved = num.zeros(self.nrecords, dtype=gf_checksum_dtype)
+            known = num.zeros(self.nrecords, dtype=num.bool)
+        else:
+            known = num.ones(self.nrecords, dtype=num.bool)
+            for name in gf_record_dtype.names:
+                known &= saved[name] == records[name]
+
+        if incremental:
+            irecords = num.where(num.logical_not(known))[0]
+        else:
+            irecords = num.arange(self.nrecords)
+
+        if nworkers == 1 or len(irecords) == 0:
+            problems, checksums = self._check_records(irecords)
+        else:
+            jobs = [ (self.store_dir, irecords_worker) for irecords_worker 
+                    in num.array_split(irecords, nworkers) ]
+
+            pool = multiprocessing.Pool(nworkers)
+            try:
+                results = pool.map(_check_segment, jobs)
+            finally:
+                pool.terminate()
+                pool.join()
+
+            problems = num.concatenate([ p for (p, _) in results ])
+            checksums = num.concatenate([ c for (_, c) in results ])
+
+        mismatch = known[irecords] & (saved['checksum'][irecords] != checksums)
+        for irecord in irecords[mismatch]:
+            logger.warn('checksum mismatch for trace at %s (data corruption?)' % self._record_str(irecord))
+
+        # forget records with problems, so that these are checked again on
+        # the next incremental run, but keep the original checksums of
+        # records which have been modified in place
+        saved[irecords[problems != 0]] = num.zeros(1, dtype=gf_checksum_dtype)
+        problems += mismatch
+        good = problems == 0
+        for name in gf_record_dtype.names:
+            saved[name][irecords[good]] = records[name][irecords[good]]
+
+        saved['checksum'][irecords[good]] = checksums[good]
+        self._save_checksums(saved)
+
+        return int(num.sum(problems))
 
-        return problems
+    def _record_str(self, irecord):
+        return str(self.meta.record_args(irecord))
 
     def _decimated_store_dir(self, decimate):
         return os.path.join(self.store_dir, 'decimated', str(decimate))
@@ -770,12 +1392,107 @@ class Store(Store_):
         if decimate == 1 or decimate not in self._decimated:
             return self, decimate
         else:
-            store = self._decimated[decimate]
-            if store is None:
-                store = Store(self._decimated_store_dir(decimate), 'r')
-                self._decimated[decimate] = store
+            with self._data_lock:
+                store = self._decimated[decimate]
+                if store is None:
+                    store = Store(self._decimated_store_dir(decimate), 'r',
+                            cache_size=self._cache_size)
+                    self._decimated[decimate] = store
 
             return store, 1
 
+def record_dtype(encoding):
+    if encoding not in gf_encodings:
+        raise StoreError('unknown encoding: %s' % encoding)
+
+    if encoding == 'raw':
+        return gf_record_dtype
+    else:
+        return gf_record_encoded_dtype
+
+def encode_data(data, encoding):
+    '''Encode float32 sample array into a string of bytes.'''
+
+    assert encoding == 'zlib'
+    shuffled = data.view(num.uint8).reshape((data.size, 4)).T
+    return zlib.compress(shuffled.tostring())
+
+def decode_data(encoded, encoding, nsamples):
+    '''Decode string of bytes into float32 sample array.'''
+
+    assert encoding == 'zlib'
+    shuffled = num.fromstring(zlib.decompress(encoded), dtype=num.uint8)
+    return shuffled.reshape((4, nsamples)).T.copy().view(gf_dtype).ravel()
+
+def zorder_keys(indices):
+    '''Get Z-order (Morton) curve keys for arrays of grid indices.'''
+
+    keys = num.zeros(indices[0].size, dtype=num.uint64)
+    imax = max(int(i.max()) for i in indices)
+    ndims = len(indices)
+    ibit = 0
+    while (imax >> ibit) > 0:
+        for idim, i in enumerate(indices):
+            bit = (i.astype(num.uint64) >> num.uint64(ibit)) & num.uint64(1)
+            keys |= bit << num.uint64(ibit*ndims + idim)
+
+        ibit += 1
+
+    return keys
+
+def _record_ranges(nrecords, nranges):
+    bounds = num.linspace(0, nrecords, nranges+1).round().astype(num.int)
+    return [ (ilo, ihi) for (ilo, ihi) in zip(bounds[:-1], bounds[1:]) 
+            if ilo < ihi ]
+
+def _fill_records(source, dest, irecords, decimate, interpolate, skip_errors,
+        segment=None):
+
+    if segment is None:
+        segment = dest
+
+    for irecord in irecords:
+        args = dest.meta.record_args(irecord)
+        try:
+            if dest._records[irecord][0] != 0:
+                raise DuplicateInsert('record %i already in store' % irecord)
+
+            tr = source.get(args, decimate=decimate, interpolate=interpolate)
+            segment._put(irecord, tr)
+
+        except (meta_module.OutOfBounds, NotAllowedToInterpolate), e:
+            if not skip_errors:
+                raise
+
+            logger.debug('skipping %s, (%s)' % (str(args), e))
+
+        except StoreError, e:
+            if not skip_errors:
+                raise
+
+            logger.warn('cannot insert %s, (%s)' % (str(args), e))
+
+def _fill_segment(job):
+    (source_dir, dest_dir, segment_dir, ilo, ihi, decimate, interpolate, 
+            skip_errors) = job
+
+    source = Store(source_dir)
+    dest = Store(dest_dir)
+    segment = Store_(segment_dir, 'w')
+    _fill_records(source, dest, xrange(ilo, ihi), decimate, interpolate, 
+            skip_errors, segment=segment)
+
+    segment.close()
+    dest.close()
+    source.close()
+    return segment_dir
+
+def _check_segment(job):
+    store_dir, irecords = job
+    store = Store(store_dir)
+    result = store._check_records(irecords)
+    store.close()
+    return result
+
 __all__ = 'Store GFTrace Zero StoreError CannotCreate CannotOpen'.split()
 
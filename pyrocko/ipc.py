@@ -3,17 +3,31 @@ import socket, sys, os, subprocess, time, signal, traceback
 import cPickle as pickle
 import SocketServer
 
-import pile
+class EOF(Exception):
+    pass
 
 def send_object(sock, object):
-    data = pickle.dumps(object)
+    data = pickle.dumps(object, pickle.HIGHEST_PROTOCOL)
     header = pack('>Q', len(data))
-    sock.send(header+data)
+    sock.sendall(header+data)
+
+def receive_n(sock, n):
+    chunks = []
+    nread = 0
+    while nread < n:
+        chunk = sock.recv(min(n - nread, 1024*1024))
+        if not chunk:
+            raise EOF()
+
+        chunks.append(chunk)
+        nread += len(chunk)
+
+    return ''.join(chunks)
 
 def receive_object(sock):
-    header = sock.recv(8)
+    header = receive_n(sock, 8)
     length, = unpack( '>Q', header[:8] )
-    data = sock.recv(length)
+    data = receive_n(sock, length)
     object = pickle.loads(data)
     return object
 
@@ -24,6 +38,12 @@ def connector_filename(pid):
 class RPCHandler(SocketServer.BaseRequestHandler):
         
     def handle(self):
+        try:
+            self.handle_request()
+        except EOF:
+            pass
+
+    def handle_request(self):
         object = receive_object(self.request)
         
         response = None
@@ -38,6 +58,20 @@ class RPCHandler(SocketServer.BaseRequestHandler):
         
         send_object(self.request, (response, exception, traceback_exc))
 
+class PersistentRPCHandler(RPCHandler):
+    '''Handle requests on a connection until the client closes it.
+
+    An open connection blocks the server, so this handler should only be
+    used with a threading server.
+    '''
+
+    def handle(self):
+        try:
+            while True:
+                self.handle_request()
+        except EOF:
+            pass
+
 class RPCServer:    
 
     def __init__(self):
@@ -131,6 +165,7 @@ class RemotePileServer(RPCServer):
         self.expose('add_trace')
         
     def add_trace(self, tr):
+        import pile
         memfile = pile.MemTracesFile(None,[tr])
         self.pile.add_file(memfile)
         
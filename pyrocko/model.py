@@ -124,8 +124,8 @@ class Event:
             file.write('duration = %g\n' % self.duration)
 
     @staticmethod
-    def unique(events, deltat=10., group_cmp=(lambda a,b: cmp(a.catalog, b.catalog))):
-        groups = Event.grouped(events, deltat)
+    def unique(events, deltat=10., group_cmp=(lambda a,b: cmp(a.catalog, b.catalog)), max_distance=None):
+        groups = Event.grouped(events, deltat, max_distance)
         
         events = []
         for group in groups:
@@ -136,25 +136,8 @@ class Event:
         return events
 
     @staticmethod
-    def grouped(events, deltat=10.):
-        events = list(events)
-        groups = []
-        for ia,a in enumerate(events):
-            groups.append([])
-            haveit = False
-            for ib,b in enumerate(events[:ia]):
-                if abs(b.time - a.time) < deltat:
-                    groups[ib].append(a)
-                    haveit = True
-                    break
-
-            if not haveit:
-                groups[ia].append(a)
-
-        
-        groups = [ g for g in groups if g ]
-        groups.sort( key=lambda g: sum(e.time for e in g)/len(g) )
-        return groups
+    def grouped(events, deltat=10., max_distance=None):
+        return EventIndex(events).grouped(deltat, max_distance)
 
     @staticmethod
     def dump_catalog(events, filename):
@@ -264,6 +247,182 @@ def load_one_event(filename):
     l = Event.load_catalog(filename)
     return l.next()
 
+def _bisect(predicate, lo, hi):
+    '''Find first index in `[lo, hi)` where a monotonic predicate is true.
+
+    Vectorized over arrays `lo`, `hi`. The predicate must be false, then true
+    within each range. Returns `hi` where it is false throughout.
+    '''
+
+    lo = lo.copy()
+    hi = hi.copy()
+    while True:
+        active = lo < hi
+        if not num.any(active):
+            return lo
+
+        mid = (lo + hi) // 2
+        mid_true = predicate(num.where(active, mid, 0))
+        hi = num.where(active & mid_true, mid, hi)
+        lo = num.where(active & ~mid_true, mid+1, lo)
+
+def _range_minima(values, ilo, ihi):
+    '''Get minimum of `values[ilo[i]:ihi[i]]` for each `i`.
+
+    Ranges must not be empty. Works level by level on a sparse table, so
+    that it needs O(n log n) operations but only O(n) memory.
+    '''
+
+    lengths = ihi - ilo
+    minima = num.empty(lengths.size, dtype=values.dtype)
+    if lengths.size == 0:
+        return minima
+
+    # level[i] is the minimum of values[i:i+width]
+    level = values
+    width = 1
+    maxlength = num.max(lengths)
+    while True:
+        sel = num.logical_and(width <= lengths, lengths < 2*width)
+        minima[sel] = num.minimum(level[ilo[sel]], level[ihi[sel]-width])
+        if 2*width > maxlength:
+            return minima
+
+        level = num.minimum(level[:-width], level[width:])
+        width *= 2
+
+class EventIndex:
+    '''Index of events for fast queries by time.
+
+    The event times are held in a sorted array, so that time window queries
+    and nearest event lookups need O(log n) operations. Results refer to
+    the list of events `events` given to the constructor.
+    '''
+
+    def __init__(self, events):
+        self.events = list(events)
+        times = num.array([ ev.time for ev in self.events ], dtype=num.float)
+        self._order = num.argsort(times, kind='mergesort')
+        self._times = times[self._order]
+        self._lats = num.array([ ev.lat for ev in self.events ],
+                dtype=num.float)[self._order]
+        self._lons = num.array([ ev.lon for ev in self.events ],
+                dtype=num.float)[self._order]
+
+    def __len__(self):
+        return len(self.events)
+
+    def window_indices(self, tmin, tmax):
+        '''Get indices of events with `tmin <= time <= tmax`, in time order.'''
+
+        ibeg = num.searchsorted(self._times, tmin, 'left')
+        iend = num.searchsorted(self._times, tmax, 'right')
+        return self._order[ibeg:iend]
+
+    def get_events_in_window(self, tmin, tmax):
+        '''Get events with `tmin <= time <= tmax`, in time order.'''
+
+        return [ self.events[i] for i in self.window_indices(tmin, tmax) ]
+
+    def nearest_indices(self, times):
+        '''Get indices of the events nearest in time to each of `times`.'''
+
+        times = num.asarray(times, dtype=num.float)
+        n = self._times.size
+        if n == 0:
+            raise ValueError('no events in index')
+
+        iright = num.clip(num.searchsorted(self._times, times), 0, n-1)
+        ileft = num.maximum(iright-1, 0)
+        use_left = num.abs(times - self._times[ileft]) <= \
+                num.abs(self._times[iright] - times)
+
+        return self._order[num.where(use_left, ileft, iright)]
+
+    def get_nearest_event(self, time):
+        '''Get event nearest in time to `time` or `None` if index is empty.'''
+
+        if not self.events:
+            return None
+
+        return self.events[self.nearest_indices(time)]
+
+    def _group_slots(self, deltat, max_distance, chunk_size=1000000):
+        n = self._times.size
+        slots = num.arange(n)
+        if n == 0:
+            return slots
+
+        if max_distance is None:
+            # each event goes to the slot of the first event within its
+            # time window, which can be found without looking at all the
+            # pairs of events in the window
+            times = self._times
+            ii = num.arange(n)
+            ilo = _bisect(lambda j: times[ii] - times[j] < deltat,
+                    num.zeros(n, dtype=num.int), ii)
+            ihi = _bisect(lambda j: num.logical_not(times[j] - times[ii] < deltat),
+                    ii+1, num.zeros(n, dtype=num.int) + n)
+
+            slots[self._order] = _range_minima(self._order, ilo, ihi)
+            return slots
+
+        ilo = num.searchsorted(self._times, self._times - deltat, 'left')
+        ihi = num.searchsorted(self._times, self._times + deltat, 'right')
+        counts = ihi - ilo
+
+        ncum = num.cumsum(counts)
+        ibeg = 0
+        while ibeg < n:
+            ndone = ncum[ibeg-1] if ibeg > 0 else 0
+            iend = max(ibeg+1,
+                    num.searchsorted(ncum, ndone + chunk_size, 'right'))
+            cnts = counts[ibeg:iend]
+            npairs = num.sum(cnts)
+            ia = num.repeat(num.arange(ibeg, iend), cnts)
+            ib = num.arange(npairs) - num.repeat(num.cumsum(cnts) - cnts, cnts) \
+                    + num.repeat(ilo[ibeg:iend], cnts)
+
+            ia_orig = self._order[ia]
+            ib_orig = self._order[ib]
+            mask = num.logical_and(ib_orig < ia_orig,
+                    num.abs(self._times[ib] - self._times[ia]) < deltat)
+
+            ia, ib, ia_orig, ib_orig = ia[mask], ib[mask], ia_orig[mask], ib_orig[mask]
+
+            if max_distance is not None and ia.size != 0:
+                dists = orthodrome.distance_accurate50m_numpy(
+                        self._lats[ia], self._lons[ia],
+                        self._lats[ib], self._lons[ib])
+
+                mask = dists <= max_distance
+                ia_orig, ib_orig = ia_orig[mask], ib_orig[mask]
+
+            num.minimum.at(slots, ia_orig, ib_orig)
+            ibeg = iend
+
+        return slots
+
+    def grouped(self, deltat=10., max_distance=None):
+        '''Group events which are close in time and space.
+
+        Each event is put into the group of the first event (in the order
+        given to the constructor) which precedes it in that order and whose
+        time differs by less than `deltat` and, if `max_distance` is given,
+        whose epicentral distance is at most `max_distance` [m]. If there is
+        no such event, it starts a new group. Returns list of groups (lists
+        of events), sorted by mean event time.
+        '''
+
+        slots = self._group_slots(deltat, max_distance)
+        groups = [ [] for i in xrange(len(self.events)) ]
+        for islot, ev in zip(slots.tolist(), self.events):
+            groups[islot].append(ev)
+
+        groups = [ g for g in groups if g ]
+        groups.sort( key=lambda g: sum(e.time for e in g)/len(g) )
+        return groups
+
 class Station:
     def __init__(self, network='', station='', location='', lat=0.0, lon=0.0, elevation=0.0, depth=None, name='', channels=None):
         self.network = network
@@ -458,6 +617,16 @@ def float_or_none(s):
     else:
         return float(s)
     
+def _nan_if_none(x):
+    if x is None:
+        return num.nan
+    return x
+
+def _none_if_nan(x):
+    if num.isnan(x):
+        return None
+    return float(x)
+
 def load_stations(filename):
     stations = []
     f = open(filename, 'r')
@@ -482,6 +651,132 @@ def load_stations(filename):
     f.close()
     return stations
 
+class StationTable:
+    '''Columnar representation of a set of stations.
+
+    Station coordinates are held in numpy arrays `lats`, `lons`,
+    `elevations` and `depths` (NaN where unknown), station identifiers in the
+    list `nsls` of `(network, station, location)` tuples. Names and channels
+    are kept in the lists `names` and `channels`, so that conversion from and
+    to lists of :py:class:`Station` objects is lossless.
+    '''
+
+    def __init__(self, nsls=(), lats=(), lons=(), elevations=None, depths=None,
+            names=None, channels=None):
+
+        self.nsls = [ tuple(nsl) for nsl in nsls ]
+        n = len(self.nsls)
+        self.lats = num.array(lats, dtype=num.float)
+        self.lons = num.array(lons, dtype=num.float)
+        if elevations is None:
+            elevations = num.zeros(n)
+        if depths is None:
+            depths = num.zeros(n) * num.nan
+        if names is None:
+            names = [''] * n
+        if channels is None:
+            channels = [ [] for i in xrange(n) ]
+
+        self.elevations = num.array(elevations, dtype=num.float)
+        self.depths = num.array(depths, dtype=num.float)
+        self.names = list(names)
+        self.channels = [ list(chas) for chas in channels ]
+
+        assert all(len(x) == n for x in (self.lats, self.lons,
+            self.elevations, self.depths, self.names, self.channels))
+
+    def __len__(self):
+        return len(self.nsls)
+
+    @staticmethod
+    def from_stations(stations):
+        stations = list(stations)
+        return StationTable(
+                nsls=[ sta.nsl() for sta in stations ],
+                lats=[ sta.lat for sta in stations ],
+                lons=[ sta.lon for sta in stations ],
+                elevations=[ _nan_if_none(sta.elevation) for sta in stations ],
+                depths=[ _nan_if_none(sta.depth) for sta in stations ],
+                names=[ sta.name for sta in stations ],
+                channels=[ sta.get_channels() for sta in stations ])
+
+    def to_stations(self):
+        stations = []
+        for i, (net, sta, loc) in enumerate(self.nsls):
+            stations.append(Station(net, sta, loc,
+                lat=float(self.lats[i]),
+                lon=float(self.lons[i]),
+                elevation=_none_if_nan(self.elevations[i]),
+                depth=_none_if_nan(self.depths[i]),
+                name=self.names[i],
+                channels=copy.deepcopy(self.channels[i])))
+
+        return stations
+
+    def nslc_ids(self):
+        '''Get list of `(network, station, location, channel)` tuples.'''
+
+        return [ nsl + (cha.name,)
+                    for (nsl, chas) in zip(self.nsls, self.channels)
+                        for cha in chas ]
+
+    def relative_to(self, events):
+        '''Compute event relative data for all stations and events at once.
+
+        `events` is a list of :py:class:`Event` objects or a single event.
+        Returns `(dist_m, dist_deg, azimuths, backazimuths)`, numpy arrays of
+        shape `(nevents, nstations)`, or `(nstations,)` if a single event is
+        given. The values are the same as those set by
+        :py:meth:`Station.set_event_relative_data`.
+        '''
+
+        single = isinstance(events, Event)
+        if single:
+            events = [ events ]
+
+        elats = num.array([ ev.lat for ev in events ], dtype=num.float)
+        elons = num.array([ ev.lon for ev in events ], dtype=num.float)
+        elats = elats[:,num.newaxis]
+        elons = elons[:,num.newaxis]
+        slats = self.lats[num.newaxis,:]
+        slons = self.lons[num.newaxis,:]
+
+        dist_m = orthodrome.distance_accurate50m_numpy(elats, elons, slats, slons)
+        dist_deg = dist_m / orthodrome.earthradius_equator * orthodrome.r2d
+        azimuths = orthodrome.azimuth_numpy(elats, elons, slats, slons)
+        backazimuths = orthodrome.azimuth_numpy(slats, slons, elats, elons)
+
+        if single:
+            return dist_m[0], dist_deg[0], azimuths[0], backazimuths[0]
+        else:
+            return dist_m, dist_deg, azimuths, backazimuths
+
+def set_event_relative_data(stations, event):
+    '''Call :py:meth:`Station.set_event_relative_data` for many stations.
+
+    Uses :py:meth:`StationTable.relative_to` to compute the values for all
+    stations at once.
+    '''
+
+    stations = list(stations)
+    if not stations:
+        return
+
+    table = StationTable(
+            nsls=[ sta.nsl() for sta in stations ],
+            lats=[ sta.lat for sta in stations ],
+            lons=[ sta.lon for sta in stations ])
+
+    # relative_to returns numpy arrays; convert to plain floats to get the
+    # same attribute types as Station.set_event_relative_data
+    values = [ a[0].tolist() for a in table.relative_to([ event ]) ]
+    for sta, dist_m, dist_deg, azimuth, backazimuth in zip(stations, *values):
+
+        sta.dist_m = dist_m
+        sta.dist_deg = dist_deg
+        sta.azimuth = azimuth
+        sta.backazimuth = backazimuth
+
 class Channel:
     def __init__(self, name, azimuth=None, dip=None, gain=1.0):
         self.name = name
@@ -537,6 +832,349 @@ def load_gfz_event_list(filename):
     f.close()
     return elist
 
+binary_block_header_dtype = num.dtype([
+    ('nrecords', '<i8'),
+    ('nchannels', '<i8'),
+    ('nstrings', '<i8'),
+    ('nstringbytes', '<i8')])
+
+binary_event_dtype = num.dtype([
+    ('time', '<f8'),
+    ('lat', '<f8'),
+    ('lon', '<f8'),
+    ('depth', '<f8'),
+    ('magnitude', '<f8'),
+    ('duration', '<f8'),
+    ('m6', '<f8', (6,)),
+    ('name', '<i4'),
+    ('region', '<i4'),
+    ('catalog', '<i4')])
+
+binary_station_dtype = num.dtype([
+    ('network', '<i4'),
+    ('station', '<i4'),
+    ('location', '<i4'),
+    ('name', '<i4'),
+    ('lat', '<f8'),
+    ('lon', '<f8'),
+    ('elevation', '<f8'),
+    ('depth', '<f8'),
+    ('nchannels', '<i4')])
+
+binary_channel_dtype = num.dtype([
+    ('name', '<i4'),
+    ('azimuth', '<f8'),
+    ('dip', '<f8'),
+    ('gain', '<f8')])
+
+binary_string_dtype = num.dtype([
+    ('length', '<i4'),
+    ('unicode', '<i1')])
+
+binary_event_magic = 'PYREVB01'
+binary_station_magic = 'PYRSTB01'
+
+def _nones_if_nan(a):
+    return [ (None if x != x else x) for x in a.tolist() ]
+
+class _StringTable:
+    def __init__(self):
+        self.strings = []
+        self.unicode_flags = []
+        self._indices = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def index(self, s):
+        if s is None:
+            return -1
+
+        # u'abc' == 'abc', but the type should survive the round trip
+        is_unicode = isinstance(s, unicode)
+        k = s, is_unicode
+        if k not in self._indices:
+            self._indices[k] = len(self.strings)
+            if is_unicode:
+                s = s.encode('utf-8')
+
+            self.strings.append(s)
+            self.unicode_flags.append(is_unicode)
+
+        return self._indices[k]
+
+def _lookup_strings(strings, indices):
+    return [ (None if i < 0 else strings[i]) for i in indices.tolist() ]
+
+def _write_binary_block(f, records, channels, strings):
+    string_infos = num.zeros(len(strings), dtype=binary_string_dtype)
+    string_infos['length'] = [ len(s) for s in strings.strings ]
+    string_infos['unicode'] = strings.unicode_flags
+    header = num.zeros(1, dtype=binary_block_header_dtype)
+    header['nrecords'] = records.size
+    header['nchannels'] = channels.size
+    header['nstrings'] = string_infos.size
+    header['nstringbytes'] = num.sum(string_infos['length'])
+    f.write(header.tostring())
+    f.write(records.tostring())
+    f.write(channels.tostring())
+    f.write(string_infos.tostring())
+    f.write(''.join(strings.strings))
+
+def _read_exactly(f, nbytes):
+    data = f.read(nbytes)
+    if len(data) != nbytes:
+        raise FileParseError('unexpected end of file')
+
+    return data
+
+def _read_array(f, dtype, count):
+    dtype = num.dtype(dtype)
+    return num.frombuffer(_read_exactly(f, dtype.itemsize*count), dtype=dtype).copy()
+
+def _iload_binary_blocks(filename, magic, record_dtype):
+    f = open(filename, 'rb')
+    try:
+        if f.read(len(magic)) != magic:
+            raise FileParseError('%s: not a file of the expected binary format' % filename)
+
+        while True:
+            data = f.read(binary_block_header_dtype.itemsize)
+            if not data:
+                break
+
+            if len(data) != binary_block_header_dtype.itemsize:
+                raise FileParseError('%s: unexpected end of file' % filename)
+
+            header = num.frombuffer(data, dtype=binary_block_header_dtype)[0]
+            records = _read_array(f, record_dtype, header['nrecords'])
+            channels = _read_array(f, binary_channel_dtype, header['nchannels'])
+            string_infos = _read_array(f, binary_string_dtype, header['nstrings'])
+            data = _read_exactly(f, header['nstringbytes'])
+            lengths = string_infos['length']
+            ends = num.cumsum(lengths)
+            strings = [ (data[ibeg:iend].decode('utf-8') if is_unicode else data[ibeg:iend])
+                        for (ibeg, iend, is_unicode) in zip(
+                            (ends-lengths).tolist(), ends.tolist(),
+                            string_infos['unicode'].tolist()) ]
+
+            yield records, channels, strings
+
+    finally:
+        f.close()
+
+def _dump_binary(objects, filename, magic, to_binary, block_size):
+    f = open(filename, 'wb')
+    try:
+        f.write(magic)
+        block = []
+        for obj in objects:
+            block.append(obj)
+            if len(block) == block_size:
+                strings = _StringTable()
+                records, channels = to_binary(block, strings)
+                _write_binary_block(f, records, channels, strings)
+                block = []
+
+        if block:
+            strings = _StringTable()
+            records, channels = to_binary(block, strings)
+            _write_binary_block(f, records, channels, strings)
+
+    finally:
+        f.close()
+
+def _merge_binary_blocks(blocks, string_fields, channel_string_fields=()):
+    all_records, all_channels, all_strings = [], [], []
+    for records, channels, strings in blocks:
+        for k in string_fields:
+            records[k] = num.where(records[k] < 0, -1, records[k] + len(all_strings))
+        for k in channel_string_fields:
+            channels[k] = num.where(channels[k] < 0, -1, channels[k] + len(all_strings))
+
+        all_records.append(records)
+        all_channels.append(channels)
+        all_strings.extend(strings)
+
+    if not all_records:
+        return None, None, []
+
+    return num.concatenate(all_records), num.concatenate(all_channels), all_strings
+
+def _events_to_binary(events, strings):
+    rows = []
+    for ev in events:
+        if ev.moment_tensor is not None:
+            m = ev.moment_tensor.m()
+            m6 = [ float(m[i,j]) for (i,j) in ((0,0), (1,1), (2,2), (0,1), (0,2), (1,2)) ]
+        else:
+            m6 = [ num.nan ] * 6
+
+        rows.append((_nan_if_none(ev.time), _nan_if_none(ev.lat),
+            _nan_if_none(ev.lon), _nan_if_none(ev.depth),
+            _nan_if_none(ev.magnitude), _nan_if_none(ev.duration), m6,
+            strings.index(ev.name), strings.index(ev.region),
+            strings.index(ev.catalog)))
+
+    return num.array(rows, dtype=binary_event_dtype), \
+            num.zeros(0, dtype=binary_channel_dtype)
+
+def _binary_to_events(records, strings):
+    have_mt = num.all(num.isfinite(records['m6']), axis=1).tolist()
+    events = []
+    for (time, lat, lon, depth, magnitude, duration, m6, hmt, name, region,
+            catalog_) in zip(
+                _nones_if_nan(records['time']),
+                _nones_if_nan(records['lat']),
+                _nones_if_nan(records['lon']),
+                _nones_if_nan(records['depth']),
+                _nones_if_nan(records['magnitude']),
+                _nones_if_nan(records['duration']),
+                records['m6'].tolist(),
+                have_mt,
+                _lookup_strings(strings, records['name']),
+                _lookup_strings(strings, records['region']),
+                _lookup_strings(strings, records['catalog'])):
+
+        mt = None
+        if hmt:
+            mt = moment_tensor.MomentTensor(m=moment_tensor.symmat6(*m6))
+
+        events.append(Event(lat, lon, time, name=name, depth=depth,
+            magnitude=magnitude, region=region, catalog=catalog_,
+            moment_tensor=mt, duration=duration))
+
+    return events
+
+def dump_events_binary(events, filename, block_size=100000):
+    '''Write events to a file in pyrocko's binary event format.
+
+    The file is a sequence of blocks of at most `block_size` events, each
+    holding a fixed size record of type :py:data:`binary_event_dtype` per
+    event and a table of the strings (names, regions, catalogs) referred to
+    in the block. Unicode strings are stored UTF-8 encoded and are decoded
+    again when loading. `events` may be any iterable, it is consumed block
+    by block.
+    '''
+
+    _dump_binary(events, filename, binary_event_magic, _events_to_binary,
+            block_size)
+
+def iload_events_binary(filename):
+    '''Read events from a file in pyrocko's binary event format, block by block.
+
+    Generator yielding :py:class:`Event` objects.
+    '''
+
+    for records, _, strings in _iload_binary_blocks(filename,
+            binary_event_magic, binary_event_dtype):
+
+        for ev in _binary_to_events(records, strings):
+            yield ev
+
+def load_events_binary(filename):
+    '''Read events from a file in pyrocko's binary event format.
+
+    Returns a list of :py:class:`Event` objects.
+    '''
+
+    return list(iload_events_binary(filename))
+
+def load_event_records_binary(filename):
+    '''Read events from a file in pyrocko's binary event format into arrays.
+
+    Returns `(records, strings)`, where `records` is a numpy record array of
+    type :py:data:`binary_event_dtype` and `strings` a list of strings. The
+    string fields of the records hold indices into `strings` (-1 for
+    `None`). This is much faster than creating :py:class:`Event` objects.
+    '''
+
+    records, _, strings = _merge_binary_blocks(
+        _iload_binary_blocks(filename, binary_event_magic, binary_event_dtype),
+        ('name', 'region', 'catalog'))
+
+    if records is None:
+        records = num.zeros(0, dtype=binary_event_dtype)
+
+    return records, strings
+
+def _stations_to_binary(stations, strings):
+    rows = []
+    channel_rows = []
+    for sta in stations:
+        channels = sta.get_channels()
+        rows.append((strings.index(sta.network), strings.index(sta.station),
+            strings.index(sta.location), strings.index(sta.name),
+            _nan_if_none(sta.lat), _nan_if_none(sta.lon),
+            _nan_if_none(sta.elevation),
+            _nan_if_none(sta.depth), len(channels)))
+
+        for cha in channels:
+            channel_rows.append((strings.index(cha.name),
+                _nan_if_none(cha.azimuth), _nan_if_none(cha.dip), cha.gain))
+
+    return num.array(rows, dtype=binary_station_dtype), \
+            num.array(channel_rows, dtype=binary_channel_dtype)
+
+def _binary_to_stations(records, channel_records, strings):
+    channels = [ Channel(name, azimuth=azimuth, dip=dip, gain=gain)
+                 for (name, azimuth, dip, gain) in zip(
+                    _lookup_strings(strings, channel_records['name']),
+                    _nones_if_nan(channel_records['azimuth']),
+                    _nones_if_nan(channel_records['dip']),
+                    channel_records['gain'].tolist()) ]
+
+    ends = num.cumsum(records['nchannels'])
+    begins = ends - records['nchannels']
+    stations = []
+    for (net, sta, loc, name, lat, lon, elevation, depth, ibeg, iend) in zip(
+            _lookup_strings(strings, records['network']),
+            _lookup_strings(strings, records['station']),
+            _lookup_strings(strings, records['location']),
+            _lookup_strings(strings, records['name']),
+            _nones_if_nan(records['lat']),
+            _nones_if_nan(records['lon']),
+            _nones_if_nan(records['elevation']),
+            _nones_if_nan(records['depth']),
+            begins.tolist(), ends.tolist()):
+
+        stations.append(Station(net, sta, loc, lat, lon, elevation=elevation,
+                depth=depth, name=name, channels=channels[ibeg:iend]))
+
+    return stations
+
+def dump_stations_binary(stations, filename, block_size=100000):
+    '''Write stations to a file in pyrocko's binary station format.
+
+    Like :py:func:`dump_events_binary`, with records of type
+    :py:data:`binary_station_dtype` and, following them in each block, the
+    records of type :py:data:`binary_channel_dtype` of the stations'
+    channels.
+    '''
+
+    _dump_binary(stations, filename, binary_station_magic,
+            _stations_to_binary, block_size)
+
+def iload_stations_binary(filename):
+    '''Read stations from a file in pyrocko's binary station format, block by block.
+
+    Generator yielding :py:class:`Station` objects.
+    '''
+
+    for records, channels, strings in _iload_binary_blocks(filename,
+            binary_station_magic, binary_station_dtype):
+
+        for sta in _binary_to_stations(records, channels, strings):
+            yield sta
+
+def load_stations_binary(filename):
+    '''Read stations from a file in pyrocko's binary station format.
+
+    Returns a list of :py:class:`Station` objects.
+    '''
+
+    return list(iload_stations_binary(filename))
+
 def dump_kml(objects, filename):
     station_template = '''
   <Placemark>
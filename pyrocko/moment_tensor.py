@@ -134,6 +134,111 @@ If alpha is near to pi/2, beta is put into the range [0,pi).'''
     
     return (alpha, beta, gamma)
 
+def symmat6_array(m6):
+    '''Create array of symmetric 3x3 matrices from array of shape (N,6).
+
+    Same as :py:func:`symmat6` with rows `[ Axx, Ayy, Azz, Axy, Axz, Ayz ]`,
+    but returns a numpy array of shape (N,3,3).'''
+
+    m6 = num.asarray(m6, dtype=num.float).reshape((-1,6))
+    m = num.empty((m6.shape[0],3,3), dtype=num.float)
+    for k, (i,j) in enumerate(((0,0), (1,1), (2,2), (0,1), (0,2), (1,2))):
+        m[:,i,j] = m6[:,k]
+        m[:,j,i] = m6[:,k]
+
+    return m
+
+def values6_array(m):
+    '''Inverse of symmat6_array().'''
+
+    m = num.asarray(m, dtype=num.float)
+    return num.vstack((m[:,0,0], m[:,1,1], m[:,2,2],
+                       m[:,0,1], m[:,0,2], m[:,1,2])).T
+
+def euler_to_matrix_array( alpha, beta, gamma ):
+    '''Like euler_to_matrix(), but for arrays of angles.
+
+    Returns numpy array of shape (N,3,3).'''
+
+    alpha, beta, gamma = [ num.asarray(x, dtype=num.float).ravel()
+                           for x in num.broadcast_arrays(alpha, beta, gamma) ]
+
+    ca = num.cos(alpha)
+    cb = num.cos(beta)
+    cg = num.cos(gamma)
+    sa = num.sin(alpha)
+    sb = num.sin(beta)
+    sg = num.sin(gamma)
+
+    mat = num.empty((alpha.size,3,3), dtype=num.float)
+    mat[:,0,0] = cb*cg-ca*sb*sg
+    mat[:,0,1] = sb*cg+ca*cb*sg
+    mat[:,0,2] = sa*sg
+    mat[:,1,0] = -cb*sg-ca*sb*cg
+    mat[:,1,1] = -sb*sg+ca*cb*cg
+    mat[:,1,2] = sa*cg
+    mat[:,2,0] = sa*sb
+    mat[:,2,1] = -sa*cb
+    mat[:,2,2] = ca
+    return mat
+
+def matrix_to_euler_array( rotmats ):
+    '''Inverse of euler_to_matrix_array().'''
+
+    rotmats = num.asarray(rotmats, dtype=num.float)
+    exs = rotmats[:,0,:]
+    ezs = rotmats[:,2,:]
+    enodes = num.cross(num.array([0.,0.,1.]), ezs)
+    small = num.sqrt(num.sum(enodes**2, axis=1)) < 1e-10
+    enodes[small] = exs[small]
+    enodess = num.einsum('nij,nj->ni', rotmats, enodes)
+    cos_alpha = num.clip(ezs[:,2], -1., 1.)
+    alpha = num.arccos(cos_alpha)
+    beta  = num.mod( num.arctan2( enodes[:,1], enodes[:,0] ), math.pi*2. )
+    gamma = num.mod( -num.arctan2( enodess[:,1], enodess[:,0] ), math.pi*2. )
+
+    return unique_euler_array(alpha,beta,gamma)
+
+def unique_euler_array( alpha, beta, gamma ):
+    '''Like unique_euler(), but for arrays of angles.'''
+
+    pi = math.pi
+    where = num.where
+
+    alpha = num.mod( num.asarray(alpha, dtype=num.float), 2.0*pi )
+    beta = num.asarray(beta, dtype=num.float)
+    gamma = num.asarray(gamma, dtype=num.float)
+
+    c1 = (0.5*pi < alpha) & (alpha <= pi)
+    c2 = (pi < alpha) & (alpha <= 1.5*pi)
+    c3 = (1.5*pi < alpha) & (alpha <= 2.0*pi)
+
+    alpha = where(c1, pi - alpha, where(c2, alpha - pi,
+                where(c3, 2.0*pi - alpha, alpha)))
+    beta = where(c1 | c3, beta + pi, beta)
+    gamma = where(c1, 2.0*pi - gamma, where(c2, pi - gamma,
+                where(c3, pi + gamma, gamma)))
+
+    alpha = num.mod( alpha, 2.0*pi )
+    beta  = num.mod( beta,  2.0*pi )
+    gamma = num.mod( gamma+pi, 2.0*pi )-pi
+
+    alpha = where(num.abs(alpha - 0.5*pi) < 1e-10, 0.5*pi, alpha)
+    beta = where(num.abs(beta - pi) < 1e-10, pi, beta)
+    beta = where(num.abs(beta - 2.*pi) < 1e-10, 0., beta)
+    beta = where(num.abs(beta) < 1e-10, 0., beta)
+
+    flip = (alpha == 0.5*pi) & (beta >= pi)
+    gamma = where(flip, -gamma, gamma)
+    beta = where(flip, num.mod( beta-pi,  2.0*pi ), beta)
+    gamma = where(flip, num.mod( gamma+pi, 2.0*pi )-pi, gamma)
+
+    small = alpha < 1e-7
+    beta = where(small, num.mod(beta + gamma, 2.0*pi), beta)
+    gamma = where(small, 0., gamma)
+
+    return (alpha, beta, gamma)
+
 def cvec(x,y,z):
     return num.matrix( [[x,y,z]], dtype=num.float ).T
 
@@ -270,6 +375,135 @@ class MomentTensor:
             
         return s
 
+class MomentTensorArray:
+    '''Many moment tensors, handled at once with numpy array operations.
+
+    This is the array counterpart of :py:class:`MomentTensor`; the results
+    are consistent with those of the scalar class. Tensors can be given as
+    array `m6` of shape (N,6) with rows `[ mnn, mee, mdd, mne, mnd, med ]`,
+    as array `m` of shape (N,3,3) in north-east-down convention, as array
+    `m_up_south_east` or as arrays `strike`, `dip`, `rake` in [degrees] and
+    `scalar_moment` in [Nm].
+    '''
+
+    def __init__(self, m6=None, m=None, m_up_south_east=None, strike=None,
+            dip=None, rake=None, scalar_moment=1.):
+
+        if m6 is not None:
+            m = symmat6_array(m6)
+
+        if m_up_south_east is not None:
+            t = num.asarray(MomentTensor._to_up_south_east)
+            m = num.einsum('ij,njk,lk->nil', t,
+                    num.asarray(m_up_south_east, dtype=num.float), t)
+
+        u_evecs = num.asarray(MomentTensor._u_evecs)
+        if m is not None:
+            m = num.asarray(m, dtype=num.float).reshape((-1,3,3))
+            m_evals, m_evecs = num.linalg.eigh(m)
+            rotmat1 = num.einsum('ij,nkj->nik', u_evecs, m_evecs)
+            rotmat1[num.linalg.det(rotmat1) < 0.] *= -1.
+
+        else:
+            strike, dip, rake, scalar_moment = [
+                    num.asarray(x, dtype=num.float).ravel()
+                    for x in num.broadcast_arrays(strike, dip, rake,
+                                                  scalar_moment) ]
+
+            rotmat1 = euler_to_matrix_array(d2r*dip, d2r*strike, -d2r*rake)
+            m = num.einsum('nji,jk,nkl->nil', rotmat1,
+                    num.asarray(MomentTensor._m_unrot), rotmat1) \
+                        * scalar_moment[:,num.newaxis,num.newaxis]
+
+            m_evals, m_evecs = num.linalg.eigh(m)
+
+        self._m = m
+        self._m_eigenvals = m_evals
+        self._m_eigenvecs = m_evecs
+
+        # same ordering of the two rotation matrices as in MomentTensor
+        rotmat2 = num.einsum('ij,njk->nik', num.asarray(MomentTensor._flip_dc),
+                rotmat1)
+
+        a = num.abs(rotmat1).reshape((-1,9))
+        b = num.abs(rotmat2).reshape((-1,9))
+        differ = a != b
+        first = num.argmax(differ, axis=1)
+        ii = num.arange(a.shape[0])
+        swap = num.any(differ, axis=1) & (a[ii,first] > b[ii,first])
+        rotmats = num.empty((a.shape[0],2,3,3), dtype=num.float)
+        rotmats[:,0] = num.where(swap[:,num.newaxis,num.newaxis], rotmat2, rotmat1)
+        rotmats[:,1] = num.where(swap[:,num.newaxis,num.newaxis], rotmat1, rotmat2)
+        self._rotmats = rotmats
+
+    @staticmethod
+    def from_moment_tensors(mts):
+        return MomentTensorArray(m=[ num.asarray(mt.m()) for mt in mts ])
+
+    def __len__(self):
+        return self._m.shape[0]
+
+    def __getitem__(self, i):
+        '''Get single tensor as :py:class:`MomentTensor` object.'''
+
+        return MomentTensor(m=num.matrix(self._m[i]))
+
+    def both_strike_dip_rake(self):
+        '''Get both possible (strike,dip,rake) triplets.
+
+        Returns array of shape (N,2,3) with angles in [degrees].'''
+
+        alpha, beta, gamma = matrix_to_euler_array(
+                self._rotmats.reshape((-1,3,3)))
+
+        sdr = r2d * num.vstack((beta, alpha, -gamma)).T
+        return sdr.reshape((-1,2,3))
+
+    def p_axis(self):
+        '''Get directions of p axes as array of shape (N,3).'''
+        return self._m_eigenvecs[:,:,0]
+
+    def t_axis(self):
+        '''Get directions of t axes as array of shape (N,3).'''
+        return self._m_eigenvecs[:,:,2]
+
+    def null_axis(self):
+        return self._m_eigenvecs[:,:,1]
+
+    def eigenvals(self):
+        return self._m_eigenvals
+
+    def both_slip_vectors(self):
+        '''Get both possible slip directions as array of shape (N,2,3).'''
+        return self._rotmats[:,:,:,0]
+
+    def m(self):
+        '''Get plain moment tensors as array of shape (N,3,3).'''
+        return self._m.copy()
+
+    def m6(self):
+        '''Get moment tensors as array of shape (N,6).'''
+        return values6_array(self._m)
+
+    def m_up_south_east(self):
+        t = num.asarray(MomentTensor._to_up_south_east)
+        return num.einsum('ji,njk,kl->nil', t, self._m, t)
+
+    def m_plain_double_couple(self):
+        '''Get plain double couples with same scalar moments as tensors.'''
+        rotmat1 = self._rotmats[:,0]
+        return num.einsum('nji,jk,nkl->nil', rotmat1,
+                num.asarray(MomentTensor._m_unrot), rotmat1) \
+                    * self.scalar_moment()[:,num.newaxis,num.newaxis]
+
+    def moment_magnitude(self):
+        '''Get moment magnitudes of the moment tensors.'''
+        return moment_to_magnitude(self.scalar_moment())
+
+    def scalar_moment(self):
+        '''Get the scalar moments of the moment tensors.'''
+        return num.sqrt(num.sum(self._m_eigenvals**2, axis=1))/math.sqrt(2.)
+
 def other_plane( strike, dip, rake ):
     mt = MomentTensor( strike=strike, dip=dip, rake=rake )
     both_sdr = mt.both_strike_dip_rake()
@@ -17,8 +17,8 @@ class BeachballView(QWidget):
         self.set_moment_tensor(mt)
         
     def set_moment_tensor(self, mt):
-        self.beachball = mopad.BeachBall(MT=mt)
-        self.beachball._setup_BB()
+        M = num.array(mt.get_M(system='NED'), dtype=num.float)
+        self.nodal_lines = mopad.beachball_nodal_lines(M[num.newaxis])
         self.update()
         
     def paintEvent(self, paint_ev ):
@@ -46,19 +46,17 @@ class BeachballView(QWidget):
         yproj.set_out_range(h-(h-s)/2.,(h-s)/2.)
         
        
-        pos, neg = self.beachball.get_projected_nodallines()
+        xs, ys = self.nodal_lines
         
         color = (0,0,0)
         pen = QPen(QColor(*color))
         pen.setWidth(2)
         p.setPen(pen)
 
-        for line in pos, neg:
-            x = xproj(num.array(line[0]))
-            y = yproj(num.array(line[1]))
-            
-            points = make_QPolygonF(x,y)
-            p.drawPolyline( points )
+        for iline in range(2):
+            for x, y in mopad.nodal_line_segments(xs[0,iline], ys[0,iline]):
+                points = make_QPolygonF(xproj(x),yproj(y))
+                p.drawPolyline( points )
             
         p.drawEllipse(QRectF(QPointF(xproj(-1.), yproj(-1.)), QPointF(xproj(1.), yproj(1.))))
         
@@ -70,6 +70,8 @@ from cStringIO import StringIO
 #additional library:
 import numpy as N
 
+import moment_tensor
+
 
 #constants:
 dynecm = 1e-7
@@ -1893,9 +1895,7 @@ def strikediprake_2_moments(strike,dip,rake):
     D_rad = dip    / rad2deg
     R_rad = rake   / rad2deg
 
-    for ang in S_rad,D_rad,R_rad:
-        if abs(ang) < epsilon:
-            ang = 0.
+    S_rad, D_rad, R_rad = [ N.where(abs(ang) < epsilon, 0., ang) for ang in (S_rad,D_rad,R_rad) ]
 
 
     M1 = - ( N.sin(D_rad)*N.cos(R_rad)*N.sin(2*S_rad) + N.sin(2*D_rad)*N.sin(R_rad)*N.sin(S_rad)**2 )
@@ -1912,6 +1912,488 @@ def strikediprake_2_moments(strike,dip,rake):
 
 #-------------------------------------------------------------------
 
+def _basis_change_matrix(in_basis, out_basis):
+    """
+    Returns the 3x3 array B, transforming vectors v from basis 'in_basis' into
+    basis 'out_basis' via B*v (and matrices M via B*M*B.T).
+    """
+
+    return N.array([ N.array(_puzzle_basis_transformation(e, in_basis, out_basis), dtype=N.float).ravel() for e in N.eye(3) ]).T
+
+#-------------------------------------------------------------------
+
+def _transform_array(B, M):
+    """
+    Transforms an array of 3x3 matrices (shape (n,3,3)) with basis change matrix B.
+    """
+
+    return N.einsum('ij,njk,lk->nil', B, M, B)
+
+#-------------------------------------------------------------------
+
+def _sort_eigensystems(eigenw, eigenv, key):
+    """
+    Sorts arrays of eigenvalues (n,3) and eigenvectors (n,3,3), the latter
+    given as columns, in ascending order of 'key' (n,3).
+    """
+
+    order = N.argsort(key, axis=1)
+    ii = N.arange(eigenw.shape[0])
+    eigenw = eigenw[ii[:,N.newaxis], order]
+    eigenv = eigenv[ii[:,N.newaxis,N.newaxis], N.arange(3)[N.newaxis,:,N.newaxis], order[:,N.newaxis,:]]
+    return eigenw, eigenv
+
+#-------------------------------------------------------------------
+
+def _outer_array(a, b):
+    """
+    Outer products of arrays of vectors (shape (n,3)).
+    """
+
+    return a[:,:,N.newaxis] * b[:,N.newaxis,:]
+
+#-------------------------------------------------------------------
+
+def _find_strike_dip_rake_array(rotmats):
+    """
+    Same as MomentTensor._find_strike_dip_rake, but for an array of rotation
+    matrices (shape (n,3,3)). Returns array of shape (n,3).
+    """
+
+    alpha, beta, gamma = moment_tensor.matrix_to_euler_array(rotmats)
+
+    return N.vstack((beta*rad2deg, alpha*rad2deg, -gamma*rad2deg)).T
+
+#-------------------------------------------------------------------
+
+def _setup_M_array(M, system):
+    """
+    Brings an array of mechanisms into the form of an array of symmetric
+    3x3 matrices (shape (n,3,3)) in basis NED.
+
+    Mechanisms are given one per row, in one of the forms accepted by
+    MomentTensor (see decompose).
+    """
+
+    system = system.upper()
+
+    M = N.array(M, dtype=N.float)
+    n = M.shape[0]
+    M = M.reshape((n,-1))
+    ncomp = M.shape[1]
+
+    if ncomp == 9:
+        M = M.reshape((n,3,3))
+        # upper right triangle is taken as reference
+        for i,j in ((1,0),(2,0),(2,1)):
+            M[:,i,j] = M[:,j,i]
+
+    elif ncomp in (3,4,6,7):
+        if ncomp in (3,4):
+            moms = N.array(strikediprake_2_moments(M[:,0], M[:,1], M[:,2])).T
+            system = 'NED'
+        else:
+            moms = M[:,:6]
+
+        scale = M[:,-1] if ncomp in (4,7) else N.ones(n)
+        M = moment_tensor.symmat6_array(moms * scale[:,N.newaxis])
+
+    else:
+        raise MTError('mechanisms must be given with 3, 4, 6, 7 or 9 components')
+
+    if system not in ['NED','USE','XYZ','NWU']:
+        raise MTError('basis %s not supported' % system)
+
+    return _transform_array(_basis_change_matrix(system, 'NED'), M)
+
+#-------------------------------------------------------------------
+
+def _principal_axis_system_array(M, EW_devi=None):
+    """
+    Same as MomentTensor._M_to_principal_axis_system, but for an array of
+    moment tensors in NED (shape (n,3,3)).
+
+    Returns the ascending eigenvalues (n,3) and eigenvectors (n,3,3, as
+    columns) of the tensors, the eigenvalues (n,3) and eigenvectors (n,3,3,
+    eigvecs[:,i,:] being the i-th vector) in the order H, N, S, and the
+    colour order (n).
+    """
+
+    trace_M = M[:,0,0] + M[:,1,1] + M[:,2,2]
+    if EW_devi is None:
+        EW_devi = N.linalg.eigvalsh(M - (1./3*trace_M)[:,N.newaxis,N.newaxis] * N.eye(3))
+
+    EW, EV = N.linalg.eigh(M)
+    EW = N.where(abs(EW) < epsilon, 0., EW)
+    trace_zero = abs(trace_M) < epsilon
+
+    symmetry_around_tension = N.where(trace_zero,
+                                      (EW[:,1] == 0) | (abs(EW[:,0]) < EW[:,2]),
+                                      abs(EW_devi[:,0]) < abs(EW_devi[:,2]))
+
+    clr = N.where(symmetry_around_tension, 1, -1)
+
+    EVh = N.where(symmetry_around_tension[:,N.newaxis], EV[:,:,0], EV[:,:,2])
+    EVs = N.where(symmetry_around_tension[:,N.newaxis], EV[:,:,2], EV[:,:,0])
+    EWh = N.where(symmetry_around_tension, EW[:,0], EW[:,2])
+    EWs = N.where(symmetry_around_tension, EW[:,2], EW[:,0])
+
+    eigvecs = N.concatenate([ x[:,N.newaxis,:] for x in (EVh, EV[:,:,1], EVs) ], axis=1)
+    eigvals = N.vstack((EWh, EW[:,1], EWs)).T
+
+    return EW, EV, eigvals, eigvecs, clr
+
+#-------------------------------------------------------------------
+
+def decompose(M, system='NED', out_system='NED', decomposition_key=20):
+    """
+    Decomposition of many moment tensors at once.
+
+    Gives the same results as the respective get_* methods of a
+    MomentTensor object, set up for each of the mechanisms, but works on
+    arrays of mechanisms, without setting up the individual objects.
+
+    'M' is an array of mechanisms, with one mechanism per row, given in one
+    of the forms accepted by MomentTensor:
+
+    -- shape (n,3,3) or (n,9): full moment tensors
+    -- shape (n,6): the 6 independent entries M11, M22, M33, M12, M13, M23
+    -- shape (n,7): as above + seismic scalar moment in Nm
+    -- shape (n,3): strike, dip, slip-rake angles in degree (basis NED)
+    -- shape (n,4): as above + seismic scalar moment in Nm
+
+    'system' and 'out_system' may be chosen as 'NED','USE','NWU', or 'XYZ'.
+
+    'decomposition_key' is 20 (standard decomposition: isotropic +
+    DC + CLVD), 21 (isotropic + 2 DC) or 31 (isotropic + 3 DC).
+
+    Returns a dictionary with arrays of the results, indexed by mechanism in
+    their first dimension. Keys are: 'M', 'iso', 'iso_percentage', 'devi',
+    'devi_percentage', 'DC', 'DC_percentage', 'DC2', 'DC2_percentage',
+    'DC3', 'DC3_percentage', 'CLVD', 'CLVD_percentage', 'moment', 'mag',
+    'eigvals', 'eigvecs', 'p_axis', 'null_axis', 't_axis', 'fps',
+    'colour_order' and 'decomposition_key'. Parts not available in the
+    chosen decomposition type are set to None. Eigenvalues and -vectors
+    are in the order H, N, S (as in MomentTensor.get_eigvals), the
+    eigenvectors being eigvecs[:,i,:]. 'fps' holds the two fault planes
+    (strike, dip, slip-rake) of each mechanism (shape (n,2,3)). For purely
+    isotropic mechanisms, the DC, DC2, DC3 and CLVD parts and their
+    percentages are zero.
+    """
+
+    out_system = out_system.upper()
+    if out_system not in ['NED','USE','XYZ','NWU']:
+        raise MTError('basis %s not supported' % out_system)
+
+    if decomposition_key not in (20, 21, 31):
+        raise MTError('decomposition key %s not supported' % decomposition_key)
+
+    # all internal calculations in NED
+    M = _setup_M_array(M, system)
+    n = M.shape[0]
+
+    ii = N.arange(n)
+    eye = N.eye(3)
+
+    trace_M = M[:,0,0] + M[:,1,1] + M[:,2,2]
+
+    # isotropic and deviatoric parts
+    M_iso  = (1./3*trace_M)[:,N.newaxis,N.newaxis] * eye
+    M0_iso = abs(1./3*trace_M)
+    M_devi = M - M_iso
+
+    EW_devi, EV_devi = N.linalg.eigh(M_devi)
+    EW_tot = EW_devi + (1./3*trace_M)[:,N.newaxis]
+    M0_devi = N.max(abs(EW_devi), axis=1)
+    M0 = M0_iso + M0_devi
+
+    # purely isotropic (or zero) tensors have no deviatoric part to split
+    # up: their DC, DC2, DC3 and CLVD parts and percentages are set to zero
+    # instead of dividing by zero; the deviatoric part of an isotropic
+    # tensor may be left over from rounding, hence the tolerance
+    no_devi = M0_devi <= 1e-12 * M0
+    M0_safe = N.where(M0 == 0., 1., M0)
+
+    def coefficients(c):
+        return N.where(no_devi, 0., c)[:,N.newaxis,N.newaxis]
+
+    DC = DC2 = DC3 = CLVD = None
+    DC_percentage = DC2_percentage = DC3_percentage = CLVD_percentage = None
+
+    if decomposition_key == 20:
+        eigenw, eigenv = _sort_eigensystems(EW_devi, EV_devi, abs(EW_tot))
+        a1, a2, a3 = eigenv[:,:,0], eigenv[:,:,1], eigenv[:,:,2]
+
+        F = N.where(no_devi, 0., -eigenw[:,0]/N.where(no_devi, 1., eigenw[:,2]))
+        eps = abs(F)
+
+        DC = coefficients(eigenw[:,2]*(1-2*F)) * (_outer_array(a3,a3) - _outer_array(a2,a2))
+        CLVD = coefficients(eigenw[:,2]*F) * (2*_outer_array(a3,a3) - _outer_array(a2,a2) - _outer_array(a1,a1))
+
+        DC_percentage = N.trunc(N.round((1 - 2 * eps) * 100, 6)).astype(N.int)
+        CLVD_percentage = N.where(no_devi, 0, 100 - DC_percentage)
+        DC_percentage = N.where(no_devi, 0, DC_percentage)
+        iso_percentage = N.trunc(N.round(M0_iso/M0_safe *100, 6)).astype(N.int)
+
+    elif decomposition_key == 21:
+        eigenw, eigenv = _sort_eigensystems(EW_devi, EV_devi, abs(EW_devi))
+        a1, a2, a3 = eigenv[:,:,0], eigenv[:,:,1], eigenv[:,:,2]
+
+        DC = coefficients(eigenw[:,2]) * (_outer_array(a3,a3) - _outer_array(a2,a2))
+        DC2 = coefficients(eigenw[:,0]) * (_outer_array(a1,a1) - _outer_array(a2,a2))
+
+        norm = N.where(no_devi, 1., abs(eigenw[:,2])+abs(eigenw[:,0]))
+        DC_percentage = N.where(no_devi, 0., abs(eigenw[:,2]/norm))
+        iso_percentage = N.trunc(M0_iso/M0_safe *100).astype(N.int)
+
+    elif decomposition_key == 31:
+        eigenw, eigenv = _sort_eigensystems(EW_tot, EV_devi, abs(EW_tot))
+        a1, a2, a3 = eigenv[:,:,0], eigenv[:,:,1], eigenv[:,:,2]
+
+        DC = coefficients(1./3.*(eigenw[:,0] - eigenw[:,1])) * (_outer_array(a1,a1) - _outer_array(a2,a2))
+        DC2 = coefficients(1./3.*(eigenw[:,1] - eigenw[:,2])) * (_outer_array(a2,a2) - _outer_array(a3,a3))
+        DC3 = coefficients(1./3.*(eigenw[:,2] - eigenw[:,0])) * (_outer_array(a3,a3) - _outer_array(a1,a1))
+
+        norm = abs(eigenw[:,1]-eigenw[:,2]) + abs(eigenw[:,1]-eigenw[:,2]) + abs(eigenw[:,2]-eigenw[:,0])
+        norm = N.where(no_devi, 1., norm)
+        DC_percentage = N.trunc(100*abs(eigenw[:,0]-eigenw[:,1])/norm).astype(N.int)
+        DC2_percentage = N.trunc(100*abs(eigenw[:,1]-eigenw[:,2])/norm).astype(N.int)
+        DC3_percentage = N.where(no_devi, 0, 100 - DC2_percentage - DC_percentage)
+        DC_percentage = N.where(no_devi, 0, DC_percentage)
+        DC2_percentage = N.where(no_devi, 0, DC2_percentage)
+        iso_percentage = N.trunc(M0_iso/M0_safe *100).astype(N.int)
+
+    EW, EV, eigvals, eigvecs, clr = _principal_axis_system_array(M, EW_devi)
+
+    # fault planes - the P,N,T sorted eigenvector matrix is the one of the ascending eigenvalues
+    refDC = N.array( [[0.,0.,-1.],[0.,0.,0.],[-1.,0.,0.]], dtype=N.float )
+    refDC_evals, refDC_evecs = N.linalg.eigh(refDC)
+    flip_dc = N.array( [[0.,0.,-1.],[0.,-1.,0.],[-1.,0.,0.]], dtype=N.float )
+
+    rot_matrix_fp1 = N.einsum('ij,nkj->nik', refDC_evecs, EV)
+    rot_matrix_fp1[N.linalg.det(rot_matrix_fp1) < 0.] *= -1.
+    rot_matrix_fp2 = N.einsum('ij,njk->nik', flip_dc, rot_matrix_fp1)
+
+    fps = N.concatenate([ _find_strike_dip_rake_array(rot)[:,N.newaxis,:] for rot in (rot_matrix_fp1, rot_matrix_fp2) ], axis=1)
+
+    # output in desired basis system
+    B = _basis_change_matrix('NED', out_system)
+
+    def mats(x):
+        if x is None:
+            return None
+        return _transform_array(B, x)
+
+    def vecs(x):
+        return N.einsum('ij,n...j->n...i', B, x)
+
+    return dict(
+        decomposition_key = decomposition_key,
+        M = mats(M),
+        iso = mats(M_iso),
+        iso_percentage = iso_percentage,
+        devi = mats(M_devi),
+        devi_percentage = 100 - iso_percentage,
+        DC = mats(DC),
+        DC_percentage = DC_percentage,
+        DC2 = mats(DC2),
+        DC2_percentage = DC2_percentage,
+        DC3 = mats(DC3),
+        DC3_percentage = DC3_percentage,
+        CLVD = mats(CLVD),
+        CLVD_percentage = CLVD_percentage,
+        moment = M0,
+        mag = N.log10(M0*1.0e7)/1.5 - 10.7,
+        eigvals = eigvals,
+        eigvecs = vecs(eigvecs),
+        p_axis = vecs(EV[:,:,2]),
+        null_axis = vecs(EV[:,:,1]),
+        t_axis = vecs(EV[:,:,0]),
+        fps = fps,
+        colour_order = clr)
+
+#-------------------------------------------------------------------
+
+def _projection_factor(d, projection):
+    """
+    Factor f, mapping the horizontal components of unit vectors (n,e,d) in
+    the lower hemisphere to 2D coordinates (x,y) = (e*f, n*f) within the unit
+    circle, for the vertical projections 'stereo', 'lambert' and 'ortho'.
+    """
+
+    if projection == 'stereo':
+        return 1./(1.+d)
+    elif projection == 'lambert':
+        return 1./N.sqrt(1.+d)
+    elif projection == 'ortho':
+        return N.ones_like(d)
+    else:
+        raise MTError('projection %s not supported - choose from stereo, lambert, ortho' % projection)
+
+#-------------------------------------------------------------------
+
+def _inverse_projection(x, y, projection):
+    """
+    Unit vectors (n,e,d) in the lower hemisphere for 2D coordinates (x,y)
+    within the unit circle.
+    """
+
+    rho2 = x**2 + y**2
+    if projection == 'stereo':
+        d = (1.-rho2)/(1.+rho2)
+    elif projection == 'lambert':
+        d = 1.-rho2
+    elif projection == 'ortho':
+        d = N.sqrt(N.maximum(0., 1.-rho2))
+    else:
+        raise MTError('projection %s not supported - choose from stereo, lambert, ortho' % projection)
+
+    f = _projection_factor(d, projection)
+    return N.vstack((y/f, x/f, d)).T
+
+#-------------------------------------------------------------------
+
+def beachball_nodal_lines(M, system='NED', projection='stereo', n_points=360):
+    """
+    Projected nodal lines of many moment tensors at once.
+
+    'M' is an array of mechanisms, one per row, as accepted by decompose().
+
+    The nodal lines, on which the P-wave radiation pattern vanishes, are
+    set up in the principal axis system (H,N,S) of each tensor, like in the
+    BeachBall class, by sampling 'n_points' azimuths around the S axis. They
+    are projected from the lower hemisphere with the vertical projection
+    'projection' ('stereo', 'lambert' or 'ortho'), viewed from above.
+
+    Returns arrays x (east) and y (north), each of shape (n,2,n_points)
+    with the two nodal lines (around the positive and the negative S axis)
+    of each mechanism. Points in the upper hemisphere, and those of
+    tensors without nodal lines (e.g. explosions), are set to NaN. Use
+    nodal_line_segments() to split a line into continuous segments.
+    """
+
+    M = _setup_M_array(M, system)
+    EW, EV, eigvals, eigvecs, clr = _principal_axis_system_array(M)
+
+    phi = N.linspace(0., 2.*pi, n_points)
+    cos2 = N.cos(phi)**2
+    sin2 = N.sin(phi)**2
+
+    lh, ln, ls = [ eigvals[:,i,N.newaxis] for i in range(3) ]
+
+    # lh*sin(theta)**2*cos(phi)**2 + ln*sin(theta)**2*sin(phi)**2 + ls*cos(theta)**2 = 0
+    denom = lh*cos2 + ln*sin2
+    theta = N.arctan2(N.sqrt(abs(ls))*N.ones_like(denom), N.sqrt(abs(denom)))
+    valid = (ls*denom <= 0.) & ((ls != 0.) | (denom != 0.))
+    theta = N.where(valid, theta, N.nan)
+
+    x = N.empty((M.shape[0], 2, n_points))
+    y = N.empty((M.shape[0], 2, n_points))
+    for iline, sign in enumerate((1., -1.)):
+        # points in NED: sin(theta)*cos(phi)*H + sin(theta)*sin(phi)*N + cos(theta)*S
+        points = (N.sin(theta)*N.cos(phi))[:,:,N.newaxis] * eigvecs[:,N.newaxis,0,:] + \
+                 (N.sin(theta)*N.sin(phi))[:,:,N.newaxis] * eigvecs[:,N.newaxis,1,:] + \
+                 (sign*N.cos(theta))[:,:,N.newaxis] * eigvecs[:,N.newaxis,2,:]
+
+        d = points[:,:,2]
+        lower = d >= 0.
+        f = N.where(lower, _projection_factor(N.where(lower, d, 0.), projection), N.nan)
+        x[:,iline,:] = points[:,:,1]*f
+        y[:,iline,:] = points[:,:,0]*f
+
+    return x, y
+
+#-------------------------------------------------------------------
+
+def nodal_line_segments(x, y):
+    """
+    Splits a line with coordinate arrays x and y at NaN values.
+
+    Returns a list of (x,y) tuples of the continuous segments.
+    """
+
+    good = N.isfinite(x) & N.isfinite(y)
+    segments = []
+    ibeg = None
+    for i in range(len(x)+1):
+        if i < len(x) and good[i]:
+            if ibeg is None:
+                ibeg = i
+        else:
+            if ibeg is not None and i-ibeg > 1:
+                segments.append((x[ibeg:i], y[ibeg:i]))
+            ibeg = None
+
+    return segments
+
+#-------------------------------------------------------------------
+
+def beachball_raster(M, system='NED', projection='stereo', size=100, chunk_size=10000000):
+    """
+    Sampled P-wave radiation pattern of many moment tensors at once.
+
+    'M' is an array of mechanisms, one per row, as accepted by decompose().
+
+    The lower focal hemisphere is sampled on a regular grid of size x size
+    pixels, shared by all mechanisms, covering the projection 'projection'
+    ('stereo', 'lambert' or 'ortho') of the hemisphere onto the unit circle,
+    viewed from above. Row 0 is at the top (north), column 0 on the left
+    (west).
+
+    Returns an array of type int8 and shape (n,size,size), which is 1 where
+    the radiation pattern is positive (compressional first motion, usually
+    plotted in colour), -1 where it is negative and 0 outside the unit
+    circle. The tensors are processed in chunks of at most 'chunk_size'
+    samples.
+    """
+
+    M = _setup_M_array(M, system)
+    n = M.shape[0]
+
+    coords = (N.arange(size) + 0.5) / size * 2. - 1.
+    x, y = N.meshgrid(coords, -coords)
+    inside = (x**2 + y**2 <= 1.).ravel()
+    points = _inverse_projection(x.ravel()[inside], y.ravel()[inside], projection)
+
+    raster = N.zeros((n, size*size), dtype=N.int8)
+    nchunk = max(1, chunk_size // max(1, points.shape[0]))
+    for i in range(0, n, nchunk):
+        amplitudes = N.einsum('pi,nij,pj->np', points, M[i:i+nchunk], points)
+        raster[i:i+nchunk,inside] = N.sign(amplitudes)
+
+    return raster.reshape((n, size, size))
+
+#-------------------------------------------------------------------
+
+def save_beachballs_psxy(filename, M, x, y, size=1., system='NED', projection='stereo', n_points=360):
+    """
+    Writes the nodal lines of many mechanisms into a single GMT multiple
+    segment file, to be plotted with psxy -M.
+
+    'M' is an array of mechanisms, one per row, as accepted by decompose().
+    'x' and 'y' are the plot positions of the beachballs, 'size' their
+    radius (in plot units). The segment headers contain the index of the
+    mechanism and of the nodal line.
+    """
+
+    xs, ys = beachball_nodal_lines(M, system=system, projection=projection, n_points=n_points)
+    x = N.ones(xs.shape[0]) * x
+    y = N.ones(xs.shape[0]) * y
+    size = N.ones(xs.shape[0]) * size
+
+    f = open(filename, 'w')
+    try:
+        for imech in range(xs.shape[0]):
+            for iline in range(2):
+                for segx, segy in nodal_line_segments(xs[imech,iline], ys[imech,iline]):
+                    f.write('> mechanism %i nodal line %i\n' % (imech, iline))
+                    for px, py in zip(x[imech] + segx*size[imech], y[imech] + segy*size[imech]):
+                        f.write('%g %g\n' % (px, py))
+    finally:
+        f.close()
+
+#-------------------------------------------------------------------
+
 def fancy_matrix(m_in):
     """
 
@@ -90,13 +90,18 @@ def distance_accurate50m_numpy( a_lats, a_lons, b_lats, b_lons ):
     c = num.cos(g)**2 * num.cos(l)**2 + num.sin(f)**2 * num.sin(l)**2
 
     w = num.arctan( num.sqrt( s/c ) )
-    r = num.sqrt(s*c)/w
-    d = 2.*w*earthradius_equator
-    h1 = (3.*r-1.)/(2.*c)
-    h2 = (3.*r+1.)/(2.*s)
 
-    return d * (1.+ earth_oblateness * h1 * num.sin(f)**2 * num.cos(g)**2 - 
-                    earth_oblateness * h2 * num.cos(f)**2 * num.sin(g)**2)
+    # coincident points (w == 0) get distance zero, as in the scalar version
+    with num.errstate(invalid='ignore', divide='ignore'):
+        r = num.sqrt(s*c)/w
+        d = 2.*w*earthradius_equator
+        h1 = (3.*r-1.)/(2.*c)
+        h2 = (3.*r+1.)/(2.*s)
+
+        dists = d * (1.+ earth_oblateness * h1 * num.sin(f)**2 * num.cos(g)**2 - 
+                         earth_oblateness * h2 * num.cos(f)**2 * num.sin(g)**2)
+
+    return num.where(w == 0.0, 0.0, dists)
 
 def ne_to_latlon( lat0, lon0, north_m, east_m ):
     '''Transform local carthesian coordinates to latitude and longitude.
@@ -181,3 +186,144 @@ def latlon_to_ne(refloc, loc):
     n, e = math.cos(azi*d2r)*dist, math.sin(azi*d2r)*dist
     return n,e
 
+def latlon_to_xyz(lats, lons):
+    '''Convert geographical coordinates to unit vectors.
+
+    lats, lons: 1D numpy arrays with latitudes and longitudes in [deg].
+
+    Returns: numpy array of shape (N,3) with carthesian coordinates of the
+    points on the unit sphere.
+    '''
+
+    lats = num.asarray(lats, dtype=num.float)*d2r
+    lons = num.asarray(lons, dtype=num.float)*d2r
+    xyz = num.empty(lats.shape + (3,), dtype=num.float)
+    cos_lats = num.cos(lats)
+    xyz[...,0] = cos_lats * num.cos(lons)
+    xyz[...,1] = cos_lats * num.sin(lons)
+    xyz[...,2] = num.sin(lats)
+    return xyz
+
+def _chord(angle_deg):
+    return 2.*num.sin(num.minimum(angle_deg, 180.)*d2r/2.)
+
+class SpatialIndex:
+    '''Index for fast proximity queries on a set of points on the sphere.
+
+    The points, given by latitudes `lats` and longitudes `lons` in [deg], are
+    held as unit vectors in a :py:class:`scipy.spatial.cKDTree`, which is
+    queried by chord length.
+
+    Neighbours are selected by great circle distance on the sphere. The
+    distances and azimuths returned by the queries are computed with
+    :py:func:`distance_accurate50m_numpy` and :py:func:`azimuth_numpy` (from
+    the query point to the indexed point).
+    '''
+
+    _blocksize = 2**16
+
+    def __init__(self, lats, lons):
+        from scipy.spatial import cKDTree
+
+        self.lats = num.array(lats, dtype=num.float).ravel()
+        self.lons = num.array(lons, dtype=num.float).ravel()
+        assert self.lats.size == self.lons.size
+
+        self._xyz = latlon_to_xyz(self.lats, self.lons)
+        self._tree = cKDTree(self._xyz, balanced_tree=False)
+
+    def __len__(self):
+        return self.lats.size
+
+    def _chords2(self, xyz, ipoints):
+        return num.maximum(0., 2. - 2.*num.sum(xyz*self._xyz[ipoints], axis=-1))
+
+    def _azidist(self, lats, lons, ipoints):
+        dists = distance_accurate50m_numpy(lats, lons,
+                self.lats[ipoints], self.lons[ipoints])
+        azimuths = azimuth_numpy(lats, lons,
+                self.lats[ipoints], self.lons[ipoints])
+        return dists, azimuths
+
+    def query_radius(self, lats, lons, radius):
+        '''Find all indexed points within a given distance of query points.
+
+        lats, lons: 1D numpy arrays with latitudes and longitudes of the query
+                    points in [deg].
+        radius:     Maximum great circle distance in [deg], either a single
+                    value or one value per query point.
+
+        Returns: iquery, ipoint, dists, azimuths: 1D numpy arrays with one
+        entry for each matching pair of query point and indexed point, sorted
+        by query point and then by index of the indexed point. `dists` are in
+        [m], `azimuths` in [deg].
+        '''
+
+        lats = num.asarray(lats, dtype=num.float).ravel()
+        lons = num.asarray(lons, dtype=num.float).ravel()
+        chords = _chord(num.asarray(radius, dtype=num.float)) \
+                * num.ones(lats.size)
+
+        xyz = latlon_to_xyz(lats, lons)
+        iqueries, ipoints = [], []
+        for ibeg in xrange(0, lats.size, self._blocksize):
+            iblock = num.arange(ibeg, min(ibeg+self._blocksize, lats.size))
+
+            # candidates from the tree, with some slack for rounding,
+            # selected exactly below
+            reach = num.max(chords[iblock])*(1.+1e-9) + 1e-12
+            candidates = self._tree.query_ball_point(xyz[iblock], reach)
+            counts = num.array([ len(c) for c in candidates ], dtype=num.int)
+            if num.sum(counts) == 0:
+                continue
+
+            iq = num.repeat(iblock, counts)
+            ip = num.concatenate([ c for c in candidates if c ]).astype(num.int)
+            mask = self._chords2(xyz[iq], ip) <= chords[iq]**2
+            iqueries.append(iq[mask])
+            ipoints.append(ip[mask])
+
+        if iqueries:
+            iquery = num.concatenate(iqueries)
+            ipoint = num.concatenate(ipoints)
+            order = num.lexsort((ipoint, iquery))
+            iquery = iquery[order]
+            ipoint = ipoint[order]
+        else:
+            iquery = num.zeros(0, dtype=num.int)
+            ipoint = num.zeros(0, dtype=num.int)
+
+        dists, azimuths = self._azidist(lats[iquery], lons[iquery], ipoint)
+        return iquery, ipoint, dists, azimuths
+
+    def query_nearest(self, lats, lons, k=1):
+        '''Find the `k` nearest indexed points for each query point.
+
+        lats, lons: 1D numpy arrays with latitudes and longitudes of the query
+                    points in [deg].
+
+        Returns: ipoint, dists, azimuths: numpy arrays of shape (N,k) with
+        indices, distances [m] and azimuths [deg] of the neighbours, ordered
+        by increasing distance.
+        '''
+
+        if not (1 <= k <= len(self)):
+            raise ValueError('k must be in range 1 to %i' % len(self))
+
+        lats = num.asarray(lats, dtype=num.float).ravel()
+        lons = num.asarray(lons, dtype=num.float).ravel()
+
+        xyz = latlon_to_xyz(lats, lons)
+        _, ipoint = self._tree.query(xyz, k)
+        ipoint = ipoint.reshape((lats.size, k)).astype(num.int)
+
+        # order by exact chord length, ties by index
+        chords2 = self._chords2(xyz[:,num.newaxis,:], ipoint)
+        iq = num.repeat(num.arange(lats.size), k)
+        order = num.lexsort((ipoint.ravel(), chords2.ravel(), iq))
+        ipoint = ipoint.ravel()[order].reshape((lats.size, k))
+
+        dists, azimuths = self._azidist(lats[:,num.newaxis],
+                lons[:,num.newaxis], ipoint)
+
+        return ipoint, dists, azimuths
@@ -1018,8 +1018,8 @@ def MakePileViewerMainClass(base):
                 return None
         
         def set_origin(self, location):
-            for station in self.stations.values():
-                station.set_event_relative_data(location)
+            pyrocko.model.set_event_relative_data(
+                self.stations.values(), location)
             self.sortingmode_change()
         
         def toggletest(self, checked):
@@ -2472,21 +2472,8 @@ def MakePileViewerMainClass(base):
                             processed_traces.append(trace)
                     
                 if self.rotate != 0.0:
-                    phi = self.rotate/180.*math.pi
-                    cphi = math.cos(phi)
-                    sphi = math.sin(phi)
-                    for a in processed_traces:
-                        for b in processed_traces: 
-                            if (a.network == b.network and a.station == b.station and a.location == b.location and
-                                ((a.channel.lower().endswith('n') and b.channel.lower().endswith('e')) or
-                                (a.channel.endswith('1') and b.channel.endswith('2'))) and
-                                abs(a.deltat-b.deltat) < a.deltat*0.001 and abs(a.tmin-b.tmin) < a.deltat*0.01 and
-                                len(a.get_ydata()) == len(b.get_ydata())):
-                                
-                                aydata = a.get_ydata()*cphi+b.get_ydata()*sphi
-                                bydata =-a.get_ydata()*sphi+b.get_ydata()*cphi
-                                a.set_ydata(aydata)
-                                b.set_ydata(bydata)
+                    pyrocko.trace.rotate_pairs(
+                        pyrocko.trace.horizontal_pairs(processed_traces), self.rotate)
 
                 processed_traces = self.post_process_hooks(processed_traces)
                                 
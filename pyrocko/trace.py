@@ -1263,39 +1263,99 @@ def rotate(traces, azimuth, in_channels, out_channels):
     :returns: list of rotated traces 
     '''
     
-    phi = azimuth/180.*math.pi
-    cphi = math.cos(phi)
-    sphi = math.sin(phi)
-    rotated = []
     in_channels = tuple(_channels_to_names(in_channels))
     out_channels = tuple(_channels_to_names(out_channels))
-    for a in traces:
-        for b in traces:
-            if ( (a.channel, b.channel) == in_channels and
-                 a.nslc_id[:3] == b.nslc_id[:3] and
-                 abs(a.deltat-b.deltat) < a.deltat*0.001 ):
-                tmin = max(a.tmin, b.tmin)
-                tmax = min(a.tmax, b.tmax)
-                
-                if tmin < tmax:
-                    ac = a.chop(tmin, tmax, inplace=False, include_last=True)
-                    bc = b.chop(tmin, tmax, inplace=False, include_last=True)
-                    if abs(ac.tmin - bc.tmin) > ac.deltat*0.01:
-                        logger.warn('Cannot rotate traces with displaced sampling (%s,%s,%s,%s)' % a.nslc_id)
-                        continue
-                    
-                    acydata =  ac.get_ydata()*cphi+bc.get_ydata()*sphi
-                    bcydata = -ac.get_ydata()*sphi+bc.get_ydata()*cphi
-                    ac.set_ydata(acydata)
-                    bc.set_ydata(bcydata)
-
-                    ac.set_codes(channel=out_channels[0])
-                    bc.set_codes(channel=out_channels[1])
-                    rotated.append(ac)
-                    rotated.append(bc)
+    pairs = []
+    for a, b in _matching_combos(traces, in_channels):
+        tmin = max(a.tmin, b.tmin)
+        tmax = min(a.tmax, b.tmax)
+        
+        if tmin < tmax:
+            ac = a.chop(tmin, tmax, inplace=False, include_last=True)
+            bc = b.chop(tmin, tmax, inplace=False, include_last=True)
+            if abs(ac.tmin - bc.tmin) > ac.deltat*0.01 or ac.data_len() != bc.data_len():
+                logger.warn('Cannot rotate traces with displaced sampling (%s,%s,%s,%s)' % a.nslc_id)
+                continue
+            
+            pairs.append((ac, bc))
+
+    rotate_pairs(pairs, azimuth)
+
+    rotated = []
+    for ac, bc in pairs:
+        ac.set_codes(channel=out_channels[0])
+        bc.set_codes(channel=out_channels[1])
+        rotated.append(ac)
+        rotated.append(bc)
                     
     return rotated
 
+def rotate_pairs(pairs, azimuth):
+    '''2D rotation of pairs of traces, in place.
+
+    The data of all pairs is stacked, so that the rotation is done with a
+    single matrix product.
+
+    :param pairs: list of `(a, b)` tuples of traces, the traces of each pair
+                  having the same number of samples
+    :param azimuth: rotation angle, as in :py:func:`rotate`
+    '''
+
+    if not pairs:
+        return
+
+    phi = azimuth/180.*math.pi
+    cphi = math.cos(phi)
+    sphi = math.sin(phi)
+    matrix = num.array([[cphi, sphi], [-sphi, cphi]])
+
+    ydata = num.dot(matrix, (
+        num.concatenate([ a.get_ydata() for (a, b) in pairs ]),
+        num.concatenate([ b.get_ydata() for (a, b) in pairs ])))
+
+    iend = 0
+    for a, b in pairs:
+        ibeg, iend = iend, iend + a.data_len()
+        a.set_ydata(ydata[0,ibeg:iend])
+        b.set_ydata(ydata[1,ibeg:iend])
+
+def horizontal_pairs(traces):
+    '''Find pairs of horizontal component traces, suitable for :py:func:`rotate_pairs`.
+
+    Traces with channel codes ending in ``N`` and ``E`` (case insensitive)
+    or in ``1`` and ``2`` are paired, if they share network, station and
+    location codes and the rest of the channel code, and if they have the
+    same sampling rate, start time and number of samples. The traces are
+    grouped by a dictionary lookup, so that the cost is linear in the
+    number of traces.
+
+    :param traces: list of traces in arbitrary order
+    :returns: list of `(a, b)` tuples with the north (or ``1``) component
+              trace in `a` and the east (or ``2``) component trace in `b`
+    '''
+
+    groups = {}
+    for tr in traces:
+        last = tr.channel[-1:].lower()
+        for icomp, comps in ((0, 'n1'), (1, 'e2')):
+            if last and last in comps:
+                k = (tr.nslc_id[:3], tr.channel[:-1], comps.index(last))
+                groups.setdefault(k, ([], []))[icomp].append(tr)
+
+    pairs = []
+    for as_, bs in groups.itervalues():
+        for a in as_:
+            for b in bs:
+                if ( abs(a.deltat-b.deltat) < a.deltat*0.001 and
+                     abs(a.tmin-b.tmin) < a.deltat*0.01 and
+                     a.data_len() == b.data_len() ):
+
+                    pairs.append((a, b))
+                    bs.remove(b)
+                    break
+
+    return pairs
+
 def rotate_to_rt(n, e, source, receiver, out_channels=('R', 'T')):
     azimuth = orthodrome.azimuth(receiver, source) + 180.
     in_channels = n.channel, e.channel
@@ -1377,166 +1437,203 @@ def project(traces, matrix, in_channels, out_channels):
     :param in_channels: input channel names
     :param out_channels: output channel names
     :returns: list of transformed traces
+
+    To apply the same transform repeatedly, e.g. in every window of
+    :py:meth:`pyrocko.pile.Pile.chopper`, use a :py:class:`ProjectionPlan`.
     '''
     
-    in_channels = tuple( _channels_to_names(in_channels) )
-    out_channels = tuple( _channels_to_names(out_channels) )
-    systems = _decompose(matrix)
-    
-    # fallback to full matrix if some are not quadratic
-    for iins, iouts, submatrix in systems:
-        if submatrix.shape[0] != submatrix.shape[1]:
-            return _project3(traces, matrix, in_channels, out_channels)
-    
-    projected = []
-    for iins, iouts ,submatrix in systems:
-        in_cha = tuple( [ in_channels[iin] for iin in iins ] )
-        out_cha = tuple( [ out_channels[iout] for iout in iouts ] )
-        if submatrix.shape[0] == 1:
-            projected.extend( _project1(traces, submatrix, in_cha, out_cha) )
-        elif submatrix.shape[1] == 2:
-            projected.extend( _project2(traces, submatrix, in_cha, out_cha) )
-        else:
-            projected.extend( _project3(traces, submatrix, in_cha, out_cha) )
-    
-   
-    return projected
+    return ProjectionPlan(matrix, in_channels, out_channels).apply(traces)
 
 def project_dependencies(matrix, in_channels, out_channels):
     
     '''Figure out what dependencies project() would produce.'''
     
-    in_channels = tuple( _channels_to_names(in_channels) )
-    out_channels = tuple( _channels_to_names(out_channels) )
-    systems = _decompose(matrix)
-    
-    subpro = []
-    for iins, iouts, submatrix in systems:
-        if submatrix.shape[0] != submatrix.shape[1]:
-            subpro.append((matrix, in_channels, out_channels))
-    
-    if not subpro:
-        for iins, iouts ,submatrix in systems:
-            in_cha = tuple( [ in_channels[iin] for iin in iins ] )
-            out_cha = tuple( [ out_channels[iout] for iout in iouts ] )
-            subpro.append((submatrix, in_cha, out_cha))
-            
-    deps = {}
-    for mat, in_cha, out_cha in subpro:
-        for oc in out_cha:
-            if oc not in deps:
-                deps[oc] = []
-            
-            for ic in in_cha:
-                deps[oc].append(ic)
-    
-    return deps
-        
-def _project1(traces, matrix, in_channels, out_channels):
-    assert len(in_channels) == 1
-    assert len(out_channels) == 1
-    assert matrix.shape == (1,1)
-    
+    return ProjectionPlan(matrix, in_channels, out_channels).dependencies
+
+class ProjectionPlan(object):
+    '''Precomputed affine transform of three-component traces.
+
+    Holds the independent subsystems of the transformation matrix, as found
+    by the dependency analysis of :py:func:`project`, so that the transform
+    can be applied to many sets of traces without repeating it. If `nsl` is
+    given, the plan is restricted to traces with these network, station and
+    location codes.
+
+    :param matrix: tranformation matrix
+    :param in_channels: input channel names
+    :param out_channels: output channel names
+    :param nsl: `(network, station, location)` tuple or `None`
+    '''
+
+    def __init__(self, matrix, in_channels, out_channels, nsl=None):
+        self.matrix = num.asarray(matrix)
+        self.in_channels = tuple( _channels_to_names(in_channels) )
+        self.out_channels = tuple( _channels_to_names(out_channels) )
+        self.nsl = nsl
+
+        systems = _decompose(self.matrix)
+
+        # fallback to full matrix if some are not quadratic
+        self.systems = []
+        for iins, iouts, submatrix in systems:
+            if submatrix.shape[0] != submatrix.shape[1]:
+                self.systems = [ (self.matrix, self.in_channels, self.out_channels) ]
+                break
+
+            in_cha = tuple( [ self.in_channels[iin] for iin in iins ] )
+            out_cha = tuple( [ self.out_channels[iout] for iout in iouts ] )
+            self.systems.append((submatrix, in_cha, out_cha))
+
+        self.dependencies = {}
+        for mat, in_cha, out_cha in self.systems:
+            for oc in out_cha:
+                if oc not in self.dependencies:
+                    self.dependencies[oc] = []
+
+                for ic in in_cha:
+                    self.dependencies[oc].append(ic)
+
+    def apply(self, traces):
+        '''Apply the transform to traces.
+
+        :param traces: list of traces in arbitrary order
+        :returns: list of transformed traces
+        '''
+
+        if self.nsl is not None:
+            traces = [ tr for tr in traces if tr.nslc_id[:3] == self.nsl ]
+
+        projected = []
+        for submatrix, in_cha, out_cha in self.systems:
+            projected.extend( _project_grouped(traces, submatrix, in_cha,
+                out_cha, strict=len(in_cha) == 3) )
+
+        return projected
+
+def guess_projection_plans(station, event=None, to='rtu', **kwargs):
+    '''Get projection plans for the channel groups of a station.
+
+    The projections are those of :py:meth:`pyrocko.model.Station.guess_projections_to_rtu`
+    (or ``_enu`` if `to` is ``'enu'``). If `event` is given, the event relative
+    data of the station is set first. The plans are restricted to the
+    station's traces.
+    '''
+
+    if event is not None:
+        station.set_event_relative_data(event)
+
+    if to == 'rtu':
+        projections = station.guess_projections_to_rtu(**kwargs)
+    elif to == 'enu':
+        projections = station.guess_projections_to_enu(**kwargs)
+    else:
+        raise ValueError('unsupported projection target: %s' % to)
+
+    return [ ProjectionPlan(m, in_channels, out_channels, nsl=station.nsl())
+             for (m, in_channels, out_channels) in projections ]
+
+def apply_projection_plans(plans, traces):
+    '''Apply many projection plans to a set of traces.
+
+    The traces are distributed to the plans by their network, station and
+    location codes in a single pass, so that the cost does not grow with
+    the product of number of plans and number of traces.
+
+    :param plans: list of :py:class:`ProjectionPlan` objects
+    :param traces: list of traces in arbitrary order
+    :returns: list of transformed traces
+    '''
+
+    by_nsl = {}
+    for tr in traces:
+        by_nsl.setdefault(tr.nslc_id[:3], []).append(tr)
+
     projected = []
-    for a in traces:
-        if not (a.channel,) == in_channels: 
-            continue
-        
-        ac = a.copy()
-        ac.set_ydata(matrix[0,0]*a.get_ydata())
-        ac.set_codes(channel=out_channels[0])
-        projected.append(ac)
-        
+    for plan in plans:
+        if plan.nsl is None:
+            projected.extend(plan.apply(traces))
+        else:
+            projected.extend(plan.apply(by_nsl.get(plan.nsl, [])))
+
     return projected
 
-def _project2(traces, matrix, in_channels, out_channels):
-    assert len(in_channels) == 2
-    assert len(out_channels) == 2
-    assert matrix.shape == (2,2)
-    projected = []
-    for a in traces:
-        for b in traces:
-            if not ( (a.channel, b.channel ) == in_channels and
-                    a.nslc_id[:3] == b.nslc_id[:3] and
-                    abs(a.deltat-b.deltat) < a.deltat*0.001 ):
-                continue
-                    
-            tmin = max(a.tmin, b.tmin)
-            tmax = min(a.tmax, b.tmax)
-            
-            if tmin > tmax:
-                continue
-        
-            ac = a.chop(tmin, tmax, inplace=False, include_last=True)
-            bc = b.chop(tmin, tmax, inplace=False, include_last=True)
-            if abs(ac.tmin - bc.tmin) > ac.deltat*0.01:
-                logger.warn('Cannot project traces with displaced sampling (%s,%s,%s,%s)' % a.nslc_id)
-                continue
-                
-            acydata = num.dot( matrix[0], (ac.get_ydata(),bc.get_ydata()))
-            bcydata = num.dot( matrix[1], (ac.get_ydata(),bc.get_ydata()))
-            
-            ac.set_ydata(acydata)
-            bc.set_ydata(bcydata)
+def _matching_combos(traces, in_channels):
+    '''Find combinations of traces with channels `in_channels`.
+
+    Traces are matched by network, station and location codes and by
+    channel through a dictionary lookup. Combinations with inconsistent
+    sampling rates are excluded. The combinations are returned in the order
+    of the input traces.
+    '''
+
+    by_nsl_cha = {}
+    firsts = []
+    for tr in traces:
+        if tr.channel in in_channels:
+            by_nsl_cha.setdefault((tr.nslc_id[:3], tr.channel), []).append(tr)
+            if tr.channel == in_channels[0]:
+                firsts.append(tr)
+
+    combos = []
+    for a in firsts:
+        if len(in_channels) == 1:
+            combos.append((a,))
+            continue
+
+        acombos = [ (a,) ]
+        for cha in in_channels[1:]:
+            acombos = [ combo + (b,) for combo in acombos
+                        for b in by_nsl_cha.get((a.nslc_id[:3], cha), [])
+                        if abs(combo[-1].deltat-b.deltat) < combo[-1].deltat*0.001 ]
+
+        combos.extend(acombos)
+
+    return combos
+
+def _project_grouped(traces, matrix, in_channels, out_channels, strict=False):
+    '''Apply transform to matching traces.
+
+    The overlapping parts of each combination of matching traces (see
+    :py:func:`_matching_combos`) are stacked and transformed with a single
+    matrix product. If `strict` is true, combinations overlapping in a
+    single sample only are skipped.
+    '''
 
+    matrix = num.asarray(matrix)
+    n = len(in_channels)
+    assert len(out_channels) == n
+    assert matrix.shape == (n,n)
+
+    projected = []
+    for combo in _matching_combos(traces, in_channels):
+        if n == 1:
+            ac = combo[0].copy()
+            ac.set_ydata(matrix[0,0]*ac.get_ydata())
             ac.set_codes(channel=out_channels[0])
-            bc.set_codes(channel=out_channels[1])
-            
             projected.append(ac)
-            projected.append(bc)
-    
-    return projected
-            
-def _project3(traces, matrix, in_channels, out_channels):
-    assert len(in_channels) == 3
-    assert len(out_channels) == 3
-    assert matrix.shape == (3,3)
-    projected = []
-    for a in traces:
-        for b in traces:
-            for c in traces:
-                if not ( (a.channel, b.channel, c.channel) == in_channels and
-                     a.nslc_id[:3] == b.nslc_id[:3] and
-                     b.nslc_id[:3] == c.nslc_id[:3] and
-                     abs(a.deltat-b.deltat) < a.deltat*0.001 and
-                     abs(b.deltat-c.deltat) < b.deltat*0.001 ):
-                    continue
-                     
-                tmin = max(a.tmin, b.tmin, c.tmin)
-                tmax = min(a.tmax, b.tmax, c.tmax)
-                    
-                if tmin >= tmax:
-                    continue
-                
-                ac = a.chop(tmin, tmax, inplace=False, include_last=True)
-                bc = b.chop(tmin, tmax, inplace=False, include_last=True)
-                cc = c.chop(tmin, tmax, inplace=False, include_last=True)
-                if (abs(ac.tmin - bc.tmin) > ac.deltat*0.01 or
-                    abs(bc.tmin - cc.tmin) > bc.deltat*0.01):
-                    logger.warn('Cannot project traces with displaced sampling (%s,%s,%s,%s)' % a.nslc_id)
-                    continue
-                    
-                acydata = num.dot( matrix[0],
-                    (ac.get_ydata(),bc.get_ydata(),cc.get_ydata()))
-                bcydata = num.dot( matrix[1],
-                    (ac.get_ydata(),bc.get_ydata(),cc.get_ydata()))
-                ccydata = num.dot( matrix[2],
-                    (ac.get_ydata(),bc.get_ydata(),cc.get_ydata()))
-                
-                ac.set_ydata(acydata)
-                bc.set_ydata(bcydata)
-                cc.set_ydata(ccydata)
+            continue
 
-                ac.set_codes(channel=out_channels[0])
-                bc.set_codes(channel=out_channels[1])
-                cc.set_codes(channel=out_channels[2])
-                
-                projected.append(ac)
-                projected.append(bc)
-                projected.append(cc)
-     
-    return projected
+        tmin = max(tr.tmin for tr in combo)
+        tmax = min(tr.tmax for tr in combo)
+
+        if tmin > tmax or (strict and tmin == tmax):
+            continue
+
+        chopped = [ tr.chop(tmin, tmax, inplace=False, include_last=True)
+                    for tr in combo ]
 
+        if any(abs(xc.tmin - yc.tmin) > xc.deltat*0.01
+               for (xc, yc) in zip(chopped[:-1], chopped[1:])):
+            logger.warn('Cannot project traces with displaced sampling (%s,%s,%s,%s)' % combo[0].nslc_id)
+            continue
+
+        ydata = num.dot(matrix, [ tr.get_ydata() for tr in chopped ])
+        for tr, cha, trydata in zip(chopped, out_channels, ydata):
+            tr.set_ydata(trydata)
+            tr.set_codes(channel=cha)
+            projected.append(tr)
+
+    return projected
 
 def correlate(a, b, mode='valid', normalization=None, use_fft=False):
     '''Cross correlation of two traces.
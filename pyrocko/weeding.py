@@ -1,6 +1,7 @@
 import math, time
 import numpy as num
-from pyrocko import orthodrome
+from scipy.spatial import cKDTree
+from pyrocko import orthodrome, model
 
 def neighborhood_density(dists, neighborhood=1):
     sdists = dists.copy()
@@ -9,64 +10,159 @@ def neighborhood_density(dists, neighborhood=1):
     return meandists
     
 
-def _weed(dists, badnesses, neighborhood=1, interaction_radius=3., del_frac=4, max_del=100, max_depth=100, depth=0):
-    if depth > max_depth:
-        assert False, 'max recursion depth reached'
-    
-    meandists = neighborhood_density(dists, neighborhood)
-    
-    order = meandists.argsort()
-    candidates = order[:order.size/del_frac+1]
-    badness_candidates = badnesses[candidates]
-    order_badness = (-badness_candidates).argsort()
-    
-    order[:order.size/del_frac+1] = order[:order.size/del_frac+1][order_badness]
-    
-    deleted = num.zeros(order.size, dtype=num.bool)
-    ndeleted = 0
-    for i,ind in enumerate(order):
-        if (i<order.size/del_frac/2+1 and 
-            ndeleted < max_del and 
-                num.all(dists[ind,deleted] > interaction_radius*meandists[ind])):
-            deleted[ind] = True
-            ndeleted += 1
-           
-    if ndeleted == 0:
-        return deleted
-    
-    kept = num.logical_not(deleted).nonzero()[0]
-    
-    xdists = dists[num.meshgrid(kept,kept)]
-    xbadnesses = badnesses[kept]
-    xdeleted = _weed(xdists, xbadnesses, neighborhood, interaction_radius, del_frac, 
-                                max_del-ndeleted, max_depth, depth+1)
-    
-    deleted[kept] = xdeleted
-    return deleted
+class _Neighbors:
+    '''Neighbor lookup for a subset of points in the (x,y) plane, periodic in x.
+
+    Distances are computed like in :py:func:`weed`, with x being an angle in
+    [deg]. Candidates are looked up in a :py:class:`scipy.spatial.cKDTree`,
+    which holds each point twice, the second copy shifted by one period
+    towards the other side of the 0/360 wrap. Exact distances are then
+    recomputed from the original coordinates.
+    '''
+
+    def __init__(self, x, y, xw, indices):
+        self.x = x
+        self.y = y
+        self.xw = xw
+        self.indices = indices
+        self.n = indices.size
+        xs = num.where(xw[indices] < 180., xw[indices]+360., xw[indices]-360.)
+        # median splits degrade badly on collinear points, sliding midpoint
+        # splits do not
+        self.tree = cKDTree(num.vstack((
+            num.concatenate((xw[indices], xs)),
+            num.concatenate((y[indices], y[indices])))).T,
+            balanced_tree=False)
+
+    def dists(self, i, js):
+        dx = num.abs(self.x[js]-self.x[i])
+        dx = num.where(dx > 180., 360.-dx, dx)
+        return num.sqrt(dx**2 + (self.y[js]-self.y[i])**2)
+
+    def within(self, i, radius):
+        '''Get indices of points which may be within `radius` of point `i`.'''
+
+        eps = 1e-9
+        js = self.tree.query_ball_point((self.xw[i], self.y[i]),
+                radius*(1.+eps) + eps)
+
+        return num.unique(self.indices[num.array(js, dtype=num.int) % self.n])
+
+    def nearest(self, i, k):
+        '''Get indices and sorted distances of the `k` points nearest to `i`.'''
+
+        # each point is held twice, so this gives at least k+1 distinct points
+        kk = min(2*(k+1), 2*self.n)
+        dists, _ = self.tree.query((self.xw[i], self.y[i]), kk)
+        js = self.within(i, num.max(dists))
+        js = js[js != i]
+        dists = self.dists(i, js)
+        order = dists.argsort()[:k]
+        return js[order], dists[order]
+
+    def conflicts(self, i, radius, mask):
+        '''Check if any point in `mask` is not farther than `radius` from `i`.'''
+
+        if not num.isfinite(radius):
+            return num.any(mask)
+
+        js = self.within(i, radius)
+        js = js[mask[js]]
+        return js.size != 0 and not num.all(self.dists(i, js) > radius)
+
+def _weed(x, y, badnesses, neighborhood=1, interaction_radius=3., del_frac=4,
+        max_del=100, max_depth=100):
+
+    # Points are deleted in rounds. In each round, the candidates for
+    # deletion are those with the densest neighborhood, which are tried in
+    # order of their badness. A point is not deleted, if another point
+    # deleted in the same round is within interaction_radius times its mean
+    # neighbor distance. Neighbors are looked up in a k-d tree of the kept
+    # points, which is rebuilt after each round, and neighbor distances are
+    # only recomputed for points which have lost a neighbor.
+
+    n = x.size
+    if n == 0:
+        return num.zeros(0, dtype=num.bool), num.zeros(0)
+
+    xw = orthodrome.wrap(x, 0., 360.)
+
+    neighbors = [ None ] * n
+    meandists_all = num.zeros(n)
+
+    def update(lookup, indices):
+        for i in indices:
+            neighbors[i], dists = lookup.nearest(i, neighborhood)
+            meandists_all[i] = num.mean(dists)
+
+    deleted = num.zeros(n, dtype=num.bool)
+    kept = num.arange(n)
+    lookup = _Neighbors(x, y, xw, kept)
+    update(lookup, kept)
+
+    depth = 0
+    ndeleted_total = 0
+    while True:
+        if depth > max_depth:
+            assert False, 'max recursion depth reached'
+
+        meandists = meandists_all[kept]
+        order = meandists.argsort()
+        ncandidates = order.size//del_frac+1
+        badness_candidates = badnesses[kept][order[:ncandidates]]
+        order_badness = (-badness_candidates).argsort()
+        order[:ncandidates] = order[:ncandidates][order_badness]
+
+        deleted_round = num.zeros(n, dtype=num.bool)
+        ndeleted = 0
+        for ind in kept[order[:order.size//del_frac//2+1]]:
+            if ndeleted_total + ndeleted >= max_del:
+                break
+
+            if not lookup.conflicts(ind,
+                    interaction_radius*meandists_all[ind], deleted_round):
+
+                deleted_round[ind] = True
+                ndeleted += 1
+
+        if ndeleted == 0:
+            break
+
+        deleted |= deleted_round
+        ndeleted_total += ndeleted
+        kept = num.logical_not(deleted).nonzero()[0]
+        if kept.size == 0:
+            break
+
+        lookup = _Neighbors(x, y, xw, kept)
+        update(lookup, [ i for i in kept if num.any(deleted[neighbors[i]]) ])
+        depth += 1
+
+    return deleted, meandists_all[kept]
 
 def weed(x, y, badnesses, neighborhood=1, nwanted=None, interaction_radius=3.):
+    '''Thin out a set of points, preferably deleting those in dense regions.
+
+    x, y:       1D numpy arrays with coordinates of the points. The x
+                coordinate is an angle in [deg], e.g. an azimuth, all values
+                within one period.
+    badnesses:  Points with higher badness are deleted first.
+
+    Returns: deleted, meandists_kept: boolean array marking the deleted
+    points and mean distances to the `neighborhood` nearest neighbors of the
+    kept points.
+
+    Memory usage is linear in the number of points.
+    '''
+
     assert x.size == y.size
     n = x.size
-    NEW = num.newaxis
-    ax = x[NEW,:]
-    ay = y[NEW,:]
-    bx = x[:,NEW]
-    by = y[:,NEW]
     
     if nwanted is None:
         nwanted = n/2
     
-    dx = num.abs(ax-bx)
-    dx = num.where(dx > 180., 360.-dx, dx)
-    
-    dists = num.sqrt(dx**2 + (ay-by)**2)
-    deleted = _weed(dists, badnesses, neighborhood, interaction_radius, del_frac=4,
-                              max_del=n-nwanted, max_depth=500, depth=0)    
-
-    kept = num.logical_not(deleted).nonzero()[0]
-    dists_kept = dists[num.meshgrid(kept,kept)]
-    meandists_kept = neighborhood_density(dists_kept, neighborhood)
-    return deleted, meandists_kept
+    return _weed(x, y, badnesses, neighborhood, interaction_radius,
+            del_frac=4, max_del=n-nwanted, max_depth=500)
 
 def badnesses_c_mean(badnesses_nslc):
     # convert stream badnesses to station badnesses by averaging
@@ -82,8 +178,11 @@ def badnesses_c_mean(badnesses_nslc):
     return badnesses_nsl
 
 def weed_stations(stations, nwanted, neighborhood=3, default_badness=1.0, badnesses=None,
-                  badnesses_ns={}, badnesses_nsl={}, badnesses_nslc={}):
+                  badnesses_ns={}, badnesses_nsl={}, badnesses_nslc={}, event=None):
     
+    if event is not None:
+        model.set_event_relative_data(stations, event)
+
     azimuths = num.zeros(len(stations), dtype=num.float)
     dists = num.zeros(len(stations), dtype=num.float)
     for ista, sta in enumerate(stations):
@@ -7,6 +7,9 @@ from test_moment_tensor import MomentTensorTestCase
 from test_trace import TraceTestCase
 from test_model import ModelTestCase
 from test_util import UtilTestCase
+from test_gf import GFTestCase
+from test_cake import CakeTestCase
+from test_weeding import WeedingTestCase
 
 import unittest
 
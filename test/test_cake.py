@@ -0,0 +1,187 @@
+from pyrocko import cake
+
+import unittest, tempfile, shutil, os
+import numpy as num
+
+km = 1000.
+
+class CakeTestCase(unittest.TestCase):
+
+    def testGroupPaths(self):
+        mod = cake.load_model()
+        for phase in [ cake.PhaseDef(x) for x in ('P', 'PP', 'sP', 'S(moho)s') ]:
+            for zstart, zstop in [ (0., 0.), (100*km, 3*km) ]:
+                layer_start = mod.layer(zstart, -phase.direction_start())
+                layer_stop = mod.layer(zstop, phase.direction_stop())
+                ps = num.linspace(0., 1000., 500) / cake.d2r
+
+                groups = mod.group_paths(ps, phase, layer_start, layer_stop)
+                ipaths = num.zeros(ps.size, dtype=num.int) - 1
+                for i, (path, indices) in enumerate(groups):
+                    self.assertTrue(num.all(ipaths[indices] == -1))
+                    ipaths[indices] = i
+
+                for p, ipath in zip(ps, ipaths):
+                    try:
+                        path = mod.path(p, phase, layer_start, layer_stop)
+                        self.assertTrue(ipath >= 0)
+                        self.assertEqual(path, groups[ipath][0])
+
+                    except cake.PathFailed:
+                        self.assertEqual(ipath, -1)
+
+    def testGatherPaths(self):
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef(x) for x in ('P', 'pP', 'Pv410p') ]
+        paths = mod.gather_paths(phases, zstart=10*km)
+        for path in paths:
+            self.assertTrue(path.pmin() <= path.pmax())
+
+        self.assertEqual(len(set(paths)), len(paths))
+
+    def testRefine(self):
+        from scipy.optimize import brentq
+
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef(x) for x in ('P', 'PP', 'sP') ]
+        distances = num.linspace(1., 120., 50)
+        rays = mod.arrivals(distances, phases=phases, zstart=10*km,
+                refine=False)
+
+        ok = cake.refine_rays(rays)
+        self.assertTrue(num.sum(ok) > len(rays) * 0.9)
+
+        for ray, ok_ in zip(rays, ok):
+            if not ok_:
+                continue
+
+            x, t = ray.path.xt(num.array([ray.p]), ray.endgaps)
+            self.assertAlmostEqual(x[0], ray.x, places=9)
+            self.assertAlmostEqual(t[0], ray.t, places=9)
+
+            cp = ray.draft_pxt[0]
+            ip = num.searchsorted(cp, ray.p)
+            p = brentq(lambda p: ray.x - ray.path.xt(p, ray.endgaps)[0],
+                    cp[max(ip-1, 0)], cp[min(ip, cp.size-1)])
+
+            self.assertAlmostEqual(p, ray.p, places=6)
+
+    def testArrivalsMany(self):
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef(x) for x in ('P', 'pP') ]
+        depths = [ 0., 10*km, 35*km ]
+        distances = [ 20., 60. ]
+
+        def key(rays):
+            return [ (ray.x, ray.t, ray.p, str(ray.path)) for ray in rays ]
+
+        for nworkers in (1, 2):
+            all_rays = mod.arrivals_many(depths, distances, phases,
+                    nworkers=nworkers)
+
+            self.assertEqual(len(all_rays), len(depths))
+            for z, rays in zip(depths, all_rays):
+                rays_ref = mod.arrivals(distances, phases, zstart=z)
+                self.assertEqual(key(rays), key(rays_ref))
+                for ray, ray_ref in zip(rays, rays_ref):
+                    zs, xs, ts = ray.zxt_path_subdivided()
+                    zs_ref, xs_ref, ts_ref = ray_ref.zxt_path_subdivided()
+                    assert num.all(zs[0] == zs_ref[0])
+                    assert num.all(ts[0] == ts_ref[0])
+
+    def testZXTPacked(self):
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef(x) for x in ('P', 'sP', 'Pv_(moho)p') ]
+        rays = mod.arrivals([ 5., 10., 40. ], phases=phases, zstart=10*km)
+        offsets, z, x, t = cake.zxt_rays_packed(rays)
+        self.assertEqual(offsets.size, len(rays) + 1)
+        self.assertEqual(offsets[-1], z.size)
+
+        for iray, ray in enumerate(rays):
+            zs, xs, ts = ray.zxt_path_subdivided()
+            sl = slice(offsets[iray], offsets[iray+1])
+            assert num.all(z[sl] == zs[0])
+            assert num.all(x[sl] == xs[0])
+            assert num.all(t[sl] == ts[0])
+            self.assertAlmostEqual(xs[0][-1], ray.x, places=6)
+            self.assertAlmostEqual(ts[0][-1], ray.t, places=6)
+
+    def testCrust2x2Models(self):
+        from pyrocko import crust2x2
+
+        lats = num.array([ 10., 10.5, -45., 89.9, 0. ])
+        lons = num.array([ 20., 20.5, 170., -179.9, 540. ])
+        profiles = crust2x2.get_profiles(lats, lons)
+        for lat, lon, profile in zip(lats, lons, profiles):
+            self.assertTrue(crust2x2.get_profile(lat, lon) is profile)
+
+        mods = cake.crust2x2_models(lats, lons)
+        self.assertTrue(mods[0] is mods[1])
+        self.assertTrue(mods[0] is cake.crust2x2_model(profiles[0]))
+        self.assertEqual(
+            cake.write_nd_model_str(mods[2]),
+            cake.write_nd_model_str(cake.LayeredModel.from_scanlines(
+                cake.from_crust2x2_profile(profiles[2]))))
+
+    def testPersistentPathcache(self):
+        cachedir = tempfile.mkdtemp(prefix='pyrocko-test-cake-')
+        try:
+            phases = [ cake.PhaseDef(x) for x in ('P', 'sP', 'S(moho)s') ]
+            distances = [ 10., 40., 80. ]
+
+            mod = cake.load_model()
+            mod.use_persistent_pathcache(cachedir)
+            rays1 = mod.arrivals(distances, phases=phases, zstart=10*km)
+
+            mod = cake.load_model()
+            mod.use_persistent_pathcache(cachedir)
+            mod._find_paths = None  # must not be needed
+            rays2 = mod.arrivals(distances, phases=phases, zstart=10*km)
+
+            self.assertEqual(
+                [ (r.x, r.t, r.p, str(r.path)) for r in rays1 ],
+                [ (r.x, r.t, r.p, str(r.path)) for r in rays2 ])
+
+            mod2 = mod.copy_with_elevation(500.)
+            self.assertNotEqual(mod.content_hash(), mod2.content_hash())
+
+            # unwritable cache must fall back to in-memory cache
+            baddir = os.path.join(cachedir, 'notadir')
+            open(baddir, 'w').close()
+            mod = cake.load_model()
+            mod._persistent_pathcache_dir = baddir
+            rays3 = mod.arrivals(distances, phases=phases, zstart=10*km)
+            self.assertEqual(
+                [ (r.x, r.t, r.p, str(r.path)) for r in rays1 ],
+                [ (r.x, r.t, r.p, str(r.path)) for r in rays3 ])
+
+        finally:
+            shutil.rmtree(cachedir)
+
+    def testTravelTimeTable(self):
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef('P'), cake.PhaseDef('p') ]
+        tab = cake.TravelTimeTable.build(mod, phases, (0., 20*km, 3),
+                (30., 40., 11))
+
+        for method in ('bilinear', 'bicubic'):
+            self.assertTrue(tab.errors[method] < 0.05)
+
+        fn = tempfile.mktemp(prefix='pyrocko-test-cake-')
+        try:
+            tab.save(fn)
+            tab2 = cake.TravelTimeTable.load(fn)
+        finally:
+            os.unlink(fn)
+
+        self.assertEqual(tab2.definitions, tab.definitions)
+        self.assertEqual(tab2.errors, tab.errors)
+        assert num.allclose(tab2.times, tab.times, rtol=1e-6)
+
+        t = tab2.interpolate(10*km, [35., 42.])
+        rays = mod.arrivals([35.], phases=phases, zstart=10*km)
+        self.assertAlmostEqual(t[0], min(ray.t for ray in rays), places=3)
+        self.assertTrue(num.isnan(t[1]))
+
+if __name__ == '__main__':
+    unittest.main()
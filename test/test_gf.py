@@ -0,0 +1,467 @@
+from pyrocko import gf, util, cake
+import unittest, tempfile, shutil, os, threading
+import numpy as num
+from os.path import join as pjoin
+
+km = 1000.
+
+class GFTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdirs = []
+
+    def tearDown(self):
+        for d in self.tempdirs:
+            shutil.rmtree(d)
+
+    def _create_test_store(self, encoding='raw'):
+        meta = gf.meta.GFSetTypeA(
+                id = 'test',
+                source_depth_min = 0.,
+                source_depth_max = 10*km,
+                source_depth_delta = 1*km,
+                distance_min = 1*km,
+                distance_max = 20*km,
+                distance_delta = 1*km,
+                sample_rate = 2.0,
+                ncomponents = 2)
+
+        store_dir = tempfile.mkdtemp(prefix='gfstore')
+        self.tempdirs.append(store_dir)
+
+        gf.Store.create(store_dir, meta=meta, force=True, encoding=encoding)
+        store = gf.Store(store_dir, 'w')
+        num.random.seed(10)
+        for i, args in enumerate(store.meta.iter_nodes()):
+            n = [ 0, 1, 2, 50 ][i % 4]
+            if i % 3 == 0:
+                data = num.random.random(n).astype(num.float32)
+            else:
+                data = num.sin(num.arange(n)*0.1).astype(num.float32)
+
+            if i % 5 == 0:
+                data[:] = 0.0
+
+            store.put(args, gf.GFTrace(data, itmin=i % 7, deltat=0.5))
+
+        store.close()
+        return store_dir
+
+    def _assert_same_traces(self, store_a, store_b):
+        for args in store_a.meta.iter_nodes():
+            tr_a = store_a.get(args)
+            tr_b = store_b.get(args)
+            assert tr_a.is_zero == tr_b.is_zero
+            assert tr_a.itmin == tr_b.itmin
+            assert num.all(tr_a.data == tr_b.data)
+
+    def testRecordArgs(self):
+        store = gf.Store(self._create_test_store())
+        for irecord in [ 0, 1, 17, store.meta.nrecords - 1 ]:
+            args = store.meta.record_args(irecord)
+            assert store.meta.irecord(*args) == irecord
+
+    def testDecimateParallel(self):
+        store_dir = self._create_test_store()
+        store = gf.Store(store_dir)
+        store.make_decimated(2)
+        store_serial = gf.Store(pjoin(store_dir, 'decimated', '2'))
+        store.make_decimated(2, force=True, nworkers=3)
+        store_parallel = gf.Store(pjoin(store_dir, 'decimated', '2'))
+        self._assert_same_traces(store_serial, store_parallel)
+        assert store_parallel.check() == 0
+        assert not [ fn for fn in os.listdir(store_parallel.store_dir)
+                if fn.startswith('segments-') ]
+
+    def testFillParallel(self):
+        source = gf.Store(self._create_test_store())
+        dest_dir = tempfile.mkdtemp(prefix='gfstore')
+        self.tempdirs.append(dest_dir)
+        gf.Store.create(dest_dir, meta=source.meta, force=True)
+        dest = gf.Store(dest_dir, 'w')
+        dest.fill(source, interpolate='off', skip_errors=True, nworkers=4)
+        dest.close()
+        self._assert_same_traces(source, gf.Store(dest_dir))
+
+    def testCheckChecksums(self):
+        store_dir = self._create_test_store()
+        store = gf.Store(store_dir)
+        assert store.check(nworkers=2) == 0
+        assert os.path.exists(pjoin(store_dir, 'checksums'))
+        assert store.check(incremental=True) == 0
+
+        # corrupt sample data of a trace without touching the index
+        irecord = 3
+        ipos, _, nsamples, _, _ = store.get_record(store.meta.record_args(irecord))
+        store.close()
+        assert nsamples > 2
+        f = open(pjoin(store_dir, 'traces'), 'r+b')
+        f.seek(ipos + 4)
+        num.array([12345.], dtype=num.float32).tofile(f)
+        f.close()
+
+        store = gf.Store(store_dir)
+        assert store.check(incremental=True) == 0
+        assert store.check() == 1
+        assert store.check(nworkers=3) == 1
+
+        # checksums of a previous build must not survive re-creation
+        meta = store.meta
+        store.close()
+        gf.Store.create(store_dir, meta=meta, force=True)
+        assert not os.path.exists(pjoin(store_dir, 'checksums'))
+
+    def testEncoding(self):
+        store_raw = gf.Store(self._create_test_store())
+        store_zlib = gf.Store(self._create_test_store(encoding='zlib'))
+        assert store_raw.encoding == 'raw'
+        assert store_zlib.encoding == 'zlib'
+        self._assert_same_traces(store_raw, store_zlib)
+        assert num.any(store_zlib._records['encoding'] == 1)
+        assert store_zlib.stats()['size_data'] < store_raw.stats()['size_data']
+
+        for args in store_raw.meta.iter_nodes():
+            for itmin, nsamples in [ (0, 10), (5, 30), (40, 20), 
+                    (None, None) ]:
+
+                tr_raw = store_raw.get(args, itmin, nsamples)
+                tr_zlib = store_zlib.get(args, itmin, nsamples)
+                assert tr_raw.itmin == tr_zlib.itmin
+                assert num.all(tr_raw.data == tr_zlib.data)
+
+            tr_raw = store_raw.get(args, decimate=2)
+            tr_zlib = store_zlib.get(args, decimate=2)
+            assert num.all(tr_raw.data == tr_zlib.data)
+
+        args = (num.array([1*km, 2*km]), num.array([5*km, 6*km]), 
+                num.array([0, 1]))
+
+        delays = num.array([0.3, 1.0])
+        weights = num.array([1.0, 0.5])
+        tr_raw = store_raw.sum(args, delays, weights)
+        tr_zlib = store_zlib.sum(args, delays, weights)
+        assert num.all(tr_raw.data == tr_zlib.data)
+
+        store_zlib.make_decimated(2, nworkers=2)
+        assert store_zlib._decimated_store(2)[0].encoding == 'zlib'
+        assert store_zlib.check() == 0
+
+    def testVicinities(self):
+        store = gf.Store(self._create_test_store())
+        meta = store.meta
+        n = 50
+        a = num.random.uniform(0., 10*km, n)
+        b = num.random.uniform(1*km, 20*km, n)
+        a[:10] = num.round(a[:10] / km) * km
+        b[5:15] = num.round(b[5:15] / km) * km
+        ig = num.random.randint(0, 2, n)
+
+        irecords, weights = meta.vicinities(a, b, ig)
+        assert irecords.shape == weights.shape == (n, 4)
+        for i in xrange(n):
+            expect = {}
+            for irecord, weight in meta.vicinity(a[i], b[i], ig[i]):
+                expect[irecord] = expect.get(irecord, 0.0) + weight
+
+            got = {}
+            for irecord, weight in zip(irecords[i], weights[i]):
+                if weight != 0.0:
+                    got[irecord] = got.get(irecord, 0.0) + weight
+
+            assert sorted(expect.keys()) == sorted(got.keys())
+            for irecord in expect:
+                assert abs(expect[irecord] - got[irecord]) < 1e-12
+
+        self.assertRaises(gf.meta.OutOfBounds, meta.vicinities, 
+                num.array([11*km]), num.array([2*km]), num.array([0]))
+
+        delays = num.random.uniform(0., 2., n)
+        srcweights = num.random.uniform(-1., 1., n)
+        tr = store.sum((a, b, ig), delays, srcweights, 
+                interpolate='multilinear')
+
+        tr_ref = store._sum_reference(irecords.ravel(), 
+                num.repeat(delays, 4), (srcweights[:,num.newaxis] * weights).ravel(),
+                tr.itmin, tr.data.size)
+
+        assert num.all(num.abs(tr.data - tr_ref.data) < 1e-5)
+
+        self.assertRaises(gf.store.NotAllowedToInterpolate, store.sum,
+                (a, b, ig), delays, srcweights, interpolate='off')
+
+    def testPhaseWindow(self):
+        store = gf.Store(self._create_test_store())
+        mod = cake.load_model()
+        phases = [ cake.PhaseDef('p'), cake.PhaseDef('P') ]
+        store.make_phase_table('begin', mod, phases)
+        assert store.phase_ids() == [ 'begin' ]
+
+        args = (5*km, 10*km, 1)
+        tp = store.get_phase_times('begin', args)
+        rays = mod.arrivals([10*km*cake.m2d], phases=phases, zstart=5*km)
+        assert abs(tp - min(ray.t for ray in rays)) < 1e-6
+
+        deltat = store.meta.deltat
+        tr = store.get(args, phase_window=('begin', -1.0, 2.0))
+        itmin = int(num.floor((tp - 1.0) / deltat))
+        itmax = int(num.ceil((tp + 2.0) / deltat))
+        tr_ref = store.get(args, itmin, itmax - itmin + 1)
+        assert tr.itmin == tr_ref.itmin
+        assert num.all(tr.data == tr_ref.data)
+
+        sargs = (num.array([5*km, 6*km]), num.array([10*km, 12*km]), 
+                num.array([1, 1]))
+        delays = num.array([0.0, 1.0])
+        weights = num.array([1.0, 1.0])
+        tr = store.sum(sargs, delays, weights, 
+                phase_window=('begin', -1.0, 2.0))
+        tps = store.get_phase_times('begin', sargs) + delays
+        assert tr.itmin == int(num.floor((tps.min() - 1.0) / deltat))
+        assert tr.itmin + tr.data.size - 1 == \
+                int(num.ceil((tps.max() + 2.0) / deltat))
+
+        store = gf.Store(store.store_dir)
+        assert num.all(store.get_phase_times('begin', sargs) + delays == tps)
+
+        # phase tables must not survive re-creation of the store
+        meta = store.meta
+        gf.Store.create(store.store_dir, meta=meta, force=True)
+        store = gf.Store(store.store_dir)
+        assert store.phase_ids() == []
+        self.assertRaises(gf.StoreError, store.get_phase_times, 'begin', args)
+
+        # tables not matching the layout are refused
+        fn = pjoin(store.store_dir, 'phases', 'begin')
+        num.zeros(3, dtype='<f8').tofile(fn)
+        self.assertRaises(gf.StoreError, store.get_phase_times, 'begin', args)
+
+    def testBuilder(self):
+        
+        class Failed(Exception):
+            pass
+
+        class DummyBuilder(gf.GFBuilder):
+            def __init__(self, gf_set, fail_block=None):
+                gf.GFBuilder.__init__(self, gf_set, block_size=(2,5))
+                self.fail_block = fail_block
+
+            def work_block(self, index):
+                if index == self.fail_block:
+                    raise Failed()
+
+                ibegins, iends = self.get_block(index)
+                traces = []
+                for ia in xrange(ibegins[0], iends[0]):
+                    for ib in xrange(ibegins[1], iends[1]):
+                        for ig in xrange(self.gf_set.ncomponents):
+                            args = (self.gf_set.coords[0][ia], 
+                                    self.gf_set.coords[1][ib], ig)
+                            data = num.arange(10, dtype=num.float32) * \
+                                    self.gf_set.irecord(*args)
+                            traces.append((args, gf.GFTrace(data, 
+                                itmin=ia, deltat=self.gf_set.deltat)))
+
+                return traces
+
+        source = gf.Store(self._create_test_store())
+        store_dir = tempfile.mkdtemp(prefix='gfstore')
+        self.tempdirs.append(store_dir)
+        gf.Store.create(store_dir, meta=source.meta, force=True)
+
+        builder = DummyBuilder(source.meta, fail_block=5)
+        assert builder.nblocks == 6*4
+        self.assertRaises(Failed, builder.build, store_dir)
+        assert gf.Store(store_dir).stats()['inserted'] == 5 * 20
+
+        builder = DummyBuilder(source.meta)
+        builder.build(store_dir, nworkers=3)
+        store = gf.Store(store_dir)
+        assert store.stats()['empty'] == 0
+        for irecord in [ 1, 100, store.nrecords - 1 ]:
+            tr = store.get(store.meta.record_args(irecord))
+            assert num.all(tr.data == num.arange(10) * irecord)
+
+        assert not os.path.exists(gf.Store.build_checkpoint_fn_(store_dir))
+
+        # checkpoint of interrupted build must not survive re-creation
+        self.assertRaises(Failed, DummyBuilder(source.meta, fail_block=5).build,
+                store_dir)
+        gf.Store.create(store_dir, meta=source.meta, force=True)
+        builder.build(store_dir)
+        assert gf.Store(store_dir).stats()['empty'] == 0
+
+    def testCompact(self):
+        for encoding in ('raw', 'zlib'):
+            source = gf.Store(self._create_test_store(encoding=encoding))
+            store_dir = self._create_test_store(encoding=encoding)
+            store = gf.Store(store_dir)
+            assert store.check() == 0
+            size = store.stats()['size_data']
+            store.close()
+
+            f = open(pjoin(store_dir, 'traces'), 'ab')
+            f.write('\0' * 1000)
+            f.close()
+
+            for order in ('zorder', 'index'):
+                store = gf.Store(store_dir, 'w')
+                store.compact(order=order)
+                assert store.stats()['size_data'] == size
+                store.close()
+
+                store = gf.Store(store_dir)
+                self._assert_same_traces(source, store)
+                assert store.check(incremental=True) == 0
+                assert store.check() == 0
+
+        store = gf.Store(store_dir)
+        offsets = store._records['data_offset']
+        offsets = offsets[offsets > 2]
+        assert num.all(num.diff(offsets.astype(num.int)) > 0)
+
+    def testCompactInterrupted(self):
+        source = gf.Store(self._create_test_store())
+        store_dir = self._create_test_store()
+
+        def traces_fns():
+            return sorted(fn for fn in os.listdir(store_dir)
+                          if fn.startswith('traces'))
+
+        class Interrupt(Exception):
+            pass
+
+        def failing(f, fail):
+            def wrapper(fn, *args):
+                if fail(fn):
+                    raise Interrupt()
+                return f(fn, *args)
+            return wrapper
+
+        # interrupted before the new index is put into place
+        rename = os.rename
+        os.rename = failing(rename, lambda fn: fn.endswith('.compact-temp'))
+        try:
+            store = gf.Store(store_dir, 'w')
+            self.assertRaises(Interrupt, store.compact)
+            store.close()
+        finally:
+            os.rename = rename
+
+        assert traces_fns() == ['traces', 'traces-1']
+        store = gf.Store(store_dir)
+        assert store.data_fn() == pjoin(store_dir, 'traces')
+        self._assert_same_traces(source, store)
+        assert store.check() == 0
+
+        # interrupted after the new index is put into place
+        remove = os.remove
+        os.remove = failing(remove, lambda fn: os.path.basename(fn) == 'traces')
+        try:
+            store = gf.Store(store_dir, 'w')
+            self.assertRaises(Interrupt, store.compact)
+            store.close()
+        finally:
+            os.remove = remove
+
+        assert traces_fns() == ['traces', 'traces-1']
+        store = gf.Store(store_dir)
+        assert store.data_fn() == pjoin(store_dir, 'traces-1')
+        self._assert_same_traces(source, store)
+        assert store.check() == 0
+
+        # writer which opened the store before a compaction
+        writer = gf.Store(store_dir, 'w')
+        store = gf.Store(store_dir, 'w')
+        store.compact()
+        store.close()
+        assert traces_fns() == ['traces-2']
+        writer.lock()
+        writer.unlock()
+        assert writer.data_fn() == pjoin(store_dir, 'traces-2')
+        assert num.all(num.array(writer._records) ==
+                       num.array(gf.Store(store_dir)._records))
+        writer.close()
+
+        gf.Store.create(store_dir, meta=source.meta, force=True)
+        assert traces_fns() == ['traces']
+        assert gf.Store(store_dir).stats()['empty'] == source.nrecords
+
+    def testZOrderKeys(self):
+        ia, ib = num.meshgrid(num.arange(4), num.arange(4), indexing='ij')
+        keys = gf.store.zorder_keys((ia.ravel(), ib.ravel()))
+        assert sorted(keys.tolist()) == range(16)
+        assert keys.reshape((4,4))[1,1] == 3
+        assert keys.reshape((4,4))[2,0] == 4
+
+    def testServer(self):
+        store_dir = self._create_test_store(encoding='zlib')
+        store = gf.Store(store_dir)
+        socket_path = pjoin(store_dir, 'socket')
+        server = gf.StoreServer(store_dir, socket_path, cache_size=10000)
+        thread = threading.Thread(target=server.run)
+        thread.daemon = True
+        thread.start()
+
+        remote = gf.RemoteStore(socket_path)
+        assert remote.meta.nrecords == store.meta.nrecords
+
+        args = (num.array([1*km, 2*km]), num.array([5*km, 6*km]), 
+                num.array([0, 1]))
+        delays = num.array([0.3, 1.0])
+        weights = num.array([1.0, 0.5])
+
+        requests = []
+        for node in store.meta.iter_nodes():
+            requests.append(('get', (tuple(node),), dict(itmin=3, nsamples=20)))
+        
+        requests.append(('sum', (args, delays, weights), {}))
+
+        results = remote.batch(requests)
+        for (_, rargs, kwargs), tr in zip(requests, results)[:-1]:
+            tr_ref = store.get(*rargs, **kwargs)
+            assert tr.itmin == tr_ref.itmin
+            assert num.all(tr.data == tr_ref.data)
+
+        tr = remote.sum(args, delays, weights)
+        tr_ref = store.sum(args, delays, weights)
+        assert num.all(tr.data == results[-1].data)
+        assert num.all(tr.data == tr_ref.data)
+        assert server.store._cache_nbytes <= 10000
+
+        self.assertRaises(gf.server.ipc.RemoteException, remote.get, 
+                (100*km, 1*km, 0))
+
+        # concurrent clients, sharing the store and its cache
+        errors = []
+        def client(ithread):
+            try:
+                rem = gf.RemoteStore(socket_path)
+                for i in range(5):
+                    results = rem.batch(requests[ithread::4])
+                    for (methodname, rargs, kwargs), tr in zip(
+                            requests[ithread::4], results):
+                        tr_ref = getattr(store, methodname)(*rargs, **kwargs)
+                        assert tr.itmin == tr_ref.itmin
+                        assert num.all(tr.data == tr_ref.data)
+
+                rem.close()
+            except Exception, e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target=client, args=(i,)) for i in range(4) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors, errors
+        assert server.store._cache_nbytes <= 10000
+
+        remote.close()
+        server.server.shutdown()
+        server.close()
+        assert not os.path.exists(socket_path)
+
+if __name__ == '__main__':
+    util.setup_logging('test_gf', 'warning')
+    unittest.main()
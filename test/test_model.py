@@ -1,5 +1,5 @@
-from pyrocko import model, io, util, trace, orthodrome
-import unittest, math, tempfile, shutil
+from pyrocko import model, io, util, trace, orthodrome, moment_tensor
+import unittest, math, tempfile, shutil, time
 import numpy as num
 from os.path import join as pjoin
 
@@ -61,6 +61,166 @@ class ModelTestCase(unittest.TestCase):
         shutil.rmtree(tempdir)
         
 
+    def testIOBinary(self):
+        tempdir = tempfile.mkdtemp()
+        fn = pjoin(tempdir, 'events.bin')
+        num.random.seed(23)
+
+        mt = moment_tensor.MomentTensor(strike=10., dip=20., rake=30., scalar_moment=1e18)
+        events = []
+        for i in range(50):
+            events.append(model.Event(
+                lat=[ num.random.uniform(-90.,90.), None ][i%7 == 3],
+                lon=[ num.random.uniform(-180.,180.), None ][i%7 == 3],
+                time=[ num.random.uniform(0.,1e9), None ][i%7 == 1],
+                name=[ 'ev%i' % i, u'\xe9v%i' % i, u'ev%i' % i ][i%3],
+                depth=[ None, num.random.uniform(0.,600e3) ][i%2],
+                magnitude=[ None, 5.5, 6.1 ][i%3],
+                region=[ None, 'taka tuka land' ][i%2],
+                catalog=[ None, 'bubu' ][i%4 == 0],
+                moment_tensor=[ None, mt ][i%5 == 0],
+                duration=[ None, 10. ][i%3 == 0]))
+
+        model.dump_events_binary(events, fn, block_size=7)
+        events2 = model.load_events_binary(fn)
+        assert len(events2) == len(events)
+        for e1, e2 in zip(events, events2):
+            for k in 'lat lon time name depth magnitude region catalog duration'.split():
+                assert getattr(e1, k) == getattr(e2, k)
+                assert type(getattr(e1, k)) == type(getattr(e2, k))
+
+            if e1.moment_tensor is None:
+                assert e2.moment_tensor is None
+            else:
+                assert num.all(e1.moment_tensor.m() == e2.moment_tensor.m())
+
+        records, strings = model.load_event_records_binary(fn)
+        assert [ [ t, None ][num.isnan(t)] for t in records['time'].tolist() ] \
+                == [ ev.time for ev in events ]
+        assert [ strings[i] for i in records['name'] ] == [ ev.name for ev in events ]
+
+        fn = pjoin(tempdir, 'stations.bin')
+        stations = []
+        for i in range(20):
+            sta = model.Station('XX', 'S%02i' % i, ['', '00'][i%2],
+                    lat=[ num.random.uniform(-80.,80.), None ][i%5 == 2],
+                    lon=[ num.random.uniform(-180.,180.), None ][i%5 == 2],
+                    elevation=[ None, float(i) ][i%2], depth=[ None, 1.0 ][i%3 == 0],
+                    name=[ 'station %i' % i, u'st\xe4tion %i' % i ][i%2])
+            sta.set_channels([ model.Channel(name, azimuth=azimuth, dip=dip, gain=gain)
+                for (name, azimuth, dip, gain) in [
+                    ('BHZ', None, -90., 1.), ('NE', 45., 0., 2.), ('X', None, None, 1.) ][:i%4] ])
+            stations.append(sta)
+
+        model.dump_stations_binary(stations, fn, block_size=6)
+        stations2 = model.load_stations_binary(fn)
+        assert len(stations2) == len(stations)
+        for s1, s2 in zip(stations, stations2):
+            for k in 'network station location lat lon elevation depth name'.split():
+                assert getattr(s1, k) == getattr(s2, k)
+                assert type(getattr(s1, k)) == type(getattr(s2, k))
+
+            assert [ (c.name, c.azimuth, c.dip, c.gain) for c in s1.get_channels() ] == \
+                    [ (c.name, c.azimuth, c.dip, c.gain) for c in s2.get_channels() ]
+
+        shutil.rmtree(tempdir)
+
+    def testEventIndex(self):
+        num.random.seed(17)
+        events = [ model.Event(lat=num.random.uniform(-1.,1.),
+                               lon=num.random.uniform(-1.,1.),
+                               time=float(num.random.randint(0, 300)))
+                   for i in range(200) ]
+
+        index = model.EventIndex(events)
+        assert len(index) == len(events)
+        for t in num.random.uniform(-10., 310., 50):
+            ev = index.get_nearest_event(t)
+            assert abs(ev.time - t) == min(abs(e.time - t) for e in events)
+
+        in_window = index.get_events_in_window(100., 120.)
+        assert sorted(map(id, in_window)) == \
+                sorted(id(e) for e in events if 100. <= e.time <= 120.)
+        assert [ e.time for e in in_window ] == sorted(e.time for e in in_window)
+
+        for max_distance in (None, 50000.):
+            groups = model.Event.grouped(events, 10., max_distance)
+            assert sum(len(g) for g in groups) == len(events)
+
+            # reference: pairwise comparison
+            groups_ref = [ [] for e in events ]
+            for ia, a in enumerate(events):
+                for ib, b in enumerate(events[:ia]):
+                    if abs(b.time - a.time) < 10. and (max_distance is None or
+                            orthodrome.distance_accurate50m(a, b) <= max_distance):
+                        groups_ref[ib].append(a)
+                        break
+                else:
+                    groups_ref[ia].append(a)
+
+            groups_ref = [ g for g in groups_ref if g ]
+            groups_ref.sort( key=lambda g: sum(e.time for e in g)/len(g) )
+            assert [ map(id, g) for g in groups ] == [ map(id, g) for g in groups_ref ]
+
+        assert len(model.Event.unique(events, 10.)) == \
+                len(model.Event.grouped(events, 10.))
+
+        # dense burst: the first 20000 events are all within one time window
+        times = num.concatenate((num.random.uniform(0., 9.9, 20000),
+                                 num.random.uniform(-20., 40., 100)))
+        events = [ model.Event(lat=0., lon=0., time=float(t)) for t in times ]
+        t0 = time.time()
+        groups = model.Event.grouped(events, 10.)
+        assert time.time() - t0 < 10.
+        assert sum(len(g) for g in groups) == len(events)
+        assert any(len(g) >= 20000 for g in groups)
+
+        # compare with the general code path, on a subset
+        events = events[::10] + events[20000:]
+        groups = model.Event.grouped(events, 10.)
+        groups_ref = model.Event.grouped(events, 10., max_distance=1e30)
+        assert [ map(id, g) for g in groups ] == [ map(id, g) for g in groups_ref ]
+
+    def testStationTable(self):
+        num.random.seed(42)
+        nsta = 20
+        stations = []
+        for i in range(nsta):
+            sta = model.Station('XX', 'S%02i' % i, '', 
+                    lat=num.random.uniform(-80.,80.),
+                    lon=num.random.uniform(-180.,180.),
+                    elevation=float(i), depth=None, name='station %i' % i)
+            sta.set_channels_by_name('BHZ', 'BHN', 'BHE')
+            stations.append(sta)
+
+        table = model.StationTable.from_stations(stations)
+        assert len(table) == nsta
+        assert len(table.nslc_ids()) == 3*nsta
+
+        stations2 = table.to_stations()
+        for sta, sta2 in zip(stations, stations2):
+            assert str(sta) == str(sta2)
+            assert sta.depth is None and sta2.depth is None
+            assert [ cha.name for cha in sta.get_channels() ] == \
+                    [ cha.name for cha in sta2.get_channels() ]
+
+        events = [ model.Event(lat=num.random.uniform(-80.,80.),
+                               lon=num.random.uniform(-180.,180.))
+                   for i in range(5) ]
+
+        dist_m, dist_deg, azimuths, backazimuths = table.relative_to(events)
+        assert dist_m.shape == (len(events), nsta)
+        for iev, ev in enumerate(events):
+            model.set_event_relative_data(stations2, ev)
+            for ista, (sta, sta2) in enumerate(zip(stations, stations2)):
+                sta.set_event_relative_data(ev)
+                for k, values in (('dist_m', dist_m), ('dist_deg', dist_deg),
+                        ('azimuth', azimuths), ('backazimuth', backazimuths)):
+
+                    assert near(getattr(sta, k), values[iev,ista], 1e-6)
+                    assert near(getattr(sta, k), getattr(sta2, k), 1e-6)
+                    assert type(getattr(sta2, k)) is float
+
     def testProjections(self):
         km = 1000.
 
@@ -41,6 +41,160 @@ class MomentTensorTestCase( unittest.TestCase ):
             
             self.assertAnglesSame( m1, m2 )           
                 
+    def testMomentTensorArray(self):
+        '''Compare results of MomentTensorArray with those of MomentTensor.'''
+        n = 200
+        m6 = num.array([ [ random.random()*1.0e20-0.5e20 for j in range(6) ] for i in range(n) ])
+        m6[:50,:3] -= num.mean(m6[:50,:3], axis=1)[:,num.newaxis]
+        mts = [ MomentTensor( m=symmat6(*x) ) for x in m6 ]
+
+        mta = MomentTensorArray( m6=m6 )
+        assert len(mta) == n
+        sdrs = mta.both_strike_dip_rake()
+        moments = mta.scalar_moment()
+        for i, mt in enumerate(mts):
+            self.assertSame(sdrs[i], mt.both_strike_dip_rake(), 1e-6, 'strike, dip, rake mismatch')
+            self.assertSame(moments[i], mt.scalar_moment(), 1e-6*mt.scalar_moment(), 'moment mismatch')
+            self.assertSame(mta.m_plain_double_couple()[i], mt.m_plain_double_couple(),
+                            1e-6*mt.scalar_moment(), 'plain double couple mismatch')
+            self.assertSame(num.abs(mta.p_axis()[i]), num.abs(mt.p_axis()), 1e-6, 'p axis mismatch')
+            self.assertSame(num.abs(mta.t_axis()[i]), num.abs(mt.t_axis()), 1e-6, 't axis mismatch')
+
+        self.assertSame(mta.m6(), m6, 1e-6*num.max(num.abs(m6)), 'm6 mismatch')
+        self.assertSame(mta.m_up_south_east()[10], mts[10].m_up_south_east(), 1e-6*num.max(num.abs(m6)),
+                        'm_up_south_east mismatch')
+
+        strikes, dips, rakes = sdrs[:,0,0], sdrs[:,0,1], sdrs[:,0,2]
+        mta2 = MomentTensorArray( strike=strikes, dip=dips, rake=rakes, scalar_moment=moments )
+        self.assertSame(mta2.both_strike_dip_rake(), sdrs, 1e-6, 'forward-backward failed')
+        for i in range(0, n, 20):
+            mt = MomentTensor( strike=strikes[i], dip=dips[i], rake=rakes[i], scalar_moment=moments[i] )
+            self.assertSame(mta2.m()[i], mt.m(), 1e-6*moments[i], 'm mismatch')
+            self.assertSame(mta2[i].both_strike_dip_rake(), mt.both_strike_dip_rake(), 1e-6,
+                            'getitem mismatch')
+
+    def testEulerArray(self):
+        n = 1000
+        angles = [ num.array([ random.randint(-16,16)*math.pi/8.+1e-8*random.random()-0.5e-8
+                               for i in range(n) ]) for j in range(3) ]
+        angles[0][:100] = 0.0
+
+        rotmats = euler_to_matrix_array(*angles)
+        alpha, beta, gamma = matrix_to_euler_array(rotmats)
+        for i in range(n):
+            rotmat = euler_to_matrix(*[ x[i] for x in angles ])
+            self.assertSame(rotmats[i], rotmat, 1e-12, 'rotation matrix mismatch')
+            self.assertSame((alpha[i], beta[i], gamma[i]), matrix_to_euler(rotmat), 1e-10,
+                            'euler angles mismatch')
+
+    def testMopadDecompose(self):
+        '''Compare batched decomposition with that of mopad.MomentTensor.'''
+        from pyrocko import mopad
+        n = 50
+        m6 = num.array([ [ random.random()*1.0e20-0.5e20 for j in range(6) ] for i in range(n) ])
+        for system, out_system in (('NED', 'NED'), ('USE', 'XYZ')):
+            d = mopad.decompose(m6, system=system, out_system=out_system)
+            for i in range(n):
+                mt = mopad.MomentTensor(M=tuple(m6[i]), system=system)
+                for k in ('M', 'iso', 'devi', 'DC'):
+                    self.assertSame(d[k][i], getattr(mt, 'get_'+k)(system=out_system),
+                                    1e-6*num.max(num.abs(m6[i])), '%s mismatch' % k)
+
+                for k in ('iso_percentage', 'DC_percentage', 'colour_order'):
+                    assert d[k][i] == getattr(mt, 'get_'+k)()
+
+                self.assertSame(d['moment'][i], mt.get_moment(), 1e-6*mt.get_moment(), 'moment mismatch')
+                self.assertSame(d['fps'][i], mt.get_fps(), 1e-6, 'fault plane mismatch')
+                self.assertSame(num.abs(d['p_axis'][i]),
+                                num.abs(num.asarray(mt.get_p_axis(system=out_system)).ravel()),
+                                1e-6, 'p axis mismatch')
+
+        # the get_DC2, get_DC3 and get_CLVD methods of mopad.MomentTensor
+        # compare arrays to None, so look at its attributes directly
+        parts = {
+            20: ('DC', 'CLVD'),
+            21: ('DC', 'DC2'),
+            31: ('DC', 'DC2', 'DC3') }
+
+        for key in (20, 21, 31):
+            d = mopad.decompose(m6, system='USE', out_system='NED', decomposition_key=key)
+            for i in range(n):
+                mt = mopad.MomentTensor(M=tuple(m6[i]), system='USE')
+                mt._decomposition_key = key
+                mt._decompose_M()
+                for k in parts[key]:
+                    self.assertSame(d[k][i], mt._matrix_w_style_and_system(getattr(mt, '_'+k), 'NED', 'n'),
+                                    1e-6*num.max(num.abs(m6[i])), '%s mismatch (key %i)' % (k, key))
+
+                assert d['iso_percentage'][i] == mt._iso_percentage
+                if key == 20:
+                    assert d['DC_percentage'][i] == mt._DC_percentage
+                    assert d['CLVD_percentage'][i] == 100 - mt._DC_percentage
+                elif key == 21:
+                    self.assertSame(d['DC_percentage'][i], mt._DC_percentage, 1e-9, 'DC percentage mismatch')
+                else:
+                    assert d['DC_percentage'][i] == mt._DC_percentage
+                    assert d['DC2_percentage'][i] == mt._DC2_percentage
+                    assert d['DC3_percentage'][i] == 100 - mt._DC_percentage - mt._DC2_percentage
+
+    def testMopadDecomposeIsotropic(self):
+        '''Check batched decomposition of purely isotropic and zero tensors.'''
+        from pyrocko import mopad
+        m6 = num.array([[1.,1.,1.,0.,0.,0.], [-3e18,-3e18,-3e18,0.,0.,0.], [0.,0.,0.,0.,0.,0.]])
+        for key in (20, 21, 31):
+            olderr = num.seterr(divide='raise', invalid='raise')
+            try:
+                d = mopad.decompose(m6[:2], decomposition_key=key)
+            finally:
+                num.seterr(**olderr)
+
+            assert num.allclose(d['iso'], d['M'], rtol=1e-12, atol=0.)
+            assert num.all(d['iso_percentage'] == 100)
+            for k in ('DC', 'DC2', 'DC3', 'CLVD'):
+                if d[k] is not None:
+                    assert num.all(d[k] == 0.)
+                if d[k+'_percentage'] is not None:
+                    assert num.all(d[k+'_percentage'] == 0)
+
+            d = mopad.decompose(m6[2:], decomposition_key=key)
+            assert num.all(d['iso_percentage'] == 0)
+            for k in ('DC', 'DC2', 'DC3', 'CLVD'):
+                if d[k] is not None:
+                    assert num.all(d[k] == 0.)
+                if d[k+'_percentage'] is not None:
+                    assert num.all(d[k+'_percentage'] == 0)
+
+    def testMopadBeachballs(self):
+        '''Check batched nodal lines and rasters against the radiation pattern.'''
+        from pyrocko import mopad
+        n = 20
+        m6 = num.array([ [ random.random()*2.0-1.0 for j in range(6) ] for i in range(n) ])
+        m6[:n/2] = MomentTensorArray(strike=num.random.uniform(0., 360., n/2),
+                                     dip=num.random.uniform(0., 90., n/2),
+                                     rake=num.random.uniform(-180., 180., n/2)).m6()
+        ms = [ num.asarray(mopad.MomentTensor(M=tuple(m6[i]), system='NED').get_M()) for i in range(n) ]
+        size = 32
+        for projection in ('stereo', 'lambert', 'ortho'):
+            x, y = mopad.beachball_nodal_lines(m6, projection=projection)
+            assert x.shape == y.shape == (n, 2, 360)
+            for i in range(n):
+                for iline in range(2):
+                    for sx, sy in mopad.nodal_line_segments(x[i,iline], y[i,iline]):
+                        v = mopad._inverse_projection(sx, sy, projection)
+                        amp = num.sum(num.dot(v, ms[i])*v, axis=1)
+                        self.assertSame(amp, 0., 1e-6, 'point not on nodal line')
+
+            raster = mopad.beachball_raster(m6, projection=projection, size=size)
+            assert raster.shape == (n, size, size)
+            coords = (num.arange(size)+0.5)/size*2.-1.
+            xs, ys = num.meshgrid(coords, -coords)
+            inside = xs**2 + ys**2 <= 1.
+            v = mopad._inverse_projection(xs[inside], ys[inside], projection)
+            for i in range(n):
+                amp = num.sum(num.dot(v, ms[i])*v, axis=1)
+                assert num.all(raster[i][inside] == num.sign(amp))
+                assert num.all(raster[i][~inside] == 0)
+
     def forwardBackward(self, strike, dip, rake, scalar_moment ):
         m1 = MomentTensor( strike=strike, dip=dip, rake=rake, scalar_moment=scalar_moment )
         m2 = MomentTensor( m=m1.m() )
@@ -51,6 +205,9 @@ class MomentTensorTestCase( unittest.TestCase ):
                                 num.array(m2.both_strike_dip_rake())) < 1e-7*100 ), \
             "angles don't match after forward-backward calculation:\nfirst:\n"+str(m1)+ "\nsecond:\n"+str(m2)
 
+    def assertSame(self, a, b, eps, errstr):
+        assert num.all(num.abs(num.array(a)-num.array(b)) < eps), errstr
+
 if __name__ == "__main__":
     util.setup_logging('test_moment_tensor', 'warning')
     unittest.main()
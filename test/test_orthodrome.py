@@ -2,7 +2,7 @@ from pyrocko import orthodrome, config, util
 
 import unittest
 import numpy as num
-import math, random
+import math, random, time
 
 r2d = 180./math.pi
 d2r = 1./r2d
@@ -49,6 +49,53 @@ class OrthodromeTestCase(unittest.TestCase):
         
         
 
+    def testSpatialIndex(self):
+        num.random.seed(10)
+
+        def random_points(n):
+            lats = num.arcsin(num.random.uniform(-1.,1.,n))*r2d
+            lons = num.random.uniform(-180.,180.,n)
+            return lats, lons
+
+        slats, slons = random_points(500)
+        elats, elons = random_points(300)
+
+        cosdelta = orthodrome.cosdelta_numpy(elats[:,num.newaxis], elons[:,num.newaxis],
+                                             slats[num.newaxis,:], slons[num.newaxis,:])
+        angles = num.arccos(num.clip(cosdelta, -1., 1.))*r2d
+
+        index = orthodrome.SpatialIndex(slats, slons)
+        for radius in (0., 3., 30., 180., num.random.uniform(0., 40., elats.size)):
+            iquery, ipoint, dists, azimuths = index.query_radius(elats, elons, radius)
+            iquery_ref, ipoint_ref = num.nonzero(
+                    angles <= num.asarray(radius)[...,num.newaxis])
+            assert num.all(iquery == iquery_ref)
+            assert num.all(ipoint == ipoint_ref)
+            assert num.allclose(dists, orthodrome.distance_accurate50m_numpy(
+                elats[iquery], elons[iquery], slats[ipoint], slons[ipoint]))
+            assert num.allclose(azimuths, orthodrome.azimuth_numpy(
+                elats[iquery], elons[iquery], slats[ipoint], slons[ipoint]))
+
+        for k in (1, 5):
+            ipoint, dists, azimuths = index.query_nearest(elats, elons, k)
+            assert ipoint.shape == (elats.size, k)
+            assert num.all(ipoint == num.argsort(angles, axis=1)[:,:k])
+
+        # dense queries must not look at all points
+        slats, slons = random_points(20000)
+        elats, elons = random_points(50000)
+        index = orthodrome.SpatialIndex(slats, slons)
+        t0 = time.time()
+        iquery, ipoint, dists, azimuths = index.query_radius(elats, elons, 1.)
+        assert time.time() - t0 < 10.
+        assert num.all(dists <= 1.01*orthodrome.d2m)
+
+        index = orthodrome.SpatialIndex(slats, slons)
+        ipoint, dists, azimuths = index.query_nearest(slats[:10], slons[:10])
+        assert num.all(ipoint[:,0] == num.arange(10))
+        assert num.all(dists == 0.0)
+
+
 def plot_erroneous_ne_to_latlon():
     import sys
     import gmtpy
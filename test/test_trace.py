@@ -1,5 +1,5 @@
 from pyrocko import trace, io, util, model
-import unittest, math, time
+import unittest, math, time, itertools
 import numpy as num
 
 sometime = 1234567890.
@@ -11,6 +11,63 @@ def numeq(a,b, eps):
 def floats(l):
     return num.array(l, dtype=num.float)
 
+def project_reference(traces, matrix, in_channels, out_channels):
+    # straightforward projection, looping over all combinations of traces,
+    # like trace.project did before it used trace.ProjectionPlan
+
+    matrix = num.asarray(matrix)
+    systems = []
+    outs = set(range(matrix.shape[0]))
+    while outs:
+        iout = outs.pop()
+        gout = set()
+        for iin in matrix[iout,:].nonzero()[0]:
+            gout.update(matrix[:,iin].nonzero()[0])
+
+        gin = set()
+        for iout2 in gout:
+            gin.update(matrix[iout2,:].nonzero()[0])
+
+        if not gout or not gin:
+            continue
+
+        outs.difference_update(gout)
+        gin, gout = sorted(gin), sorted(gout)
+        systems.append((gin, gout, matrix[gout,:][:,gin]))
+
+    if any(m.shape[0] != m.shape[1] for (_, _, m) in systems):
+        systems = [ (range(3), range(3), matrix) ]
+
+    projected = []
+    for gin, gout, m in systems:
+        in_cha = tuple(in_channels[i] for i in gin)
+        out_cha = tuple(out_channels[i] for i in gout)
+        for combi in itertools.product(traces, repeat=len(gin)):
+            if not (tuple(tr.channel for tr in combi) == in_cha and
+                    all(tr.nslc_id[:3] == combi[0].nslc_id[:3] for tr in combi) and
+                    all(abs(a.deltat-b.deltat) < a.deltat*0.001
+                        for (a, b) in zip(combi[:-1], combi[1:]))):
+                continue
+
+            if len(combi) == 1:
+                chopped = [ combi[0].copy() ]
+            else:
+                tmin = max(tr.tmin for tr in combi)
+                tmax = min(tr.tmax for tr in combi)
+                if tmin > tmax or (len(combi) == 3 and tmin == tmax):
+                    continue
+
+                chopped = [ tr.chop(tmin, tmax, inplace=False, include_last=True)
+                            for tr in combi ]
+
+            ydata = [ tr.get_ydata() for tr in chopped ]
+            for i, tr in enumerate(chopped):
+                tr.set_ydata(num.dot(m[i], ydata))
+                tr.set_codes(channel=out_cha[i])
+                projected.append(tr)
+
+    return projected
+
 class TraceTestCase(unittest.TestCase):
     
     def testIntegrationDifferentiation(self):
@@ -105,6 +162,34 @@ class TraceTestCase(unittest.TestCase):
         assert numeq(r.get_ydata(), [2.,1.], 1.0e-6)
         assert numeq(t.get_ydata(), [ 0., -1 ], 1.0e-6)
             
+    def testRotatePairs(self):
+        s2 = math.sqrt(2.)
+        traces = []
+        for sta in ('S1', 'S2'):
+            for cha, ydata in (('BHN', [s2,s2]), ('BHE', [s2,0.]), ('BHZ', [1.,1.]),
+                               ('HH1', [s2,s2]), ('HH2', [s2,0.])):
+                traces.append(trace.Trace('', sta, '', cha, deltat=1.0, tmin=100.,
+                    ydata=num.array(ydata, dtype=num.float)))
+
+        # no partner, different sampling
+        traces.append(trace.Trace('', 'S3', '', 'BHN', deltat=1.0, tmin=100.,
+            ydata=num.array([1.,1.])))
+        traces.append(trace.Trace('', 'S3', '', 'BHE', deltat=0.5, tmin=100.,
+            ydata=num.array([1.,1.])))
+
+        pairs = trace.horizontal_pairs(traces)
+        assert len(pairs) == 4
+        for a, b in pairs:
+            assert a.nslc_id[:3] == b.nslc_id[:3]
+            assert a.channel[:-1] == b.channel[:-1]
+
+        trace.rotate_pairs(pairs, 45.)
+        for a, b in pairs:
+            assert numeq(a.get_ydata(), [2.,1.], 1.0e-6)
+            assert numeq(b.get_ydata(), [0.,-1.], 1.0e-6)
+
+        assert numeq(traces[-1].get_ydata(), [1.,1.], 1.0e-6)
+
     def testProjection(self):
         s2 = math.sqrt(2.)
         ndata = num.array([s2,s2], dtype=num.float)
@@ -142,6 +227,59 @@ class TraceTestCase(unittest.TestCase):
         assert( num.all(u.get_ydata() - num.array([ -1., 1. ]) < 1.0e-6 ) )
         
         
+    def testProjectionPlan(self):
+        ev = model.Event(lat=0., lon=0.)
+        stations = []
+        traces = []
+        for i in range(5):
+            sta = model.Station('XX', 'S%i' % i, '', lat=float(i), lon=float(-i))
+            sta.set_channels_by_name('BHZ', 'BHN', 'BHE')
+            stations.append(sta)
+            for cha in ('BHZ', 'BHN', 'BHE'):
+                traces.append(trace.Trace('XX', 'S%i' % i, '', cha,
+                    tmin=float(i), deltat=1.0, ydata=num.random.normal(size=10+i)))
+
+        # gappy component
+        traces.append(trace.Trace('XX', 'S0', '', 'BHN', tmin=20., deltat=1.0,
+                    ydata=num.random.normal(size=5)))
+
+        plans = []
+        for sta in stations:
+            plans.extend(trace.guess_projection_plans(sta, ev))
+
+        for i in range(2):
+            projected = trace.apply_projection_plans(plans, traces)
+            expected = []
+            for sta in stations:
+                for m, in_channels, out_channels in sta.guess_projections_to_rtu():
+                    expected.extend(project_reference(
+                        [ tr for tr in traces if tr.station == sta.station ],
+                        m, [ c.name for c in in_channels ],
+                        [ c.name for c in out_channels ]))
+
+            assert len(projected) == len(expected) == 3*len(stations)
+            key = lambda tr: (tr.nslc_id, tr.tmin)
+            for tr1, tr2 in zip(sorted(projected, key=key), sorted(expected, key=key)):
+                assert tr1.nslc_id == tr2.nslc_id
+                assert tr1.tmin == tr2.tmin
+                assert numeq(tr1.get_ydata(), tr2.get_ydata(), 1.0e-6)
+
+        # station due east of the event: R is east, T is south, U is up
+        sta = model.Station('XX', 'E', '', lat=0., lon=1.)
+        sta.set_channels_by_name('BHZ', 'BHN', 'BHE')
+        traces = [ trace.Trace('XX', 'E', '', cha, deltat=1.0,
+                               ydata=num.zeros(3)+val)
+                   for (cha, val) in (('BHZ', 3.), ('BHN', 1.), ('BHE', 2.)) ]
+
+        projected = trace.apply_projection_plans(
+            trace.guess_projection_plans(sta, ev), traces)
+
+        values = dict((tr.channel, tr.get_ydata()) for tr in projected)
+        assert sorted(values.keys()) == ['R', 'T', 'U']
+        assert numeq(values['R'], 2., 1e-6)
+        assert numeq(values['T'], -1., 1e-6)
+        assert numeq(values['U'], 3., 1e-6)
+
     def testExtend(self):
         tmin = sometime
         t = trace.Trace(tmin=tmin, ydata=num.ones(10,dtype=num.float))
@@ -0,0 +1,104 @@
+from pyrocko import weeding, model, util
+import unittest, time
+import numpy as num
+
+def weed_reference(x, y, badnesses, neighborhood=1, nwanted=None, interaction_radius=3.):
+    # straightforward implementation using the full distance matrix
+
+    n = x.size
+    if nwanted is None:
+        nwanted = n/2
+
+    dx = num.abs(x[num.newaxis,:]-x[:,num.newaxis])
+    dx = num.where(dx > 180., 360.-dx, dx)
+    dists = num.sqrt(dx**2 + (y[num.newaxis,:]-y[:,num.newaxis])**2)
+
+    deleted = num.zeros(n, dtype=num.bool)
+    kept = num.arange(n)
+    max_del = n - nwanted
+    while True:
+        xdists = dists[tuple(num.meshgrid(kept,kept))]
+        meandists = weeding.neighborhood_density(xdists, neighborhood)
+        order = meandists.argsort()
+        ncandidates = order.size/4+1
+        order_badness = (-badnesses[kept][order[:ncandidates]]).argsort()
+        order[:ncandidates] = order[:ncandidates][order_badness]
+
+        xdeleted = num.zeros(kept.size, dtype=num.bool)
+        ndeleted = 0
+        for i, ind in enumerate(order):
+            if (i < order.size/4/2+1 and ndeleted < max_del and
+                    num.all(xdists[ind,xdeleted] > interaction_radius*meandists[ind])):
+                xdeleted[ind] = True
+                ndeleted += 1
+
+        if ndeleted == 0:
+            return deleted, meandists
+
+        max_del -= ndeleted
+        deleted[kept[xdeleted]] = True
+        kept = kept[num.logical_not(xdeleted)]
+
+class WeedingTestCase(unittest.TestCase):
+
+    def testWeed(self):
+        num.random.seed(23)
+        for n, neighborhood in ((2, 3), (50, 1), (300, 3), (1000, 2)):
+            x = num.random.uniform(-180., 180., n)
+            y = num.random.uniform(0., 100., n)**1.5
+            badnesses = num.random.uniform(0., 1., n)
+            for nwanted in (None, n/5):
+                deleted, meandists = weeding.weed(x, y, badnesses,
+                        neighborhood=neighborhood, nwanted=nwanted)
+                deleted_ref, meandists_ref = weed_reference(x, y, badnesses,
+                        neighborhood=neighborhood, nwanted=nwanted)
+
+                assert num.all(deleted == deleted_ref)
+                assert num.all((meandists == meandists_ref) |
+                               (num.isnan(meandists) & num.isnan(meandists_ref)))
+
+    def testWeedDuplicates(self):
+        x = num.array([10., 10., 10., 20., 30., 30.])
+        y = num.array([5., 5., 5., 5., 7., 7.])
+        deleted, meandists = weeding.weed(x, y, num.ones(6), nwanted=3)
+        deleted_ref, meandists_ref = weed_reference(x, y, num.ones(6), nwanted=3)
+        assert num.all(deleted == deleted_ref)
+        assert num.all(meandists == meandists_ref)
+
+    def testWeedClusterOutlier(self):
+        # a far away point must not slow down lookups in a dense cluster
+        for n, tmax in ((1001, None), (4001, 10.)):
+            x = num.concatenate((num.linspace(10., 11., n), [200.]))
+            y = num.concatenate((num.ones(n)*50., [5000.]))
+            badnesses = num.ones(n+1)
+            t0 = time.time()
+            deleted, meandists = weeding.weed(x, y, badnesses, neighborhood=3)
+            if tmax is not None:
+                assert time.time() - t0 < tmax
+            else:
+                deleted_ref, meandists_ref = weed_reference(x, y, badnesses,
+                        neighborhood=3)
+
+                assert num.all(deleted == deleted_ref)
+                assert num.all(meandists == meandists_ref)
+
+    def testWeedStations(self):
+        num.random.seed(23)
+        ev = model.Event(lat=10., lon=20.)
+        stations = [ model.Station('', 'S%03i' % i, '',
+                                   lat=num.random.uniform(-60., 60.),
+                                   lon=num.random.uniform(-180., 180.))
+                     for i in range(100) ]
+
+        stations_weeded, meandists, deleted = weeding.weed_stations(
+                stations, 20, event=ev)
+
+        assert len(stations_weeded) == 20
+        for sta in stations:
+            dist_m = sta.dist_m
+            sta.set_event_relative_data(ev)
+            assert abs(sta.dist_m - dist_m) < 1e-6
+
+if __name__ == "__main__":
+    util.setup_logging('test_weeding', 'warning')
+    unittest.main()